@@ -8,6 +8,9 @@ import logging
 from datetime import datetime
 import os # ★★★ この行を追加 ★★★
 
+from bars import to_display_tz, to_display_time
+import indicator_cache
+
 
 logger = logging.getLogger(__name__)
 
@@ -17,8 +20,8 @@ DEFAULT_FIBO_RANGE = 100
 
 def find_support_resistance(df: pd.DataFrame, distance: int) -> dict:
     current_price = df['Close'].iloc[-1]
-    resistance_indices, _ = find_peaks(df['High'], distance=distance, width=3)
-    support_indices, _ = find_peaks(-df['Low'], distance=distance, width=3)
+    resistance_indices, _ = indicator_cache.compute(df, find_peaks, df['High'].to_numpy(), name='peaks_high', distance=distance, width=3)
+    support_indices, _ = indicator_cache.compute(df, find_peaks, -df['Low'].to_numpy(), name='peaks_low', distance=distance, width=3)
     all_resistances = df['High'].iloc[resistance_indices]
     all_supports = df['Low'].iloc[support_indices]
     closest_resistances = all_resistances[all_resistances > current_price].nsmallest(2).tolist()
@@ -26,8 +29,8 @@ def find_support_resistance(df: pd.DataFrame, distance: int) -> dict:
     return {"support": closest_supports, "resistance": closest_resistances}
 
 def find_trend_lines(df: pd.DataFrame, distance: int) -> dict:
-    resistance_indices, _ = find_peaks(df['High'], distance=distance)
-    support_indices, _ = find_peaks(-df['Low'], distance=distance)
+    resistance_indices, _ = indicator_cache.compute(df, find_peaks, df['High'].to_numpy(), name='peaks_high', distance=distance)
+    support_indices, _ = indicator_cache.compute(df, find_peaks, -df['Low'].to_numpy(), name='peaks_low', distance=distance)
     trend_lines = {"support": None, "resistance": None}
     if len(support_indices) >= 2:
         p1_idx, p2_idx = support_indices[-2], support_indices[-1]
@@ -88,14 +91,14 @@ def plot_analysis_chart(df: pd.DataFrame, symbol: str, timeframe: str, sr_levels
     hlines_colors = ['lime']*len(sr_levels['support']) + ['red']*len(sr_levels['resistance']) + ['yellow']*len(fibo_levels)
     hlines_styles = ['-.']*len(sr_levels['support']) + ['-.']*len(sr_levels['resistance']) + [':']*len(fibo_levels)
     hlines_dict = dict(hlines=hlines_data, colors=hlines_colors, linestyle=hlines_styles)
-    alines_list = [line for line in trend_lines.values() if line is not None]
+    alines_list = [[(to_display_time(t), p) for t, p in line] for line in trend_lines.values() if line is not None]
     style = mpf.make_mpf_style(base_mpf_style='yahoo', figcolor='#1a1a2e', facecolor='#1a1a2e', edgecolor='#e0e0e0', gridcolor='#3a3a4e')
     
     timestamp_str = datetime.now().strftime("%Y%m%d%H%M%S")
     filename = f"manual_analysis_{symbol}_{timeframe}_{timestamp_str}.png"
     filepath = os.path.join(output_dir, filename)
 
-    fig, axes = mpf.plot(df.tail(150), type='candle', style=style, title=f"{symbol} {timeframe} Manual Analysis",
+    fig, axes = mpf.plot(to_display_tz(df.tail(150)), type='candle', style=style, title=f"{symbol} {timeframe} Manual Analysis",
                          ylabel="Price", volume=True, hlines=hlines_dict,
                          alines=dict(alines=alines_list, colors=['lime', 'red']), panel_ratios=(4, 1),
                          figscale=1.5, returnfig=True, warn_too_much_data=10000)
@@ -0,0 +1,172 @@
+# async_engine.py (全ランナーを1つのイベントループで動かす asyncio エンジン)
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import config
+
+logger = logging.getLogger(__name__)
+
+class AsyncRunnerEngine:
+    """
+    SignalRunner をスレッドとして起動する代わりに、1つの asyncio イベントループで全ペアをスケジュールする。
+    各ランナーの fetch (データ取得) と emit (通知・発注) は I/O 用の小さなスレッドプールで、
+    evaluate (インジケーター計算・シグナル判定) は計算用のプールで実行し、待機はすべて asyncio.sleep で行う。
+    スレッド数はペアの数によらず (1 + I/O用 + 計算用) で一定になる。
+    シグナル・ログのコールバック (add_signal_callback / add_log_callback) はランナーに渡したものがそのまま呼ばれる。
+    """
+    def __init__(self, data_source, io_workers: Optional[int] = None, compute_workers: Optional[int] = None, work_queue=None):
+        self.mt5 = data_source
+        # 指定されていれば、evaluate は計算用プールではなく優先度付きの EvaluationQueue で実行する
+        self.work_queue = work_queue
+        self.runners: Dict[Tuple[str, str], object] = {}
+        self._tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._wakes: Dict[Tuple[str, str], asyncio.Event] = {}
+        self._io_executor = ThreadPoolExecutor(io_workers or config.ASYNC_IO_WORKERS, thread_name_prefix="AsyncEngine-IO")
+        self._compute_executor = ThreadPoolExecutor(compute_workers or config.ASYNC_COMPUTE_WORKERS, thread_name_prefix="AsyncEngine-Compute")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # --- 公開API ---
+
+    def add_runner(self, runner):
+        """起動前の SignalRunner を登録する (start() の後に追加してもよい)。スレッドとしては起動しないこと。"""
+        key = (runner.symbol, runner.timeframe_str)
+        with self._lock:
+            if key in self.runners:
+                logger.warning(f"[{runner.symbol}-{runner.timeframe_str}] は既に登録されています。")
+                return
+            self.runners[key] = runner
+        if runner.tick_stream is not None:
+            runner.tick_stream.subscribe_bar_closed(lambda symbol, bar, key=key: self._on_bar_closed(key))
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._start_task, key)
+
+    def remove_runner(self, symbol: str, timeframe_str: str):
+        key = (symbol, timeframe_str)
+        with self._lock:
+            runner = self.runners.pop(key, None)
+        if runner is None:
+            return
+        runner.stop()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._cancel_task, key)
+
+    def start(self) -> bool:
+        """イベントループをバックグラウンドのスレッドで開始する。"""
+        if self.mt5.clock is not None:
+            # 仮想時計は参加者全員が待機に入ったときに進むので、スレッドごとに待つ従来の SignalRunner を使う
+            logger.error("仮想時計を持つ取得元 (リプレイ) は AsyncRunnerEngine では動かせません。SignalRunner をスレッドで起動してください。")
+            return False
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, args=(started,), name="AsyncRunnerEngine", daemon=True)
+        self._thread.start()
+        started.wait()
+        logger.info(f"AsyncRunnerEngine を開始しました。ランナー数: {len(self.runners)}")
+        return True
+
+    def stop(self):
+        with self._lock:
+            runners = list(self.runners.values())
+        for runner in runners:
+            runner.stop()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self._io_executor.shutdown(wait=False)
+        self._compute_executor.shutdown(wait=False)
+        logger.info("AsyncRunnerEngine を停止しました。")
+
+    # --- イベントループ ---
+
+    def _run_loop(self, started: threading.Event):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        with self._lock:
+            keys = list(self.runners)
+        for key in keys:
+            self._start_task(key)
+        started.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            # remove_runner で取り消し済みのタスクも含め、終わるのを待ってから閉じる
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+
+    def _start_task(self, key):
+        runner = self.runners.get(key)
+        if runner is None or key in self._tasks:
+            return
+        self._wakes[key] = asyncio.Event()
+        self._tasks[key] = self._loop.create_task(self._run_pair(key, runner))
+
+    def _cancel_task(self, key):
+        task = self._tasks.pop(key, None)
+        self._wakes.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def _on_bar_closed(self, key):
+        """ティックストリームのスレッドから呼ばれる。スキャルピングモードのときだけ即座に起こす。"""
+        runner = self.runners.get(key)
+        if self._loop is None or runner is None or runner.trade_manager.get_current_mode() != 'scalp':
+            return
+        self._loop.call_soon_threadsafe(lambda: self._wakes[key].set() if key in self._wakes else None)
+
+    async def _run_pair(self, key, runner):
+        """1ペア分のループ。SignalRunner.run と同じ流れを、待機だけ非同期にして行う。"""
+        loop = asyncio.get_running_loop()
+        logger.info(f"[{runner.symbol}-{runner.timeframe_str}] シグナル監視を開始します。(asyncio)")
+        await self._sleep(key, runner.initial_delay) # 初期化の安定を待つ (起動時はランナーごとにずらす)
+
+        while not runner.stop_event.is_set():
+            # 切断中はスレッドを占有しないよう、待たずに確認して短く眠る
+            if not self.mt5.wait_until_ready(timeout=0):
+                await self._sleep(key, min(runner.interval, 1.0))
+                continue
+
+            try:
+                bars = await loop.run_in_executor(self._io_executor, runner.fetch)
+                if bars is not None:
+                    evaluation = await self._evaluate(runner, bars)
+                    if evaluation is not None:
+                        await loop.run_in_executor(self._io_executor, runner.emit, evaluation)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[{runner.symbol}-{runner.timeframe_str}] ループ中にエラーが発生: {e}", exc_info=True)
+                runner.retry_soon()
+
+            await self._sleep(key, runner.next_wait)
+        logger.info(f"[{runner.symbol}-{runner.timeframe_str}] シグナル監視を終了します。")
+
+    async def _evaluate(self, runner, bars):
+        if self.work_queue is None:
+            return await asyncio.get_running_loop().run_in_executor(self._compute_executor, runner.evaluate, bars)
+        job = self.work_queue.submit((runner.symbol, runner.timeframe_str), runner.tf_seconds,
+                                     time.time() + runner.next_wait, lambda: runner.evaluate(bars))
+        await asyncio.wait([asyncio.wrap_future(job)])
+        # 締め切り切れ・新しいジョブとの合体で破棄された場合は何もしない
+        return None if job.cancelled() else job.result()
+
+    async def _sleep(self, key, seconds: float):
+        """seconds 秒待つ。足の確定イベントが来たらその時点で起きる。"""
+        wake = self._wakes.get(key)
+        if wake is None:
+            await asyncio.sleep(seconds)
+            return
+        try:
+            await asyncio.wait_for(wake.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        wake.clear()
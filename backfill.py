@@ -0,0 +1,231 @@
+# backfill.py (過去のローソク足をまとめて取得し、BarStore に保存する)
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import MetaTrader5 as mt5
+import numpy as np
+
+import config
+from bar_store import BarStore
+from market_data import TIMEFRAME_SECONDS, timeframe_value
+
+logger = logging.getLogger(__name__)
+
+# 1回の copy_rates_range で取得する最大の本数 (この本数に収まるように期間を区切る)
+CHUNK_BARS = 20000
+# この本数たまったらディスクに書き込み、進捗を保存する
+FLUSH_BARS = 200000
+
+class BackfillProgress:
+    """完了したチャンクを JSON ファイルに記録し、中断しても続きから再開できるようにする。"""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done: Dict[str, set] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._done = {key: set(starts) for key, starts in json.load(f).items()}
+            except (json.JSONDecodeError, OSError) as e:
+                logger.warning(f"進捗ファイル {path} を読み込めませんでした。最初から取得します: {e}")
+
+    def is_done(self, key: str, chunk_start: int) -> bool:
+        with self._lock:
+            return chunk_start in self._done.get(key, ())
+
+    def mark_done(self, key: str, chunk_starts: List[int]):
+        with self._lock:
+            self._done.setdefault(key, set()).update(chunk_starts)
+            snapshot = {k: sorted(v) for k, v in self._done.items()}
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+
+
+def split_range(start: int, end: int, tf_seconds: int, chunk_bars: int = CHUNK_BARS) -> List[Tuple[int, int]]:
+    """[start, end) を chunk_bars 本ずつの期間に分ける。境界はチャンク長の倍数に揃え、再開時も同じ区切りになるようにする。"""
+    span = tf_seconds * chunk_bars
+    chunks = []
+    chunk_start = start - start % span
+    while chunk_start < end:
+        chunks.append((max(chunk_start, start), min(chunk_start + span, end)))
+        chunk_start += span
+    return chunks
+
+
+class Backfiller:
+    """
+    (symbol, timeframe) ごとに期間をチャンクに分けて copy_rates_range で取得し、BarStore に書き込む。
+    ターミナルへの呼び出しは MT5Connector のブローカースレッドで直列に実行されるので、
+    並列数は取得待ちとディスクへの書き込みを重ねるためのもので、ターミナルへの同時呼び出しにはならない。
+    保存済みより古い足を取り込むときはシリーズのファイルを書き直すので、ボットが同じシリーズに
+    追記している最中に走らせる場合は、ボットを止めてから実行すること。
+    """
+    def __init__(self, connector, store: BarStore, progress: BackfillProgress, pause_seconds: float = 0.0, retries: int = 3):
+        self.connector = connector
+        self.store = store
+        self.progress = progress
+        self.pause_seconds = pause_seconds
+        self.retries = retries
+
+    def run(self, symbols: List[str], timeframes: List[str], start: int, end: Optional[int], workers: int) -> Dict[str, int]:
+        """
+        全シリーズを最大 workers 並列で取得し、シリーズごとの追加本数 (失敗時は -1) を返す。
+        end が None なら、シリーズごとにサーバーの現在時刻 (形成中の足) まで取得する。
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Backfill") as executor:
+            futures = {
+                executor.submit(self.backfill_series, symbol, timeframe_str, start, end): f"{symbol}_{timeframe_str}"
+                for symbol in symbols for timeframe_str in timeframes
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    logger.error(f"[{key}] バックフィル中にエラーが発生: {e}", exc_info=True)
+                    results[key] = -1
+        return results
+
+    def backfill_series(self, symbol: str, timeframe_str: str, start: int, end: Optional[int]) -> int:
+        key = f"{symbol}_{timeframe_str}"
+        timeframe = timeframe_value(timeframe_str)
+        if self.connector.get_symbol_info(symbol) is None:
+            logger.error(f"[{key}] シンボル情報を取得できないため、スキップします。")
+            return -1
+        # 足の時刻はサーバー時刻 (UTC+2/+3 など) なので、「現在」もローカル時刻ではなくサーバーの形成中の足で決める
+        forming_time = self._forming_bar_time(symbol, timeframe)
+        if forming_time is None:
+            logger.error(f"[{key}] サーバーの現在の足を取得できないため、スキップします。")
+            return -1
+        if end is None:
+            end = forming_time + TIMEFRAME_SECONDS[timeframe]
+
+        chunks = [c for c in split_range(start, end, TIMEFRAME_SECONDS[timeframe]) if not self.progress.is_done(key, c[0])]
+        logger.info(f"[{key}] 未取得のチャンク: {len(chunks)} 件")
+        added = 0
+        failed = 0
+        pending: List[np.ndarray] = []
+        pending_starts: List[int] = []
+        for chunk_start, chunk_end in chunks:
+            rates = self._fetch_chunk(symbol, timeframe, chunk_start, chunk_end)
+            if rates is None:
+                # 取得できなかったチャンクは未完了のまま残し、次回の実行で取り直す
+                failed += 1
+                continue
+            if len(rates) > 0:
+                pending.append(rates)
+            # 形成中の足を含むチャンクはまだ足が増えるので、完了として記録しない
+            if chunk_end <= forming_time:
+                pending_starts.append(chunk_start)
+            if sum(len(r) for r in pending) >= FLUSH_BARS:
+                added += self._flush(symbol, timeframe, key, pending, pending_starts, forming_time)
+                pending, pending_starts = [], []
+            if self.pause_seconds > 0:
+                time.sleep(self.pause_seconds)
+        added += self._flush(symbol, timeframe, key, pending, pending_starts, forming_time)
+
+        if failed:
+            logger.warning(f"[{key}] {failed} 件のチャンクを取得できませんでした。再実行すると続きから取得します。")
+            return -1
+        logger.info(f"[{key}] 完了しました。追加: {added} 件、保存済み: {self.store.length(symbol, timeframe)} 件")
+        return added
+
+    def _fetch_chunk(self, symbol: str, timeframe, chunk_start: int, chunk_end: int) -> Optional[np.ndarray]:
+        for attempt in range(1, self.retries + 1):
+            # copy_rates_range は両端を含むので、次のチャンクの先頭の足は含めない
+            rates = self.connector.call(mt5.copy_rates_range, symbol, timeframe, chunk_start, chunk_end - 1)
+            if rates is not None:
+                return rates
+            logger.warning(f"[{symbol}] {_fmt(chunk_start)} からの取得に失敗しました。(試行 {attempt} 回目)")
+            time.sleep(2 ** attempt)
+        return None
+
+    def _flush(self, symbol: str, timeframe, key: str, pending: List[np.ndarray], pending_starts: List[int], forming_time: int) -> int:
+        """
+        たまったチャンクをまとめて書き込み (重複する足は除く)、書き込み後に進捗を記録する。
+        forming_time (開始時に取得した形成中の足の時刻) 以降の足は書かない。その足を含むチャンクは完了にしないので、次回取り直す。
+        """
+        if not pending and not pending_starts:
+            return 0
+        added = 0
+        if pending:
+            rates = np.concatenate(pending)
+            # 最後のチャンクには形成中の足が入るので除く (保存すると、ライブの追記はそれ以前の足を無視するため直らない)
+            rates = rates[rates['time'] < forming_time]
+            last_time = self.store.last_time(symbol, timeframe)
+            if len(rates) == 0:
+                pass
+            elif last_time is None or int(rates['time'].min()) > last_time:
+                # 保存済みより新しい足だけなら追記で済む (チャンク間の重複は取得範囲で避けている)
+                added = self.store.append(symbol, timeframe, np.sort(rates, order='time'))
+            else:
+                added = self.store.merge(symbol, timeframe, rates)
+        self.progress.mark_done(key, pending_starts)
+        return added
+
+    def _forming_bar_time(self, symbol: str, timeframe) -> Optional[int]:
+        """
+        形成中の足の開始時刻 (サーバー時刻)。これ以降の足 (time + 足の長さ > サーバーの現在時刻) は未確定。
+        取得できなければ None (ローカル時刻はサーバー時刻とずれているので代わりに使わない)。
+        """
+        rates = self.connector.call(mt5.copy_rates_from_pos, symbol, timeframe, 0, 1)
+        if rates is not None and len(rates) > 0:
+            return int(rates['time'][-1])
+        return None
+
+
+def _fmt(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime('%Y-%m-%d %H:%M')
+
+
+def _parse_date(value: str) -> int:
+    return int(datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp())
+
+
+def main():
+    """過去の足をまとめて取得する (例: python backfill.py --start 2022-01-01 --timeframes M1 H1 --workers 2)。"""
+    from mt5_connector import MT5Connector
+
+    parser = argparse.ArgumentParser(description="過去のローソク足をチャンクに分けて取得し、data/bars に保存します。")
+    parser.add_argument('--start', required=True, help="取得開始日 (YYYY-MM-DD, UTC)")
+    parser.add_argument('--end', help="取得終了日 (YYYY-MM-DD, UTC)。省略時は現在まで")
+    parser.add_argument('--symbols', nargs='+', default=config.SYMBOL_DISPLAY_ORDER)
+    parser.add_argument('--timeframes', nargs='+', default=list(config.SIGNAL_INTERVALS_SECONDS))
+    parser.add_argument('--workers', type=int, default=2, help="同時に処理するシリーズ数")
+    parser.add_argument('--pause', type=float, default=0.0, help="チャンクごとの待ち時間 (秒)。取引時間中にターミナルの負荷を抑える")
+    parser.add_argument('--progress', default=os.path.join(config.BAR_STORE_DIR, 'backfill_progress.json'))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=config.LOG_LEVEL, format=config.LOG_FORMAT)
+    start = _parse_date(args.start)
+    end = _parse_date(args.end) if args.end else None # 省略時はシリーズごとにサーバーの現在時刻まで
+
+    connector = MT5Connector(path=config.MT5_PATH, login=config.MT5_LOGIN,
+                             password=config.MT5_PASSWORD, server=config.MT5_SERVER)
+    if not connector.connect():
+        logger.error("MT5への接続に失敗しました。バックフィルを中止します。")
+        return
+    try:
+        backfiller = Backfiller(connector, BarStore(config.BAR_STORE_DIR), BackfillProgress(args.progress), pause_seconds=args.pause)
+        results = backfiller.run(args.symbols, args.timeframes, start, end, max(1, args.workers))
+    finally:
+        connector.disconnect()
+
+    for key, added in sorted(results.items()):
+        print(f"{key}: {'失敗 (再実行で続きから取得)' if added < 0 else f'{added} 件追加'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# bar_cache.py (ローソク足リングバッファキャッシュ)
+
+import threading
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+class BarRingBuffer:
+    """
+    1つの (symbol, timeframe) のローソク足を保持する固定長リングバッファ。
+    各バーを i と i + capacity の2か所に書き込む「二重書き」方式なので、
+    最新 N 本は常にコピーなしの連続したビューとして取り出せる。
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf = None  # 最初の reset() で MT5 のレコード型に合わせて確保する
+        self._head = 0  # 次に書き込む位置 (0 <= head < capacity)
+        self.size = 0
+        self.fetched_at = 0.0  # 最後にターミナルから取得したローカル時刻
+        self.lock = threading.Lock()
+
+    @property
+    def last_time(self) -> Optional[int]:
+        if self.size == 0:
+            return None
+        return int(self._buf['time'][self._head - 1 + self.capacity])
+
+    def reset(self, rates: np.ndarray):
+        """バッファを空にして rates で埋め直す。"""
+        if self._buf is None or self._buf.dtype != rates.dtype:
+            self._buf = np.zeros(self.capacity * 2, dtype=rates.dtype)
+        self._head = 0
+        self.size = 0
+        self.extend(rates)
+
+    def extend(self, rates: np.ndarray) -> int:
+        """
+        時刻昇順の rates を取り込む。最終バーと同じ時刻のバー(形成中の足)は上書きし、
+        それより古いバーは無視する。追加されたバーの本数を返す。
+        """
+        if rates is None or len(rates) == 0:
+            return 0
+
+        last_time = self.last_time
+        if last_time is not None:
+            rates = rates[rates['time'] >= last_time]
+            if len(rates) == 0:
+                return 0
+            if int(rates['time'][0]) == last_time:
+                self._write(self._head - 1, rates[0])
+                rates = rates[1:]
+
+        if len(rates) >= self.capacity:
+            rates = rates[-self.capacity:]
+            self._buf[:self.capacity] = rates
+            self._buf[self.capacity:] = rates
+            self._head = 0
+            self.size = self.capacity
+            return len(rates)
+
+        for record in rates:
+            self._write(self._head, record)
+            self._head = (self._head + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+        return len(rates)
+
+    def window(self, count: int) -> np.ndarray:
+        """最新 count 本 (形成中の足を含む) をコピーなしのビューで返す。"""
+        count = min(count, self.size)
+        end = self._head + self.capacity
+        return self._buf[end - count:end]
+
+    def _write(self, pos: int, record):
+        pos %= self.capacity
+        self._buf[pos] = record
+        self._buf[pos + self.capacity] = record
+
+
+class BarCache:
+    """(symbol, timeframe) ごとの BarRingBuffer を管理する。"""
+    def __init__(self):
+        self._buffers: Dict[Tuple[str, int], BarRingBuffer] = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbol: str, timeframe, capacity: int) -> BarRingBuffer:
+        """バッファを取得する。無い場合や容量が足りない場合は新しく作る。"""
+        key = (symbol, timeframe)
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is None or buffer.capacity < capacity:
+                buffer = BarRingBuffer(capacity)
+                self._buffers[key] = buffer
+            return buffer
+
+    def clear(self):
+        with self._lock:
+            self._buffers.clear()
@@ -0,0 +1,83 @@
+# bar_scheduler.py (足の確定に合わせてランナーを起こすスケジューラ)
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# サーバー時刻とローカル時刻の差はこの単位 (30分) の倍数とみなす
+OFFSET_STEP_SECONDS = 1800
+# これより大きい差は、市場が閉まっていて足が古いだけとみなして採用しない
+MAX_OFFSET_SECONDS = 14 * 3600
+# 時刻差の推定に使う直近の観測の期間
+OFFSET_WINDOW_SECONDS = 600
+
+class BarCloseScheduler:
+    """
+    各ランナーが次に起きるべき時刻 (ブローカーの足が確定した直後 + 猶予) を計算する。
+    足の時刻はサーバー時刻なので、短い時間足の形成中の足の開始時刻からサーバーとの時刻差を推定し、
+    全ランナーで共有する (H1/D1 のランナーは M1 のランナーが推定した時刻差を使う)。
+    リプレイなど仮想時計を持つ取得元では、足の時刻と時計が同じ基準なので時刻差は 0 とする。
+    """
+    def __init__(self, clock=None, grace_seconds: Optional[float] = None, retry_seconds: Optional[float] = None):
+        self.clock = clock
+        self.grace_seconds = config.BAR_CLOSE_GRACE_SECONDS if grace_seconds is None else grace_seconds
+        self.retry_seconds = config.BAR_CLOSE_RETRY_SECONDS if retry_seconds is None else retry_seconds
+        self.server_offset: Optional[float] = 0.0 if clock is not None else None
+        self._observations = deque()
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        return self.clock.now() if self.clock is not None else time.time()
+
+    def observe(self, forming_bar_time: int, tf_seconds: int):
+        """形成中の足の開始時刻から、サーバーとの時刻差の推定を更新する。"""
+        # 足の中央とローカル時刻の差が時刻差の単位の半分に収まる時間足 (M15 以下) だけを使う
+        if self.clock is not None or tf_seconds > OFFSET_STEP_SECONDS // 2:
+            return
+        now = time.time()
+        candidate = round((forming_bar_time + tf_seconds / 2 - now) / OFFSET_STEP_SECONDS) * OFFSET_STEP_SECONDS
+        if abs(candidate) > MAX_OFFSET_SECONDS:
+            return
+        with self._lock:
+            self._observations.append((now, candidate))
+            while self._observations and now - self._observations[0][0] > OFFSET_WINDOW_SECONDS:
+                self._observations.popleft()
+            # 足が古い (しばらくティックが無い) と時刻差は小さく見えるので、直近の最大値を採用する
+            offset = max(c for _, c in self._observations)
+            if offset != self.server_offset:
+                logger.info(f"サーバー時刻とローカル時刻の差を {offset / 3600:+.1f} 時間と推定しました。")
+                self.server_offset = offset
+
+    def seconds_until_next_close(self, forming_bar_time: int, tf_seconds: int, fallback: float) -> float:
+        """
+        形成中の足が確定して猶予が過ぎるまでの秒数を返す。時刻差がまだ分からなければ fallback を返す。
+        確定しているはずなのに新しい足が来ていない場合 (ティックが無い・市場が閉まっている) は、
+        遅れに応じて間隔を広げながら再確認する。
+        """
+        if self.server_offset is None:
+            return fallback
+        next_close = forming_bar_time + tf_seconds - self.server_offset + self.grace_seconds
+        delay = next_close - self.now()
+        if delay > 0:
+            return min(delay, tf_seconds + self.grace_seconds)
+        return min(tf_seconds, max(self.retry_seconds, -delay / 2))
+
+
+_shared_scheduler: Optional[BarCloseScheduler] = None
+_shared_lock = threading.Lock()
+
+def get_scheduler(clock=None) -> BarCloseScheduler:
+    """ライブの取得元では全ランナーで1つのスケジューラを共有し、仮想時計ごとには個別に作る。"""
+    global _shared_scheduler
+    if clock is not None:
+        return BarCloseScheduler(clock=clock)
+    with _shared_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = BarCloseScheduler()
+        return _shared_scheduler
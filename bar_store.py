@@ -0,0 +1,141 @@
+# bar_store.py (ローソク足履歴のディスク保存 - 追記専用の列ファイル)
+
+import logging
+import os
+import threading
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+from market_data import RATES_DTYPE, timeframe_name
+
+logger = logging.getLogger(__name__)
+
+class BarStore:
+    """
+    確定済みのローソク足を (symbol, timeframe) ごとにディスクへ追記保存する。
+    {root}/{SYMBOL}_{TF}/ の下にフィールドごとの生のバイナリファイル (time.bin, open.bin, ...) を置く列指向の形式で、
+    読み出しは np.memmap なので、何か月分の履歴でも必要な範囲だけをコピーなしで参照できる。
+    """
+    def __init__(self, root: str):
+        self.root = root
+        self._locks: Dict[Tuple[str, int], threading.Lock] = {}
+        # このプロセスで最後に追記した足の時刻。ディスク上の最新時刻以下であることが保証されるので、
+        # これ以前の足しか無ければファイルを見ずに追記を省略できる
+        self._appended_times: Dict[Tuple[str, int], int] = {}
+        self._guard = threading.Lock()
+
+    def _series_dir(self, symbol: str, timeframe) -> str:
+        return os.path.join(self.root, f"{symbol}_{timeframe_name(timeframe)}")
+
+    def _field_path(self, series_dir: str, field: str) -> str:
+        return os.path.join(series_dir, f"{field}.bin")
+
+    def _lock(self, symbol: str, timeframe) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault((symbol, timeframe), threading.Lock())
+
+    def _length(self, series_dir: str) -> int:
+        """保存済みの本数。書き込み途中で止まった場合に備え、全フィールドの最小の本数を採用する。"""
+        lengths = []
+        for field in RATES_DTYPE.names:
+            path = self._field_path(series_dir, field)
+            if not os.path.exists(path):
+                return 0
+            lengths.append(os.path.getsize(path) // RATES_DTYPE.fields[field][0].itemsize)
+        return min(lengths)
+
+    def length(self, symbol: str, timeframe) -> int:
+        return self._length(self._series_dir(symbol, timeframe))
+
+    def last_time(self, symbol: str, timeframe) -> Optional[int]:
+        """保存済みの最新の足の開始時刻。何も保存されていなければ None。"""
+        # バックフィルなど別プロセスからの書き込みもあるので、キャッシュせず毎回ファイルを見る
+        times = self.columns(symbol, timeframe, count=1, fields=('time',))
+        return int(times['time'][-1]) if times else None
+
+    def append(self, symbol: str, timeframe, rates: np.ndarray) -> int:
+        """
+        確定済みの足 (時刻昇順) を追記する。保存済みの最新の足以前のものは無視する。
+        形成中の足は渡さないこと。追記した本数を返す。
+        """
+        if rates is None or len(rates) == 0:
+            return 0
+        key = (symbol, timeframe)
+        if int(rates['time'][-1]) <= self._appended_times.get(key, -1):
+            return 0
+        with self._lock(symbol, timeframe):
+            last_time = self.last_time(symbol, timeframe)
+            if last_time is not None:
+                rates = rates[rates['time'] > last_time]
+                if len(rates) == 0:
+                    self._appended_times[key] = last_time
+                    return 0
+
+            series_dir = self._series_dir(symbol, timeframe)
+            os.makedirs(series_dir, exist_ok=True)
+            length = self._length(series_dir)
+            for field in RATES_DTYPE.names:
+                column = np.ascontiguousarray(rates[field], dtype=RATES_DTYPE.fields[field][0])
+                path = self._field_path(series_dir, field)
+                with open(path, 'ab') as f:
+                    # 前回の書き込みが途中で止まっていたら、揃っている本数まで切り詰めてから追記する
+                    f.truncate(length * column.itemsize)
+                    f.write(column.tobytes())
+            self._appended_times[key] = int(rates['time'][-1])
+            return len(rates)
+
+    def merge(self, symbol: str, timeframe, rates: np.ndarray) -> int:
+        """
+        保存済みより古い足や重複する足を含む rates を取り込み、時刻順・重複なしに書き直す
+        (同じ時刻の足は rates 側を採用する)。バックフィル用で、追記より重い。増えた本数を返す。
+        """
+        if rates is None or len(rates) == 0:
+            return 0
+        with self._lock(symbol, timeframe):
+            existing = self.read(symbol, timeframe)
+            before = 0 if existing is None else len(existing)
+            incoming = np.empty(len(rates), dtype=RATES_DTYPE)
+            for field in RATES_DTYPE.names:
+                if field in rates.dtype.names:
+                    incoming[field] = rates[field]
+                else:
+                    incoming[field] = 0
+            combined = incoming if existing is None else np.concatenate([incoming, existing])
+            # np.unique は最初に現れた要素を残すので、rates 側が優先される
+            _, first = np.unique(combined['time'], return_index=True)
+            merged = combined[np.sort(first)]
+            merged = merged[np.argsort(merged['time'], kind='stable')]
+
+            series_dir = self._series_dir(symbol, timeframe)
+            os.makedirs(series_dir, exist_ok=True)
+            for field in RATES_DTYPE.names:
+                path = self._field_path(series_dir, field)
+                tmp_path = path + ".tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(np.ascontiguousarray(merged[field]).tobytes())
+                os.replace(tmp_path, path)
+            return len(merged) - before
+
+    def columns(self, symbol: str, timeframe, count: Optional[int] = None, fields=None) -> Optional[Dict[str, np.ndarray]]:
+        """最新 count 本 (None なら全件) をフィールドごとの読み取り専用 memmap で返す。"""
+        series_dir = self._series_dir(symbol, timeframe)
+        length = self._length(series_dir)
+        if length == 0:
+            return None
+        start = 0 if count is None else max(length - count, 0)
+        result = {}
+        for field in fields or RATES_DTYPE.names:
+            dtype = RATES_DTYPE.fields[field][0]
+            column = np.memmap(self._field_path(series_dir, field), dtype=dtype, mode='r', shape=(length,))
+            result[field] = column[start:]
+        return result
+
+    def read(self, symbol: str, timeframe, count: Optional[int] = None) -> Optional[np.ndarray]:
+        """最新 count 本を copy_rates_* と同じレコード配列で返す (Bars や BarRingBuffer に渡せる)。"""
+        columns = self.columns(symbol, timeframe, count)
+        if columns is None:
+            return None
+        rates = np.empty(len(columns['time']), dtype=RATES_DTYPE)
+        for field, column in columns.items():
+            rates[field] = column
+        return rates
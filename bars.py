@@ -0,0 +1,88 @@
+# bars.py (MT5 のレコード配列をそのまま包む列指向のローソク足コンテナ)
+
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+import config
+
+class Bars:
+    """
+    copy_rates_* が返すレコード配列をコピーせずに包むコンテナ。
+    time (int64, UTCエポック秒), open/high/low/close (float64), volume (tick_volume) は
+    元の配列のフィールドビューとして参照するだけで、pandas への変換は to_frame() を呼んだときだけ行う。
+    """
+    __slots__ = ('rates', 'symbol', 'timeframe')
+
+    def __init__(self, rates: np.ndarray, symbol: Optional[str] = None, timeframe: Optional[str] = None):
+        self.rates = rates
+        self.symbol = symbol
+        self.timeframe = timeframe
+
+    def __len__(self) -> int:
+        return len(self.rates)
+
+    @property
+    def time(self) -> np.ndarray:
+        return self.rates['time']
+
+    @property
+    def open(self) -> np.ndarray:
+        return self.rates['open']
+
+    @property
+    def high(self) -> np.ndarray:
+        return self.rates['high']
+
+    @property
+    def low(self) -> np.ndarray:
+        return self.rates['low']
+
+    @property
+    def close(self) -> np.ndarray:
+        return self.rates['close']
+
+    @property
+    def volume(self) -> np.ndarray:
+        return self.rates['tick_volume']
+
+    @property
+    def last_time(self) -> Optional[int]:
+        """最新の足 (形成中の足) の開始時刻。"""
+        return int(self.rates['time'][-1]) if len(self.rates) else None
+
+    @property
+    def last_closed_time(self) -> Optional[int]:
+        """確定済みの最新の足の開始時刻。"""
+        return int(self.rates['time'][-2]) if len(self.rates) > 1 else None
+
+    def tail(self, count: int) -> 'Bars':
+        return Bars(self.rates[-count:], self.symbol, self.timeframe)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        ロジックやチャート用の OHLCV DataFrame を作る。インデックスは UTC のままで、
+        表示用のタイムゾーン変換は to_display_tz() で表示・チャートの直前に行う。
+        呼び出すたびに新しい DataFrame を返すので、呼び出し側でカラムを追加してよい。
+        """
+        index = pd.DatetimeIndex(pd.to_datetime(self.rates['time'], unit='s', utc=True), name='Time')
+        df = pd.DataFrame({
+            'Open': self.rates['open'], 'High': self.rates['high'], 'Low': self.rates['low'],
+            'Close': self.rates['close'], 'Volume': self.rates['tick_volume'],
+        }, index=index)
+        df.attrs['symbol'] = self.symbol
+        df.attrs['timeframe'] = self.timeframe
+        return df
+
+
+def to_display_time(ts):
+    """UTC のタイムスタンプを表示用のタイムゾーンに変換する (トレンドラインの座標など)。"""
+    ts = pd.Timestamp(ts)
+    return ts.tz_convert(config.TIMEZONE) if ts.tzinfo is not None else ts
+
+
+def to_display_tz(df: pd.DataFrame) -> pd.DataFrame:
+    """表示・チャート描画の直前に、インデックスを config.TIMEZONE に変換した DataFrame を返す。"""
+    if isinstance(df.index, pd.DatetimeIndex) and df.index.tz is not None:
+        return df.tz_convert(config.TIMEZONE)
+    return df
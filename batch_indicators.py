@@ -0,0 +1,247 @@
+# batch_indicators.py (複数銘柄の同じ長さの窓を2次元配列にまとめてインジケーターを計算する)
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import config
+import daytrade_logic
+import indicator_cache
+import indicator_graph
+import scalping_logic
+
+logger = logging.getLogger(__name__)
+
+class _BatchSource:
+    """
+    (銘柄数, 本数) の High / Low / Close を入力にする IndicatorGraph の source。
+    カーネルは2次元のまま1回だけ呼び、結果の各行を、その銘柄を1つずつ計算したときと同じキーで
+    indicator_cache に入れる。あとで各ロジックの add_all_indicators を呼ぶと、計算せずにキャッシュから取れる。
+    """
+    def __init__(self, window_keys: List[tuple], columns: Dict[str, np.ndarray]):
+        self.window_keys = window_keys
+        self.columns = columns
+        self.cache = indicator_cache.get_indicator_cache()
+
+    def column(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def kernel(self, kernel: Callable, *arrays, name: Optional[str] = None, **params):
+        value = kernel(*arrays, **params)
+        for row, window_key in enumerate(self.window_keys):
+            if isinstance(value, dict):
+                row_value = {column: np.ascontiguousarray(values[row]) for column, values in value.items()}
+            else:
+                row_value = np.ascontiguousarray(value[row])
+            self.cache.put(indicator_cache.kernel_key(window_key, kernel, name, params), row_value)
+        return value
+
+
+def fill_cache(windows: Iterable[Tuple[str, str, np.ndarray]], columns: Iterable[str]) -> int:
+    """
+    (symbol, timeframe, rates) の窓について、columns のインジケーターをまとめて計算してキャッシュに入れる。
+    本数が同じ窓どうしを1つの2次元配列にするので、銘柄数によらずカーネルの呼び出しは本数の種類 × インジケーター数で済む。
+    キャッシュに入れた窓の数を返す (失敗しても各ロジックが1銘柄ずつ計算するだけなので、ログを出して 0 を返す)。
+    """
+    if not config.INDICATOR_CACHE_ENABLED:
+        return 0
+    groups: Dict[int, List[Tuple[str, str, np.ndarray]]] = defaultdict(list)
+    for symbol, timeframe, rates in windows:
+        if rates is not None and len(rates) > 0:
+            groups[len(rates)].append((symbol, timeframe, rates))
+
+    graph = indicator_graph.graph_for(tuple(columns))
+    filled = 0
+    for group in groups.values():
+        try:
+            window_keys = [indicator_cache.rates_key(rates, symbol, timeframe) for symbol, timeframe, rates in group]
+            stacked = {
+                column: np.stack([rates[field] for _, _, rates in group]).astype(np.float64)
+                for column, field in (('High', 'high'), ('Low', 'low'), ('Close', 'close'))
+            }
+            graph.compute(_BatchSource(window_keys, stacked))
+            filled += len(group)
+        except Exception as e:
+            logger.error(f"インジケーターのまとめ計算に失敗しました ({len(group)} 銘柄): {e}", exc_info=True)
+    return filled
+
+
+class BatchSweepEngine:
+    """
+    全ランナーを1つのスレッドで回し、同じ時刻に評価するランナーのインジケーターを fill_cache でまとめて計算してから、
+    各ランナーの evaluate / emit を呼ぶ (シグナル判定は従来どおり1銘柄ずつ)。
+    AsyncRunnerEngine と同じく add_runner / remove_runner を持つので、RunnerRegistry(engine=...) にそのまま渡せる。
+    計算用プロセスプールやストリーミングインジケーターを使うランナーは、まとめ計算をせずに evaluate だけを呼ぶ。
+    emit (チャート描画・通知) は別のスレッドで並行して行い、1つのペアの遅い通知が同じ確定時刻の他のペアを待たせないようにする。
+    処理中のランナーには busy_since を付けるので、シャードのワーカーは止まったまとめ処理も検出できる。
+    起床時刻は wake_offset を除いた足の確定時刻でそろえる (StartupPlanner のずらしは、スレッドで回すときの負荷分散のため)。
+    """
+    def __init__(self, data_source):
+        self.mt5 = data_source
+        self.runners: Dict[Tuple[str, str], object] = {}
+        self._due: Dict[Tuple[str, str], float] = {}
+        self._added: Dict[Tuple[str, str], float] = {} # まだ1回も回していないランナーの追加時刻
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._emitter = ThreadPoolExecutor(max_workers=config.BATCH_SWEEP_EMIT_WORKERS, thread_name_prefix="BatchSweepEmit")
+        # emit を実行中・実行待ちのランナー (終わるまで次の回に入れない)
+        self._emitting = set()
+
+    # --- 公開API ---
+
+    def add_runner(self, runner):
+        """起動前の SignalRunner を登録する (start() の後に追加してもよい)。スレッドとしては起動しないこと。"""
+        key = (runner.symbol, runner.timeframe_str)
+        with self._lock:
+            if key in self.runners:
+                logger.warning(f"[{runner.symbol}-{runner.timeframe_str}] は既に登録されています。")
+                return
+            self.runners[key] = runner
+            self._added[key] = time.time() # initial_delay は追加後に StartupPlanner が変えることがあるので、起床時に読む
+        if runner.tick_stream is not None:
+            runner.tick_stream.subscribe_bar_closed(lambda symbol, bar, key=key: self._on_bar_closed(key))
+        self._wake.set()
+
+    def remove_runner(self, symbol: str, timeframe_str: str):
+        key = (symbol, timeframe_str)
+        with self._lock:
+            runner = self.runners.pop(key, None)
+            self._due.pop(key, None)
+            self._added.pop(key, None)
+        if runner is not None:
+            runner.stop()
+
+    def start(self) -> bool:
+        if self.mt5.clock is not None:
+            logger.error("仮想時計を持つ取得元 (リプレイ) は BatchSweepEngine では動かせません。SignalRunner をスレッドで起動してください。")
+            return False
+        self._thread = threading.Thread(target=self._run, name="BatchSweepEngine", daemon=True)
+        self._thread.start()
+        logger.info(f"BatchSweepEngine を開始しました。ランナー数: {len(self.runners)}")
+        return True
+
+    def stop(self):
+        with self._lock:
+            runners = list(self.runners.values())
+        for runner in runners:
+            runner.stop()
+        self._stop_event.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self._emitter.shutdown(wait=False, cancel_futures=True)
+        logger.info("BatchSweepEngine を停止しました。")
+
+    # --- ループ ---
+
+    def _on_bar_closed(self, key):
+        """ティックストリームのスレッドから呼ばれる。スキャルピングモードのときだけ即座に起こす。"""
+        with self._lock:
+            runner = self.runners.get(key)
+        if runner is None or runner.trade_manager.get_current_mode() != 'scalp':
+            return
+        with self._lock:
+            if self.runners.get(key) is runner:
+                self._added.pop(key, None)
+                self._due[key] = time.time()
+        self._wake.set()
+
+    def _due_times(self) -> Dict[Tuple[str, str], float]:
+        """各ランナーの次の起床時刻。emit がまだ終わっていないランナーは除く (呼び出し側で self._lock を取っておくこと)。"""
+        due = {key: at for key, at in self._due.items() if key not in self._emitting}
+        for key, added in self._added.items():
+            due[key] = added + self.runners[key].initial_delay
+        return due
+
+    def _schedule(self, key, runner):
+        """
+        runner.next_wait から次の起床時刻を決める。wake_offset は足すだけの値なので引いて、
+        同じ時間足のランナーが同じ足の確定時刻に起き、1回のまとめ計算に入るようにする。
+        """
+        wait = max(0.0, runner.next_wait - runner.wake_offset)
+        with self._lock:
+            if self.runners.get(key) is runner:
+                self._added.pop(key, None)
+                self._due[key] = time.time() + wait
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            if not self.mt5.wait_until_ready(timeout=1.0):
+                continue
+            now = time.time()
+            with self._lock:
+                # 少しだけ先の起床予定も同じ回に入れる (前回の取得が順番なので、同じ確定時刻でもミリ秒単位でずれる)
+                due_times = self._due_times()
+                due = []
+                if any(at <= now for at in due_times.values()):
+                    gather_until = now + config.BATCH_SWEEP_GATHER_SECONDS
+                    due = [(key, self.runners[key]) for key, at in due_times.items() if at <= gather_until]
+            if due:
+                self.sweep(due)
+            with self._lock:
+                next_due = min(self._due_times().values(), default=now + 1.0)
+            self._wake.wait(timeout=max(0.0, next_due - time.time()))
+            self._wake.clear()
+
+    def sweep(self, due: List[Tuple[Tuple[str, str], object]]):
+        """期限の来たランナーをまとめて1回処理する: 取得 → まとめ計算 → 1銘柄ずつ判定 → 通知は別スレッドで並行して行う。"""
+        started = time.time()
+        for _, runner in due:
+            runner.busy_since = started
+        fetched = []
+        for key, runner in due:
+            try:
+                bars = runner.fetch()
+            except Exception as e:
+                logger.error(f"[{runner.symbol}-{runner.timeframe_str}] データ取得中にエラーが発生: {e}", exc_info=True)
+                bars = None
+            self._schedule(key, runner)
+            if bars is not None:
+                fetched.append((key, runner, bars))
+            else:
+                runner.busy_since = None
+
+        # モード (ロジック) ごとに、必要なインジケーターを全銘柄まとめて計算しておく
+        by_mode = defaultdict(list)
+        for key, runner, bars in fetched:
+            if runner.compute_pool is None and runner.streaming_engines is None:
+                rates = runner.evaluation_bars(bars).rates
+                by_mode[runner.trade_manager.get_current_mode()].append((runner.symbol, runner.timeframe_str, rates))
+        for mode, windows in by_mode.items():
+            logic_module = daytrade_logic if mode == 'daytrade' else scalping_logic
+            fill_cache(windows, logic_module.REQUIRED_INDICATORS)
+
+        for key, runner, bars in fetched:
+            try:
+                evaluation = runner.evaluate(bars)
+            except Exception as e:
+                logger.error(f"[{runner.symbol}-{runner.timeframe_str}] ループ中にエラーが発生: {e}", exc_info=True)
+                runner.retry_soon()
+                self._schedule(key, runner)
+                runner.busy_since = None
+                continue
+            with self._lock:
+                self._emitting.add(key)
+            self._emitter.submit(self._emit, key, runner, evaluation)
+
+    def _emit(self, key, runner, evaluation):
+        """通知用のスレッドで1ペア分の emit を行う。"""
+        runner.busy_since = time.time()
+        try:
+            runner.emit(evaluation)
+        except Exception as e:
+            logger.error(f"[{runner.symbol}-{runner.timeframe_str}] 通知中にエラーが発生: {e}", exc_info=True)
+            runner.retry_soon()
+            self._schedule(key, runner)
+        finally:
+            runner.busy_since = None
+            with self._lock:
+                self._emitting.discard(key)
+            self._wake.set()
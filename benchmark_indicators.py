@@ -0,0 +1,109 @@
+# benchmark_indicators.py (indicator_kernels と pandas_ta の速度と値の比較)
+#
+# 使い方:
+#   python benchmark_indicators.py --bars 300 --repeat 200
+# pandas_ta が入っていない環境では、indicator_kernels の時間だけを表示する。
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import indicator_kernels as kernels
+
+try:
+    import pandas_ta as ta
+except ImportError:
+    ta = None
+
+
+def make_prices(bars: int, seed: int):
+    """ランダムウォークの OHLC (USDJPY 程度の値動き)。"""
+    rng = np.random.default_rng(seed)
+    close = 150 + np.cumsum(rng.normal(0, 0.03, bars))
+    high = close + rng.random(bars) * 0.03
+    low = close - rng.random(bars) * 0.03
+    return high, low, close
+
+
+def _as_columns(result, names=None) -> dict:
+    """kernels / pandas_ta の戻り値を {名前: 配列} にそろえる。"""
+    if isinstance(result, tuple):  # pandas_ta.ichimoku は (現在, 先行分) を返す
+        result = result[0]
+    if isinstance(result, dict):
+        return result
+    if isinstance(result, pd.DataFrame):
+        return {column: result[column].to_numpy() for column in result.columns}
+    if isinstance(result, pd.Series):
+        return {names[0]: result.to_numpy()}
+    return {names[0]: np.asarray(result)}
+
+
+def cases(high, low, close):
+    """(名前, kernels の呼び出し, pandas_ta の呼び出し, 単一出力のときの名前)"""
+    h, l, c = pd.Series(high), pd.Series(low), pd.Series(close)
+    return [
+        ("EMA_200", lambda: kernels.ema(close, 200), lambda: ta.ema(c, length=200), ["EMA_200"]),
+        ("RSI_14", lambda: kernels.rsi(close, 14), lambda: ta.rsi(c, length=14), ["RSI_14"]),
+        ("ATR_14", lambda: kernels.atr(high, low, close, 14), lambda: ta.atr(h, l, c, length=14), ["ATR_14"]),
+        ("BB_20_2.0", lambda: kernels.bbands(close, 20, 2.0), lambda: ta.bbands(c, length=20, std=2.0), None),
+        ("MACD_12_26_9", lambda: kernels.macd(close), lambda: ta.macd(c), None),
+        ("STOCH_14_3_3", lambda: kernels.stoch(high, low, close), lambda: ta.stoch(h, l, c), None),
+        ("ICHIMOKU_9_26_52", lambda: kernels.ichimoku(high, low, close), lambda: ta.ichimoku(h, l, c), None),
+    ]
+
+
+def measure(fn, repeat: int) -> float:
+    """1回あたりの秒数 (最初の1回は import などの初回コストを避けるため数えない)。"""
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def max_difference(ours: dict, theirs: dict) -> float:
+    """同じ名前のカラムの最大の差 (NaN の位置が違えば inf)。"""
+    worst = 0.0
+    for name, values in ours.items():
+        # pandas_ta の ATR は ATRr_14 という名前になる
+        other = theirs.get(name, theirs.get(name.replace('ATR_', 'ATRr_')))
+        if other is None:
+            continue
+        other = np.asarray(other, dtype=float)
+        if not np.array_equal(np.isnan(values), np.isnan(other)):
+            return float('inf')
+        mask = ~np.isnan(values)
+        if mask.any():
+            worst = max(worst, float(np.max(np.abs(values[mask] - other[mask]))))
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description="indicator_kernels と pandas_ta の速度と値の比較")
+    parser.add_argument("--bars", type=int, default=300, help="1回に計算する足の本数 (既定: 300)")
+    parser.add_argument("--repeat", type=int, default=200, help="計測の繰り返し回数 (既定: 200)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    high, low, close = make_prices(args.bars, args.seed)
+    print(f"足の本数: {args.bars}, 繰り返し: {args.repeat}" + ("" if ta else " (pandas_ta が無いため kernels のみ)"))
+    print(f"{'インジケーター':<18}{'kernels(ms)':>12}{'pandas_ta(ms)':>15}{'倍率':>8}{'最大の差':>12}")
+    total_ours = total_theirs = 0.0
+    for name, ours_fn, theirs_fn, names in cases(high, low, close):
+        ours = measure(ours_fn, args.repeat)
+        total_ours += ours
+        if ta is None:
+            print(f"{name:<18}{ours * 1000:>12.3f}")
+            continue
+        theirs = measure(theirs_fn, args.repeat)
+        total_theirs += theirs
+        difference = max_difference(_as_columns(ours_fn(), names), _as_columns(theirs_fn(), names))
+        print(f"{name:<18}{ours * 1000:>12.3f}{theirs * 1000:>15.3f}{theirs / ours:>8.1f}{difference:>12.2e}")
+    if ta is not None:
+        print(f"{'合計':<18}{total_ours * 1000:>12.3f}{total_theirs * 1000:>15.3f}{total_theirs / total_ours:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# broker_actor.py (MT5ターミナルへのアクセスを1本のスレッドに直列化する)
+
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+class BrokerActor(threading.Thread):
+    """
+    MetaTrader5 モジュールはプロセス全体で1つの接続を共有するため、
+    全ての呼び出しをこの専用スレッドのキューに積んで1つずつ実行する。
+    同じ key の要求が実行待ちまたは実行中であれば、新しく積まずに同じ Future を返す。
+    """
+    def __init__(self, name: str = "MT5-BrokerActor"):
+        super().__init__()
+        self.daemon = True
+        self.name = name
+        self._queue: "queue.Queue" = queue.Queue()
+        self._pending: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.merged = 0
+
+    def submit(self, key: Optional[Hashable], fn: Callable, *args, **kwargs) -> Future:
+        """fn をブローカースレッドで実行する要求を積み、Future を返す。key が None の要求はまとめない。"""
+        if threading.current_thread() is self:
+            # ブローカースレッド内からの呼び出し (例: 取得処理中の再接続) はその場で実行する
+            future = Future()
+            self._execute(fn, args, kwargs, future)
+            return future
+
+        with self._lock:
+            if key is not None and key in self._pending:
+                self.merged += 1
+                return self._pending[key]
+            future = Future()
+            if key is not None:
+                self._pending[key] = future
+        self._queue.put((key, fn, args, kwargs, future))
+        return future
+
+    def call(self, key: Optional[Hashable], fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """submit() して結果を待つ。"""
+        return self.submit(key, fn, *args, **kwargs).result(timeout=timeout)
+
+    def stop(self):
+        self._queue.put(None)
+
+    def run(self):
+        logger.info("ブローカースレッドを開始しました。")
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            key, fn, args, kwargs, future = item
+            self._execute(fn, args, kwargs, future)
+            if key is not None:
+                with self._lock:
+                    self._pending.pop(key, None)
+            self.processed += 1
+        logger.info("ブローカースレッドを終了しました。")
+
+    @staticmethod
+    def _execute(fn: Callable, args, kwargs, future: Future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            logger.error(f"ブローカー呼び出し中にエラーが発生: {e}", exc_info=True)
+            future.set_exception(e)
@@ -9,6 +9,8 @@ import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 
+from bars import to_display_tz
+
 logger = logging.getLogger(__name__)
 
 class ChartDrawer:
@@ -26,6 +28,8 @@ class ChartDrawer:
             logger.error("インデックスがDatetimeIndexではありません。チャート生成を中止します。")
             return None
         
+        # タイムゾーンの変換は描画の直前だけ行う
+        df = to_display_tz(df)
         if 'Volume' not in df.columns:
             df['Volume'] = 0
 
@@ -0,0 +1,105 @@
+# compute_pool.py (インジケーター計算とシグナル判定を行うプロセスプール)
+
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Optional
+
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+
+def _init_worker():
+    """
+    ワーカープロセスの初期化。重いライブラリを先に読み込み、両モードのロジックを1回ずつ空打ちして、
+    最初の本番の評価で import や初回呼び出しのコストを払わないようにする。
+    """
+    import indicator_kernels  # noqa: F401
+    import scipy.signal  # noqa: F401
+    from market_data import RATES_DTYPE
+    from signal_runner_loop import evaluate_bars
+
+    count = config.CANDLE_COUNT
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0, 0.1, count))
+    rates = np.zeros(count, dtype=RATES_DTYPE)
+    rates['time'] = np.arange(count, dtype=np.int64) * 60
+    rates['open'] = np.r_[close[0], close[:-1]]
+    rates['close'] = close
+    rates['high'] = np.maximum(rates['open'], close) + 0.05
+    rates['low'] = np.minimum(rates['open'], close) - 0.05
+    rates['tick_volume'] = 100
+    for mode in ('scalp', 'daytrade'):
+        try:
+            evaluate_bars(rates, 'USDJPY', 'M1', mode)
+        except Exception:
+            pass
+
+
+def _ping() -> bool:
+    return True
+
+
+def _evaluate_in_worker(rates, symbol, timeframe_str, mode, sr_rates):
+    from signal_runner_loop import evaluate_bars, is_trade_signal
+
+    evaluation = evaluate_bars(rates, symbol, timeframe_str, mode, sr_rates)
+    # DataFrame はチャート描画 (売買シグナルのとき) にしか使わないので、それ以外は送り返さない
+    if not is_trade_signal(evaluation["signal"]):
+        evaluation["df"] = None
+    return evaluation
+
+
+class ComputePool:
+    """
+    SignalRunner の評価 (add_all_indicators, find_strong_sr_levels, generate_signal) を
+    ワーカープロセスで実行し、GIL による直列化を避ける。
+    ランナーからはローソク足のレコード配列だけを送り、シグナルの結果 (と売買シグナルのときの DataFrame) を受け取る。
+    失敗・タイムアウトした場合は None を返すので、ランナーは同じ評価を自分のスレッドで行う。
+    """
+    def __init__(self, workers: Optional[int] = None, timeout: Optional[float] = None):
+        self.workers = workers or config.COMPUTE_POOL_WORKERS
+        self.timeout = timeout or config.COMPUTE_POOL_TIMEOUT_SECONDS
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> bool:
+        """ワーカーを起動し、全ワーカーの初期化 (ウォームアップ) が終わるまで待つ。"""
+        started = time.time()
+        try:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+            # ワーカーはタスクが来たときに起動されるので、ワーカー数より多く投げて全員を起こす
+            futures = [self._executor.submit(_ping) for _ in range(self.workers * 2)]
+            for future in futures:
+                future.result(timeout=self.timeout * 4)
+        except Exception as e:
+            logger.error(f"計算用プロセスプールを起動できませんでした。各ランナーのスレッドで計算します: {e}", exc_info=True)
+            self.shutdown()
+            return False
+        logger.info(f"計算用プロセスプールを起動しました。ワーカー数: {self.workers} ({time.time() - started:.1f}秒)")
+        return True
+
+    def evaluate(self, rates, symbol: str, timeframe_str: str, mode: str, sr_rates=None) -> Optional[dict]:
+        if self._executor is None:
+            return None
+        try:
+            future = self._executor.submit(_evaluate_in_worker, rates, symbol, timeframe_str, mode, sr_rates)
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            logger.error(f"[{symbol}-{timeframe_str}] ワーカーでの評価がタイムアウトしました。")
+            return None
+        except BrokenProcessPool:
+            logger.error("計算用プロセスプールのワーカーが異常終了しました。以降は各ランナーのスレッドで計算します。")
+            self.shutdown()
+            return None
+        except Exception as e:
+            logger.error(f"[{symbol}-{timeframe_str}] ワーカーでの評価中にエラーが発生: {e}", exc_info=True)
+            return None
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
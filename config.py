@@ -14,6 +14,14 @@ MT5_LOGIN = 75312449
 MT5_PASSWORD = "Kk*qS2Bq" 
 MT5_SERVER = "XMTrading-MT5 3"
 
+# ブローカースレッドに積んだ MT5 呼び出しの結果を待つ最大秒数
+BROKER_CALL_TIMEOUT_SECONDS = 30
+# 接続監視: ヘルスチェック間隔、再接続の指数バックオフ (初回・上限)、ブレーカーを開く連続失敗回数
+MT5_HEALTH_CHECK_INTERVAL_SECONDS = 5
+MT5_RECONNECT_BACKOFF_INITIAL_SECONDS = 1
+MT5_RECONNECT_BACKOFF_MAX_SECONDS = 60
+MT5_CIRCUIT_FAILURE_THRESHOLD = 3
+
 # --- 3. 時間足ごとの監視間隔（秒） ---
 SIGNAL_INTERVALS_SECONDS = {
     "M1": 60, "M5": 300, "M15": 900, "H1": 3600, "D1": 86400
@@ -85,4 +93,103 @@ DEFAULT_TAKE_PROFIT_PIPS = 40
 
 # --- 10. 取引モード別設定 ---
 SCALP_SETTINGS = {"stop_loss_pips": 10, "take_profit_pips": 15}
-DAYTRADE_SETTINGS = {"stop_loss_pips": 40, "take_profit_pips": 80}
\ No newline at end of file
+DAYTRADE_SETTINGS = {"stop_loss_pips": 40, "take_profit_pips": 80}
+
+# --- 11. マーケットデータハブ設定 ---
+# シンボルごとに M1 を1回だけ取得し、M5/M15/H1 は M1 から集約して作る (build_runners がライブの取得元を包む)
+DATA_HUB_ENABLED = True
+DATA_HUB_DERIVE_D1 = False # D1 もM1から集約する場合は True (ブローカーの日足の区切りに依存するため既定は無効)
+DATA_HUB_M1_REFRESH_SECONDS = 1.0 # この秒数以内の再要求には取得済みの M1 を使い回す
+DATA_HUB_VERIFY_INTERVAL_SECONDS = 300 # 集約した足をブローカーの足と照合する間隔
+
+# --- 12. ティックストリーム設定 ---
+# スキャルピングの M1 ランナーを、copy_ticks_from から組み立てた足の確定イベントで起こす (RunnerRegistry が M1 のランナーに渡す)
+TICK_STREAM_ENABLED = False
+TICK_POLL_INTERVAL_SECONDS = 0.2
+
+# --- 13. ローソク足履歴の保存設定 ---
+# 確定済みの足を data/bars に列ごとのファイルで追記保存し、再起動時の種と長期の S/R 分析に使う
+BAR_STORE_ENABLED = True
+BAR_STORE_DIR = "data/bars"
+SR_LOOKBACK_BARS = 5000 # デイトレードの強い水平線の検出に使う過去の足の本数
+
+# --- 14. 足の確定に合わせたスケジューリング ---
+# 固定間隔ではなく、ブローカーの足が確定した直後にランナーを起こす (確定足が増えていなければ処理を省略)
+BAR_CLOSE_SCHEDULING_ENABLED = True
+BAR_CLOSE_GRACE_SECONDS = 2.0 # 確定時刻から、ブローカー側で新しい足が出来るまで待つ猶予
+BAR_CLOSE_RETRY_SECONDS = 5.0 # 確定時刻を過ぎても新しい足が無いときの再確認の最短間隔
+
+# --- 15. asyncio エンジン設定 ---
+# 有効にすると、ペアごとのスレッドの代わりに1つのイベントループで全ランナーを動かす (runner_registry.build_runners が組み立てる)
+ASYNC_ENGINE_ENABLED = False
+ASYNC_IO_WORKERS = 4 # データ取得・通知用のスレッド数
+ASYNC_COMPUTE_WORKERS = 2 # インジケーター計算・シグナル判定用のスレッド数
+
+# --- 16. 計算用プロセスプール設定 ---
+# 有効にすると、インジケーター計算とシグナル判定をワーカープロセスで行う (GIL を避ける。build_runners が組み立てる)
+COMPUTE_POOL_ENABLED = False
+COMPUTE_POOL_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+COMPUTE_POOL_TIMEOUT_SECONDS = 30
+
+# --- 17. 評価キュー設定 ---
+# 有効にすると、評価を時間足ごとの優先度と締め切り (次の足の確定) を持つキューで処理する (build_runners が組み立てる)
+WORK_QUEUE_ENABLED = False
+WORK_QUEUE_WORKERS = 2
+WORK_QUEUE_STATS_LOG_SECONDS = 300 # キューの深さ・待ち時間をログに出す間隔
+
+# --- 18. 設定ファイルの監視 ---
+SETTINGS_CHECK_INTERVAL_SECONDS = 1.0 # settings.json の更新時刻を確認する間隔
+
+# --- 19. 起動計画 ---
+STARTUP_MIN_DELAY_SECONDS = 2 # 最初のランナーが動き出すまでの待ち時間
+STARTUP_STAGGER_WINDOW_SECONDS = 20 # 全ランナーの最初の実行をこの秒数に散らす (短い時間足から順に)
+STARTUP_WARMUP_CONCURRENCY = 4 # ウォームアップの並列数
+STARTUP_WARMUP_TIMEOUT_SECONDS = 120
+# 足の確定ちょうどに起きる必要が無い時間足は、同じ時間足のランナーの起床をこの秒数の範囲に散らす
+STARTUP_WAKE_SPREAD_SECONDS = {"M15": 5, "H1": 15, "D1": 60}
+
+# --- 20. 取引時間とボラティリティに応じたポーリング ---
+ADAPTIVE_POLLING_ENABLED = True
+# シンボルの種別 (crypto: 24時間 / fx: 週末休み / metal: 週末休み + 毎日1時間の休止)。未登録は fx
+SYMBOL_CLASSES = {
+    'USDJPY': 'fx', 'EURUSD': 'fx', 'GBPJPY': 'fx',
+    'GOLD': 'metal',
+    'BTCUSD': 'crypto', 'ETHUSD': 'crypto', 'XRPUSD': 'crypto',
+}
+MARKET_CLOSED_MAX_SLEEP_SECONDS = 3600 # 休止中もこの間隔で取引時間を確認し直す
+ADAPTIVE_POLL_MIN_FACTOR = 0.5 # 活発なときはポーリング間隔を最大でこの倍率まで短くする
+ADAPTIVE_POLL_MAX_FACTOR = 3.0 # 静かなときはこの倍率まで長くする
+
+# --- 21. 監視ペアの動的な追加・削除 ---
+RUNNER_CAPACITY_LANES = 1 # 同時に評価できる数 (スレッドのみなら GIL により 1、プロセスプールならワーカー数)
+RUNNER_EVAL_COST_ESTIMATE_SECONDS = 0.3 # 実測が無いときの1回の評価の見積もり
+RUNNER_MAX_UTILIZATION = 0.5 # 全ペアの評価が重なっても、最短の時間足の1本分のこの割合以内に終わらせる
+RUNNER_STOP_JOIN_SECONDS = 5 # 削除したランナーのスレッドの終了をこの秒数まで待つ (終わるまでは同じペアを再追加しない)
+
+# --- 22. マルチプロセス (シャーディング) 設定 ---
+# 有効にすると、監視ペアを複数のワーカープロセスに分け、各ワーカーが自分のデータ取得元を持つ (build_runners が組み立てる)
+SHARD_MODE_ENABLED = False
+SHARD_WORKERS = 2
+SHARD_HEARTBEAT_SECONDS = 5
+SHARD_HEARTBEAT_TIMEOUT_SECONDS = 60 # この秒数ハートビートが無いワーカーは落ちたとみなして作り直す
+SHARD_RUNNER_STUCK_SECONDS = 45 # 1回の処理がこの秒数を超えたランナーがいるワーカーはハートビートを止める (BROKER_CALL_TIMEOUT_SECONDS より長く)
+
+# --- 23. ストリーミングインジケーター設定 ---
+# 有効にすると、ランナーは毎回窓全体のインジケーターを計算し直さず、確定足が増えた分だけインジケーターを更新する
+# (計算用プロセスプールを使う場合は、従来どおりワーカー側で窓全体を計算する)
+STREAMING_INDICATORS_ENABLED = False
+STREAMING_HISTORY_BARS = 1000 # 確定足ごとの結果を保持する本数 (取得する窓の本数以上にする)
+STREAMING_WARMUP_BARS = 2000 # 起動時などに状態を作り直すときに読む、保存済みの確定足の本数
+
+# --- 24. インジケーターのキャッシュ ---
+# 同じ足の同じインジケーター (と水平線検出のピーク) は、ロジック・Web の分析から何度求められても1回だけ計算する
+INDICATOR_CACHE_ENABLED = True
+INDICATOR_CACHE_MAX_ENTRIES = 512
+
+# --- 25. 複数銘柄のまとめ計算 ---
+# 有効にすると、ランナーを BatchSweepEngine で回し、同じ時刻に評価する全銘柄のインジケーターを2次元配列でまとめて計算する
+# (build_runners が組み立てる。ASYNC_ENGINE_ENABLED と両方有効ならこちらを使う)
+# (結果はインジケーターのキャッシュ経由で各ロジックに渡るので、INDICATOR_CACHE_MAX_ENTRIES は 銘柄数 × 10 程度以上にする)
+BATCH_SWEEP_ENABLED = False
+BATCH_SWEEP_GATHER_SECONDS = 1.0 # 起床時刻の差がこの秒数以内のランナーは同じ回のまとめ計算に入れる
+BATCH_SWEEP_EMIT_WORKERS = 4 # 通知 (チャート描画・送信) を並行して行うスレッド数 (遅い通知が他のペアを待たせないように)
@@ -0,0 +1,130 @@
+# connection_supervisor.py (MT5接続の監視・再接続とサーキットブレーカー)
+
+import logging
+import random
+import threading
+from typing import Callable
+
+import config
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """
+    ターミナルが落ちている間はデータ取得を即座に失敗させるためのサーキットブレーカー。
+    closed: 通常 / open: 即座に失敗 / half_open: 再接続直後、成功すれば closed に戻る
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int):
+        self.failure_threshold = failure_threshold
+        self.state = self.CLOSED
+        self._failures = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        return self.state != self.OPEN
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self) -> bool:
+        """失敗を記録し、しきい値に達して open になったら True を返す。"""
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                opened = self.state != self.OPEN
+                self.state = self.OPEN
+                return opened
+            return False
+
+    def trip(self):
+        with self._lock:
+            self.state = self.OPEN
+
+    def half_open(self):
+        with self._lock:
+            self._failures = 0
+            self.state = self.HALF_OPEN
+
+
+class ConnectionSupervisor(threading.Thread):
+    """
+    バックグラウンドで接続状態を監視し、切断を検知したら指数バックオフで再接続を繰り返す。
+    接続中は ready イベントがセットされ、ランナーはこれを待つことで切断中に空回りしない。
+    ヘルスチェックと再接続の処理本体は、ブローカースレッド上で実行される関数として受け取る。
+    """
+    def __init__(self, check_health: Callable[[], bool], reconnect: Callable[[], bool]):
+        super().__init__()
+        self.daemon = True
+        self.name = "MT5-ConnectionSupervisor"
+        self._check_health = check_health
+        self._reconnect = reconnect
+        self.breaker = CircuitBreaker(config.MT5_CIRCUIT_FAILURE_THRESHOLD)
+        self.ready = threading.Event()
+        self.stop_event = threading.Event()
+        self._check_now = threading.Event()
+
+    def mark_connected(self):
+        self.breaker.record_success()
+        self.ready.set()
+
+    def report_success(self):
+        if self.breaker.state != CircuitBreaker.CLOSED:
+            self.breaker.record_success()
+
+    def report_failure(self):
+        """データ取得の失敗を報告する。しきい値を超えたら即座にヘルスチェックを行う。"""
+        if self.breaker.record_failure():
+            logger.warning("MT5呼び出しの失敗が続いたため、サーキットブレーカーを開きました。")
+            self._check_now.set()
+
+    def stop(self):
+        self.stop_event.set()
+        self._check_now.set()
+
+    def run(self):
+        logger.info("MT5接続の監視を開始しました。")
+        while not self.stop_event.is_set():
+            self._check_now.wait(config.MT5_HEALTH_CHECK_INTERVAL_SECONDS)
+            self._check_now.clear()
+            if self.stop_event.is_set():
+                break
+            if self._safe(self._check_health):
+                if self.breaker.state != CircuitBreaker.CLOSED:
+                    self.mark_connected()
+                continue
+
+            logger.warning("MT5との接続が切断されています。バックグラウンドで再接続を試みます...")
+            self.ready.clear()
+            self.breaker.trip()
+            self._reconnect_with_backoff()
+        logger.info("MT5接続の監視を終了しました。")
+
+    def _reconnect_with_backoff(self):
+        delay = config.MT5_RECONNECT_BACKOFF_INITIAL_SECONDS
+        attempt = 0
+        while not self.stop_event.is_set():
+            attempt += 1
+            if self._safe(self._reconnect):
+                logger.info(f"MT5に再接続しました。(試行 {attempt} 回目)")
+                self.breaker.half_open()
+                self.ready.set()
+                return
+            # 複数プロセスが同時に再接続しないよう、待ち時間に揺らぎを加える
+            wait = min(delay, config.MT5_RECONNECT_BACKOFF_MAX_SECONDS) * random.uniform(0.8, 1.2)
+            logger.warning(f"MT5への再接続に失敗しました。(試行 {attempt} 回目) {wait:.1f} 秒後に再試行します。")
+            self.stop_event.wait(wait)
+            delay *= 2
+
+    @staticmethod
+    def _safe(fn: Callable[[], bool]) -> bool:
+        try:
+            return bool(fn())
+        except Exception as e:
+            logger.error(f"MT5接続の監視中にエラーが発生: {e}", exc_info=True)
+            return False
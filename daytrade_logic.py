@@ -1,29 +1,29 @@
 # daytrade_logic.py (戦略ロジック強化・修正版)
 
 import pandas as pd
-import pandas_ta as ta
 import logging
 import numpy as np
 from scipy.signal import find_peaks
 
+import indicator_cache
+import indicator_graph
+
 logger = logging.getLogger(__name__)
 
-# --- 1. インジケーター計算関数 (既存のものをそのまま利用) ---
+# generate_signal が使うインジケーター (add_all_indicators はこれだけを計算する)
+REQUIRED_INDICATORS = ['RSI_14']
 
-def add_rsi(df: pd.DataFrame, window: int = 14) -> pd.DataFrame:
-    if 'Close' not in df.columns: return df
-    df[f'RSI_{window}'] = ta.rsi(df['Close'], length=window)
-    return df
+# --- 1. インジケーター計算 ---
 
 def add_all_indicators(df: pd.DataFrame) -> pd.DataFrame:
     """このロジックで必要最低限のインジケーターのみ追加"""
     if df.empty: return df
     try:
-        df = add_rsi(df)
+        df = indicator_graph.evaluate(df, REQUIRED_INDICATORS)
         logger.info("RSIインジケーターを追加しました。(Strategic Logic)")
     except Exception as e:
         logger.error(f"インジケーターの追加中にエラーが発生しました: {e}", exc_info=True)
-    return df.copy()
+    return df
 
 # ★★★★★ ここからが「強い水平線」を特定するロジック ★★★★★
 
@@ -40,8 +40,9 @@ def find_strong_sr_levels(df: pd.DataFrame, symbol: str, peak_distance: int = 10
     point_unit = 0.01 if 'JPY' in symbol else 0.0001
     tolerance = cluster_tolerance_pips * point_unit
 
-    high_indices, _ = find_peaks(df['High'], distance=peak_distance)
-    low_indices, _ = find_peaks(-df['Low'], distance=peak_distance)
+    # 確定足だけの長い履歴では、同じ足の間は何度呼ばれても計算は1回
+    high_indices, _ = indicator_cache.compute(df, find_peaks, df['High'].to_numpy(), name='peaks_high', distance=peak_distance)
+    low_indices, _ = indicator_cache.compute(df, find_peaks, -df['Low'].to_numpy(), name='peaks_low', distance=peak_distance)
     all_highs = df['High'].iloc[high_indices].tolist()
     all_lows = df['Low'].iloc[low_indices].tolist()
 
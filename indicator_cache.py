@@ -0,0 +1,126 @@
+# indicator_cache.py (同じ足に対するインジケーター計算を1回にまとめる LRU キャッシュ)
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+import numpy as np
+import pandas as pd
+
+import config
+
+logger = logging.getLogger(__name__)
+
+class IndicatorCache:
+    """
+    (symbol, timeframe, 窓, インジケーター名, パラメータ) ごとの計算結果を持つ、件数に上限のある LRU キャッシュ。
+    Web UI からの分析や、モードの違うロジックが同じ足に対して同じインジケーターを求めても、計算は1回で済む。
+    結果の配列は書き換えられないようにしてから返す (DataFrame に代入すると pandas 側でコピーされる)。
+    """
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or config.INDICATOR_CACHE_MAX_ENTRIES
+        self._entries: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        # 計算はロックの外で行う (同時に同じキーが来た場合は両方が計算し、後の方が残る)
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def put(self, key: Hashable, value):
+        """計算済みの値を入れる (batch_indicators がまとめて計算した結果を銘柄ごとに配る)。"""
+        value = _freeze(value)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else None,
+            }
+
+
+def _freeze(value):
+    """配列 (と、dict / tuple の中の配列) を読み取り専用にする。"""
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _freeze(item)
+    elif isinstance(value, tuple):
+        for item in value:
+            _freeze(item)
+    return value
+
+
+def series_key(df: pd.DataFrame) -> Optional[tuple]:
+    """
+    DataFrame の窓を表すキー。symbol と timeframe は df.attrs (Bars.to_frame が設定する) から取り、
+    窓の先頭・最新の確定足・形成中の足の時刻と、形成中の足の OHLC の指紋を含める。
+    attrs が無い DataFrame はキャッシュしない (None)。
+    """
+    symbol, timeframe = df.attrs.get('symbol'), df.attrs.get('timeframe')
+    if symbol is None or timeframe is None or df.empty or not isinstance(df.index, pd.DatetimeIndex):
+        return None
+    # 時刻はインデックスの分解能によらないよう、ナノ秒に揃える
+    index = df.index
+    last_closed = index[-2].value if len(index) > 1 else None
+    forming = tuple(float(df[column].iat[-1]) for column in ('Open', 'High', 'Low', 'Close') if column in df.columns)
+    return (symbol, timeframe, len(df), index[0].value, last_closed, index[-1].value, forming)
+
+
+def rates_key(rates: np.ndarray, symbol: str, timeframe: str) -> tuple:
+    """Bars(rates, symbol, timeframe).to_frame() の series_key と同じキーを、DataFrame を作らずに求める。"""
+    times = rates['time'].astype(np.int64) * 1_000_000_000
+    last_closed = int(times[-2]) if len(times) > 1 else None
+    forming = rates[-1]
+    return (symbol, timeframe, len(rates), int(times[0]), last_closed, int(times[-1]),
+            (float(forming['open']), float(forming['high']), float(forming['low']), float(forming['close'])))
+
+
+def kernel_key(window_key: tuple, kernel: Callable, name: Optional[str], params: dict) -> tuple:
+    return window_key + (name or kernel.__name__, tuple(sorted(params.items())))
+
+
+def compute(df: pd.DataFrame, kernel: Callable, *arrays, name: Optional[str] = None, **params):
+    """
+    kernel(*arrays, **params) をキャッシュ越しに呼ぶ。arrays は df の列から作ったものを渡すこと
+    (キーは df の窓で決まるので、同じ窓の別の列に同じ kernel を使う場合は name で区別する)。
+    """
+    key = series_key(df) if config.INDICATOR_CACHE_ENABLED else None
+    if key is None:
+        return kernel(*arrays, **params)
+    return get_indicator_cache().get_or_compute(kernel_key(key, kernel, name, params), lambda: kernel(*arrays, **params))
+
+
+_shared_cache: Optional[IndicatorCache] = None
+_shared_lock = threading.Lock()
+
+def get_indicator_cache() -> IndicatorCache:
+    """プロセス内で共有する IndicatorCache を返す。"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = IndicatorCache()
+        return _shared_cache
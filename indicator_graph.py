@@ -0,0 +1,163 @@
+# indicator_graph.py (ロジックが宣言したインジケーターだけを、依存関係の順に計算する)
+
+import logging
+import re
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import indicator_cache
+import indicator_kernels as kernels
+
+logger = logging.getLogger(__name__)
+
+class FrameSource:
+    """DataFrame の列を入力にし、カーネルは indicator_cache 越しに呼ぶ (通常の1銘柄の計算)。"""
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+
+    def column(self, name: str) -> np.ndarray:
+        return self.df[name].to_numpy()
+
+    def kernel(self, kernel: Callable, *arrays, name: Optional[str] = None, **params):
+        return indicator_cache.compute(self.df, kernel, *arrays, name=name, **params)
+
+
+class _Node:
+    """グラフの1つの計算。deps の値が揃ってから compute(source, values) を呼び、{名前: 配列} を返す。"""
+    def __init__(self, name: str, deps: Tuple[str, ...], compute: Callable[[object, dict], Dict[str, np.ndarray]]):
+        self.name = name
+        self.deps = deps
+        self.compute = compute
+
+
+# --- 1. カラム名からノードを作る (名前の形式は indicator_kernels と同じ) ---
+
+def _ema_node(name: str, length: str) -> _Node:
+    return _Node(name, (), lambda source, values: {
+        name: source.kernel(kernels.ema, source.column('Close'), length=int(length)),
+    })
+
+
+def _rsi_node(name: str, length: str) -> _Node:
+    return _Node(name, (), lambda source, values: {
+        name: source.kernel(kernels.rsi, source.column('Close'), length=int(length)),
+    })
+
+
+def _atr_node(name: str, length: str) -> _Node:
+    return _Node(name, (), lambda source, values: {
+        name: source.kernel(kernels.atr, source.column('High'), source.column('Low'), source.column('Close'), length=int(length)),
+    })
+
+
+def _macd_node(name: str, fast: str, slow: str, signal: str) -> _Node:
+    """MACD は EMA_fast と EMA_slow のノードを使う (同じ EMA を宣言しているロジックとは計算を共有する)。"""
+    suffix = f'{fast}_{slow}_{signal}'
+
+    def compute(source, values):
+        line = values[f'EMA_{fast}'] - values[f'EMA_{slow}']
+        signal_line = source.kernel(kernels.ema, line, name=f'MACDs_{suffix}', length=int(signal))
+        return {f'MACD_{suffix}': line, f'MACDh_{suffix}': line - signal_line, f'MACDs_{suffix}': signal_line}
+
+    return _Node(f'MACD_{suffix}', (f'EMA_{fast}', f'EMA_{slow}'), compute)
+
+
+def _stoch_node(name: str, k: str, d: str, smooth_k: str) -> _Node:
+    suffix = f'{k}_{d}_{smooth_k}'
+    return _Node(f'STOCH_{suffix}', (), lambda source, values: source.kernel(
+        kernels.stoch, source.column('High'), source.column('Low'), source.column('Close'),
+        k=int(k), d=int(d), smooth_k=int(smooth_k)))
+
+
+def _bbands_node(name: str, length: str, std: str) -> _Node:
+    """BBL_20_2.0 形式と、signal_logic の BBL_20 形式 (標準偏差の乗数 2.0) の両方を受け付ける。"""
+    width = float(std) if std else 2.0
+    requested_suffix = f'{length}_{std}' if std else length
+    kernel_suffix = f'{length}_{width}'
+
+    def compute(source, values):
+        bands = source.kernel(kernels.bbands, source.column('Close'), length=int(length), std=width)
+        return {f'{key[:3]}_{requested_suffix}': bands[key] for key in
+                (f'BBL_{kernel_suffix}', f'BBM_{kernel_suffix}', f'BBU_{kernel_suffix}', f'BBB_{kernel_suffix}', f'BBP_{kernel_suffix}')}
+
+    return _Node(f'BB_{requested_suffix}', (), compute)
+
+
+_PATTERNS = [
+    (re.compile(r'EMA_(\d+)$'), _ema_node),
+    (re.compile(r'RSI_(\d+)$'), _rsi_node),
+    (re.compile(r'ATR_(\d+)$'), _atr_node),
+    (re.compile(r'MACD[hs]?_(\d+)_(\d+)_(\d+)$'), _macd_node),
+    (re.compile(r'STOCH[kd]_(\d+)_(\d+)_(\d+)$'), _stoch_node),
+    (re.compile(r'BB[LMUBP]_(\d+)(?:_(\d+(?:\.\d+)?))?$'), _bbands_node),
+]
+
+
+def _node_for(column: str) -> _Node:
+    for pattern, factory in _PATTERNS:
+        match = pattern.match(column)
+        if match:
+            return factory(column, *match.groups())
+    raise ValueError(f"未対応のインジケーターです: {column}")
+
+
+# --- 2. グラフ ---
+
+class IndicatorGraph:
+    """
+    ロジックが宣言したカラム (REQUIRED_INDICATORS) から依存関係を解決し、必要なノードだけを順に計算する。
+    MACD が使う EMA のような途中の値は1回だけ計算して共有し、DataFrame には宣言されたカラムだけを追加する。
+    """
+    def __init__(self, columns: Iterable[str]):
+        self.columns = list(columns)
+        self.plan: List[_Node] = []
+        self._node_of: Dict[str, str] = {}
+        resolved: Dict[str, _Node] = {}
+        for column in self.columns:
+            node = _node_for(column)
+            self._visit(node, resolved, set())
+            self._node_of[column] = node.name
+
+    def _visit(self, node: _Node, resolved: Dict[str, _Node], visiting: set):
+        if node.name in resolved:
+            return
+        if node.name in visiting:
+            raise ValueError(f"インジケーターの依存関係が循環しています: {node.name}")
+        visiting.add(node.name)
+        for dep in node.deps:
+            self._visit(_node_for(dep), resolved, visiting)
+        resolved[node.name] = node
+        self.plan.append(node)
+
+    def evaluate(self, df: pd.DataFrame) -> pd.DataFrame:
+        """宣言されたカラムを df に追加して返す。"""
+        values = self.compute(FrameSource(df))
+        for column in self.columns:
+            df[column] = values[column]
+        return df
+
+    def compute(self, source) -> Dict[str, np.ndarray]:
+        """source (column と kernel を持つもの) から、途中の値も含めた全ノードの値を計算する。"""
+        values: Dict[str, np.ndarray] = {}
+        for node in self.plan:
+            values.update(node.compute(source, values))
+        return values
+
+    def describe(self) -> List[str]:
+        """計算する順のノード名 (ログ・確認用)。"""
+        return [node.name for node in self.plan]
+
+
+@lru_cache(maxsize=None)
+def graph_for(columns: Tuple[str, ...]) -> IndicatorGraph:
+    """同じ宣言に対するグラフは1回だけ作る。"""
+    graph = IndicatorGraph(columns)
+    logger.debug(f"インジケーターのグラフを作りました: {graph.describe()}")
+    return graph
+
+
+def evaluate(df: pd.DataFrame, columns: Iterable[str]) -> pd.DataFrame:
+    return graph_for(tuple(columns)).evaluate(df)
@@ -0,0 +1,202 @@
+# indicator_kernels.py (pandas_ta を使わずに NumPy の配列だけで計算するインジケーター)
+"""
+使っているインジケーターを NumPy の配列で直接計算する。入力も出力も float64 の配列で、
+計算方法は pandas_ta 0.3.x の既定値と同じ (期間に満たない先頭は NaN)。
+(銘柄数, 本数) の2次元配列を渡すと、最後の軸を時間として全行をまとめて計算する (batch_indicators 用)。
+2次元の場合、NaN の位置は全行で同じであること。
+
+出力の名前は次の形で固定する (pandas_ta のバージョンによる小数点の有無などの揺れは無い)。
+複数の値を返すものは、この名前をキーにした dict を返す。
+
+    ema(close, 9)                      -> 配列              (EMA_9)
+    rsi(close, 14)                     -> 配列              (RSI_14)
+    atr(high, low, close, 14)          -> 配列              (ATR_14)
+    bbands(close, 20, 2.0)             -> BBL_20_2.0, BBM_20_2.0, BBU_20_2.0, BBB_20_2.0, BBP_20_2.0
+    macd(close, 12, 26, 9)             -> MACD_12_26_9, MACDh_12_26_9, MACDs_12_26_9
+    stoch(high, low, close, 14, 3, 3)  -> STOCHk_14_3_3, STOCHd_14_3_3
+    ichimoku(high, low, close, 9, 26, 52) -> ITS_9, IKS_26, ISA_9, ISB_26, ICS_26
+"""
+
+import logging
+from typing import Dict
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    from scipy.signal import lfilter
+except ImportError:
+    lfilter = None
+
+logger = logging.getLogger(__name__)
+
+# pandas_ta.non_zero_range と同じく、値幅が 0 のときは割り算の前に極小値を足す
+EPSILON = np.finfo(float).eps
+
+# --- 1. 共通の部品 ---
+
+def _as_float(values) -> np.ndarray:
+    return np.asarray(values, dtype=np.float64)
+
+
+def _first_valid(values: np.ndarray) -> int:
+    """最初に (全行で) NaN でなくなる位置。"""
+    valid = ~np.isnan(values)
+    if valid.ndim > 1:
+        valid = valid.all(axis=tuple(range(valid.ndim - 1)))
+    positions = np.flatnonzero(valid)
+    return int(positions[0]) if positions.size else values.shape[-1]
+
+
+def _recursive(values: np.ndarray, decay: float, initial) -> np.ndarray:
+    """y[i] = values[i] + decay * y[i-1] (y[-1] = initial) を最後の軸に沿って一度に計算する。"""
+    initial = np.asarray(initial, dtype=np.float64)
+    if lfilter is not None:
+        zi = np.broadcast_to(decay * initial, values.shape[:-1])[..., np.newaxis]
+        return lfilter([1.0], [1.0, -decay], values, axis=-1, zi=zi)[0]
+    result = np.empty_like(values)
+    previous = np.broadcast_to(initial, values.shape[:-1]).astype(np.float64)
+    for i in range(values.shape[-1]):
+        previous = values[..., i] + decay * previous
+        result[..., i] = previous
+    return result
+
+
+def _nonzero(values: np.ndarray) -> np.ndarray:
+    return np.where(values == 0, EPSILON, values)
+
+
+def sma(values, length: int) -> np.ndarray:
+    """単純移動平均。先頭の NaN は飛ばし、最初の有効な値から数える (pandas_ta の sma と同じ)。"""
+    values = _as_float(values)
+    result = np.full(values.shape, np.nan)
+    start = _first_valid(values)
+    if values.shape[-1] - start >= length:
+        result[..., start + length - 1:] = sliding_window_view(values[..., start:], length, axis=-1).mean(axis=-1)
+    return result
+
+
+def _rolling(values: np.ndarray, length: int, reducer) -> np.ndarray:
+    result = np.full(values.shape, np.nan)
+    if values.shape[-1] >= length:
+        result[..., length - 1:] = reducer(sliding_window_view(values, length, axis=-1), axis=-1)
+    return result
+
+
+def _rma(values: np.ndarray, length: int) -> np.ndarray:
+    """pandas_ta.rma: ewm(alpha=1/length, min_periods=length, adjust=True).mean()。先頭の NaN は飛ばす。"""
+    result = np.full(values.shape, np.nan)
+    start = _first_valid(values)
+    if values.shape[-1] - start < length:
+        return result
+    decay = 1.0 - 1.0 / length
+    body = values[..., start:]
+    numerator = _recursive(body, decay, 0.0)
+    denominator = (1.0 - decay ** np.arange(1, body.shape[-1] + 1)) / (1.0 - decay)
+    result[..., start + length - 1:] = (numerator / denominator)[..., length - 1:]
+    return result
+
+
+def _midprice(high: np.ndarray, low: np.ndarray, length: int) -> np.ndarray:
+    return 0.5 * (_rolling(high, length, np.max) + _rolling(low, length, np.min))
+
+
+def _shift(values: np.ndarray, periods: int) -> np.ndarray:
+    """pandas の shift と同じ (periods > 0 で後ろへずらし、空いた所は NaN)。"""
+    result = np.full(values.shape, np.nan)
+    if periods >= 0:
+        result[..., periods:] = values[..., :values.shape[-1] - periods]
+    else:
+        result[..., :periods] = values[..., -periods:]
+    return result
+
+# --- 2. インジケーター ---
+
+def ema(close, length: int) -> np.ndarray:
+    """pandas_ta.ema: 最初の length 本の単純平均を種にし、以降は alpha = 2 / (length + 1)。先頭の NaN は飛ばす。"""
+    close = _as_float(close)
+    result = np.full(close.shape, np.nan)
+    start = _first_valid(close)
+    if close.shape[-1] - start < length:
+        return result
+    alpha = 2.0 / (length + 1)
+    seed = close[..., start:start + length].mean(axis=-1)
+    seed_index = start + length - 1
+    result[..., seed_index] = seed
+    result[..., seed_index + 1:] = _recursive(alpha * close[..., seed_index + 1:], 1.0 - alpha, seed)
+    return result
+
+
+def rsi(close, length: int = 14) -> np.ndarray:
+    close = _as_float(close)
+    change = np.diff(close, axis=-1, prepend=np.nan)
+    gain = _rma(np.where(np.isnan(change), np.nan, np.maximum(change, 0.0)), length)
+    loss = _rma(np.where(np.isnan(change), np.nan, np.maximum(-change, 0.0)), length)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100.0 * gain / (gain + loss)
+
+
+def atr(high, low, close, length: int = 14) -> np.ndarray:
+    """pandas_ta.atr (mamode='rma')。"""
+    high, low, close = _as_float(high), _as_float(low), _as_float(close)
+    prev_close = _shift(close, 1)
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(prev_close - low)))
+    true_range[..., :1] = np.nan
+    return _rma(true_range, length)
+
+
+def bbands(close, length: int = 20, std: float = 2.0) -> Dict[str, np.ndarray]:
+    """pandas_ta.bbands (単純移動平均と ddof=0 の標準偏差)。"""
+    close = _as_float(close)
+    mid = _rolling(close, length, np.mean)
+    deviation = _rolling(close, length, np.std)
+    lower, upper = mid - std * deviation, mid + std * deviation
+    suffix = f'{length}_{float(std)}'
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            f'BBL_{suffix}': lower,
+            f'BBM_{suffix}': mid,
+            f'BBU_{suffix}': upper,
+            f'BBB_{suffix}': 100.0 * (upper - lower) / mid,
+            f'BBP_{suffix}': (close - lower) / _nonzero(upper - lower),
+        }
+
+
+def macd(close, fast: int = 12, slow: int = 26, signal: int = 9) -> Dict[str, np.ndarray]:
+    """pandas_ta.macd: シグナル線は MACD が出始めた足から EMA で計算する。"""
+    close = _as_float(close)
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    suffix = f'{fast}_{slow}_{signal}'
+    return {
+        f'MACD_{suffix}': line,
+        f'MACDh_{suffix}': line - signal_line,
+        f'MACDs_{suffix}': signal_line,
+    }
+
+
+def stoch(high, low, close, k: int = 14, d: int = 3, smooth_k: int = 3) -> Dict[str, np.ndarray]:
+    high, low, close = _as_float(high), _as_float(low), _as_float(close)
+    lowest = _rolling(low, k, np.min)
+    highest = _rolling(high, k, np.max)
+    raw = 100.0 * (close - lowest) / _nonzero(highest - lowest)
+    stoch_k = sma(raw, smooth_k)
+    suffix = f'{k}_{d}_{smooth_k}'
+    return {
+        f'STOCHk_{suffix}': stoch_k,
+        f'STOCHd_{suffix}': sma(stoch_k, d),
+    }
+
+
+def ichimoku(high, low, close, tenkan: int = 9, kijun: int = 26, senkou: int = 52) -> Dict[str, np.ndarray]:
+    """pandas_ta.ichimoku: 先行スパンは kijun 本先へ、遅行スパンは kijun 本前へずらした位置に置く。"""
+    high, low, close = _as_float(high), _as_float(low), _as_float(close)
+    tenkan_sen = _midprice(high, low, tenkan)
+    kijun_sen = _midprice(high, low, kijun)
+    return {
+        f'ITS_{tenkan}': tenkan_sen,
+        f'IKS_{kijun}': kijun_sen,
+        f'ISA_{tenkan}': _shift(0.5 * (tenkan_sen + kijun_sen), kijun),
+        f'ISB_{kijun}': _shift(_midprice(high, low, senkou), kijun),
+        f'ICS_{kijun}': _shift(close, -kijun),
+    }
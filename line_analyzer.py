@@ -6,11 +6,11 @@ import mplfinance as mpf
 from scipy.signal import find_peaks
 import logging
 from datetime import datetime
-import MetaTrader5 as mt5_api # ★★★ 修正点1: 正しいライブラリをインポート ★★★
 
 # 既存の自作モジュールをインポート
 import config
-from mt5_connector import MT5Connector
+from market_data import timeframe_value
+from bars import to_display_tz, to_display_time
 
 # ロギング設定
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -82,7 +82,7 @@ def plot_analysis_chart(df: pd.DataFrame, symbol: str, timeframe: str, sr_levels
                   colors=['g']*len(sr_levels['support']) + ['r']*len(sr_levels['resistance']),
                   linestyle='-.')
     
-    alines_list = [line for line in trend_lines.values() if line is not None]
+    alines_list = [[(to_display_time(t), p) for t, p in line] for line in trend_lines.values() if line is not None]
 
     # チャートのスタイル設定
     style = mpf.make_mpf_style(base_mpf_style='yahoo', figcolor='#1a1a2e', facecolor='#1a1a2e', 
@@ -92,7 +92,7 @@ def plot_analysis_chart(df: pd.DataFrame, symbol: str, timeframe: str, sr_levels
     output_filename = "analysis_chart.png"
     
     logger.info("チャートの描画を開始します...")
-    mpf.plot(df.tail(150), # 直近150本を描画
+    mpf.plot(to_display_tz(df.tail(150)), # 直近150本を描画
              type='candle',
              style=style,
              title=f"{symbol} {timeframe} Analysis",
@@ -107,24 +107,25 @@ def plot_analysis_chart(df: pd.DataFrame, symbol: str, timeframe: str, sr_levels
             )
     logger.info(f"チャートを {output_filename} として保存しました。")
 
-def main():
-    """メイン処理"""
+def main(data_source=None):
+    """メイン処理。data_source を省略した場合は MT5 に接続します (ReplayDataSource なども渡せます)。"""
     logger.info("ライン分析アプリを開始します。")
 
     # MT5に接続
-    mt5 = MT5Connector(path=config.MT5_PATH, login=config.MT5_LOGIN, 
-                       password=config.MT5_PASSWORD, server=config.MT5_SERVER)
-    if not mt5.connect():
+    if data_source is None:
+        from mt5_connector import MT5Connector
+        data_source = MT5Connector(path=config.MT5_PATH, login=config.MT5_LOGIN, 
+                                   password=config.MT5_PASSWORD, server=config.MT5_SERVER)
+    if not data_source.connect():
         logger.error("MT5への接続に失敗しました。アプリを終了します。")
         return
 
     # データを取得
-    # ★★★ 修正点2: mt5.mt5 ではなく、インポートした mt5_api を使う ★★★
-    timeframe_obj = getattr(mt5_api, f'TIMEFRAME_{TIMEFRAME_TO_ANALYZE.upper()}')
-    df = mt5.get_candlestick_data(SYMBOL_TO_ANALYZE, timeframe_obj, CANDLE_COUNT)
+    timeframe_obj = timeframe_value(TIMEFRAME_TO_ANALYZE)
+    df = data_source.get_candlestick_data(SYMBOL_TO_ANALYZE, timeframe_obj, CANDLE_COUNT)
     
     # MT5から切断
-    mt5.disconnect()
+    data_source.disconnect()
 
     if df.empty:
         logger.error("ローソク足データが取得できませんでした。")
@@ -0,0 +1,92 @@
+# market_data.py (マーケットデータ取得元の共通インターフェース)
+
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+from bars import Bars
+
+# MT5 の時間足定数 (MetaTrader5 パッケージの TIMEFRAME_* と同じ値)。
+# MetaTrader5 をインポートできない環境 (Linux のリプレイ・ベンチマーク) でも使えるようにここで定義する。
+TIMEFRAMES = {"M1": 1, "M5": 5, "M15": 15, "H1": 16385, "D1": 16408}
+TIMEFRAME_NAMES = {value: name for name, value in TIMEFRAMES.items()}
+TIMEFRAME_SECONDS = {
+    TIMEFRAMES["M1"]: 60, TIMEFRAMES["M5"]: 300, TIMEFRAMES["M15"]: 900,
+    TIMEFRAMES["H1"]: 3600, TIMEFRAMES["D1"]: 86400
+}
+
+# copy_rates_* が返すレコード配列と同じ型
+RATES_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+    ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8')
+])
+
+
+def timeframe_value(timeframe_str: str) -> int:
+    """'M1' や 'h1' などの時間足名を MT5 の時間足定数に変換する。"""
+    return TIMEFRAMES[timeframe_str.upper()]
+
+
+def timeframe_name(timeframe) -> str:
+    return TIMEFRAME_NAMES.get(timeframe, str(timeframe))
+
+
+class MarketDataSource:
+    """
+    ローソク足・ティックの取得元。MT5Connector (ライブ) と ReplayDataSource (CSV/Parquet のリプレイ) が実装する。
+    SignalRunner や分析スクリプトはこのインターフェースだけを使うので、どちらの取得元でも動く。
+    """
+    # リプレイ用の仮想時計。ライブの取得元では None (実時間で待つ)
+    clock = None
+
+    def connect(self) -> bool:
+        return True
+
+    def disconnect(self):
+        pass
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """データを取得できる状態になるまで待つ。ライブの取得元以外は常に準備完了。"""
+        return True
+
+    @property
+    def finished(self) -> bool:
+        """リプレイするデータが尽きたら True。ライブの取得元では常に False。"""
+        return False
+
+    def get_rates(self, symbol: str, timeframe, count: int = 500) -> Optional[np.ndarray]:
+        """ローソク足を copy_rates_* と同じレコード配列で返す (最後の要素は形成中の足)。"""
+        raise NotImplementedError
+
+    def get_bars(self, symbol: str, timeframe, count: int = 500) -> Optional[Bars]:
+        rates = self.get_rates(symbol, timeframe, count)
+        if rates is None or len(rates) == 0:
+            return None
+        return Bars(rates, symbol, timeframe_name(timeframe))
+
+    def get_history(self, symbol: str, timeframe, count: int) -> Optional[Bars]:
+        """
+        S/R 分析などに使う長い履歴を返す。ディスクに履歴を持たない取得元では get_bars() と同じ。
+        """
+        return self.get_bars(symbol, timeframe, count)
+
+    def get_candlestick_data(self, symbol: str, timeframe, count: int = 500) -> pd.DataFrame:
+        bars = self.get_bars(symbol, timeframe, count)
+        if bars is None:
+            return pd.DataFrame()
+        return bars.to_frame()
+
+    def get_ticks(self, symbol: str, from_msc: int, count: int = 100000) -> Optional[np.ndarray]:
+        """from_msc (ミリ秒) 以降のティックを返す。対応していない取得元は None を返す。"""
+        return None
+
+    def start_tick_stream(self, symbol: str):
+        """ティックから足を組み立てる TickStream を開始して返す。対応していない取得元は None を返す。"""
+        return None
+
+    def get_symbol_info(self, symbol: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def get_symbol_point(self, symbol: str) -> Optional[float]:
+        info = self.get_symbol_info(symbol)
+        return info["point"] if info else None
@@ -0,0 +1,176 @@
+# market_data_hub.py (シンボル単位のデータハブ: M1 から上位足を集約)
+
+import logging
+import threading
+import time
+import numpy as np
+from typing import Dict, Optional
+
+import config
+from bar_cache import BarRingBuffer
+from market_data import MarketDataSource, TIMEFRAMES, TIMEFRAME_SECONDS
+
+logger = logging.getLogger(__name__)
+
+class _SymbolState:
+    """1シンボル分の M1 と集約済み上位足の状態。"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.m1_rates: Optional[np.ndarray] = None
+        self.m1_refreshed_at = 0.0
+        self.derived: Dict[int, BarRingBuffer] = {}
+        self.verified_at: Dict[int, float] = {}
+
+
+class MarketDataHub(MarketDataSource):
+    """
+    シンボルごとに M1 を1回だけ取得し、M5/M15/H1 (設定により D1 も) を集約で組み立てる。
+    MarketDataSource を実装しているので、SignalRunner からは MT5Connector と同じように使える。
+    集約した足は定期的にブローカーの足と照合し、ずれていればブローカーの足で作り直す。
+    """
+    def __init__(self, mt5_connector, derive_d1: bool = None):
+        self.mt5 = mt5_connector
+        if derive_d1 is None:
+            derive_d1 = config.DATA_HUB_DERIVE_D1
+        self.m1 = TIMEFRAMES['M1']
+        derived_names = ['M5', 'M15', 'H1'] + (['D1'] if derive_d1 else [])
+        self.derived_timeframes = [TIMEFRAMES[name] for name in derived_names]
+        self.refresh_seconds = config.DATA_HUB_M1_REFRESH_SECONDS
+        self.verify_interval = config.DATA_HUB_VERIFY_INTERVAL_SECONDS
+        self._states: Dict[str, _SymbolState] = {}
+        self._states_lock = threading.Lock()
+        logger.info(f"MarketDataHub を初期化しました。集約対象: {derived_names}")
+
+    def _state(self, symbol: str) -> _SymbolState:
+        with self._states_lock:
+            return self._states.setdefault(symbol, _SymbolState())
+
+    # --- 公開API (MarketDataSource) ---
+
+    def get_rates(self, symbol: str, timeframe, count: int = 500) -> Optional[np.ndarray]:
+        if timeframe != self.m1 and timeframe not in self.derived_timeframes:
+            return self.mt5.get_rates(symbol, timeframe, count)
+
+        state = self._state(symbol)
+        with state.lock:
+            if not self._refresh(symbol, state, count):
+                return None
+            if timeframe == self.m1:
+                return state.m1_rates[-count:].copy()
+            buffer = state.derived.get(timeframe)
+            if buffer is None or buffer.size == 0:
+                return None
+            return buffer.window(count).copy()
+
+    def get_symbol_info(self, symbol: str) -> Optional[dict]:
+        return self.mt5.get_symbol_info(symbol)
+
+    def get_history(self, symbol: str, timeframe, count: int):
+        return self.mt5.get_history(symbol, timeframe, count)
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        return self.mt5.wait_until_ready(timeout)
+
+    def start_tick_stream(self, symbol: str):
+        return self.mt5.start_tick_stream(symbol)
+
+    @property
+    def clock(self):
+        return self.mt5.clock
+
+    @property
+    def finished(self) -> bool:
+        return self.mt5.finished
+
+    # --- 内部処理 ---
+
+    def _refresh(self, symbol: str, state: _SymbolState, count: int) -> bool:
+        """M1 を (一定間隔に1回だけ) 取得し直し、全ての上位足を更新する。"""
+        now = time.time()
+        if state.m1_rates is not None and now - state.m1_refreshed_at < self.refresh_seconds:
+            return True
+
+        # 最大の上位足の1本分を M1 で必ず覆えるだけの本数を取る
+        longest = max(TIMEFRAME_SECONDS[tf] for tf in self.derived_timeframes)
+        m1_count = max(count, 2 * longest // 60)
+        m1_rates = self.mt5.get_rates(symbol, self.m1, m1_count)
+        if m1_rates is None or len(m1_rates) == 0:
+            return state.m1_rates is not None
+        state.m1_rates = m1_rates
+        state.m1_refreshed_at = now
+
+        for timeframe in self.derived_timeframes:
+            buffer = state.derived.get(timeframe)
+            if buffer is None or buffer.capacity < count:
+                buffer = state.derived[timeframe] = BarRingBuffer(count)
+            self._update_derived(symbol, timeframe, buffer, m1_rates)
+            if now - state.verified_at.get(timeframe, 0) >= self.verify_interval:
+                state.verified_at[timeframe] = now
+                self._verify_against_broker(symbol, timeframe, buffer)
+        return True
+
+    def _update_derived(self, symbol: str, timeframe, buffer: BarRingBuffer, m1_rates: np.ndarray):
+        """最後の上位足 (形成中の足を含む) 以降の M1 を集約して buffer に取り込む。"""
+        tf_seconds = TIMEFRAME_SECONDS[timeframe]
+        if buffer.size == 0 or int(m1_rates['time'][0]) > buffer.last_time:
+            # 初回、または M1 が最後の上位足を覆えていない場合はブローカーの足で種をまく
+            self._seed_from_broker(symbol, timeframe, buffer)
+            return
+
+        recent = m1_rates[m1_rates['time'] >= buffer.last_time]
+        if len(recent) > 0:
+            buffer.extend(aggregate_rates(recent, tf_seconds))
+        # 集約した上位足はブローカーから取得しないので、確定済みの足はここでディスクに書き込む
+        store = getattr(self.mt5, 'bar_store', None)
+        if store is not None and buffer.size > 1:
+            store.append(symbol, timeframe, buffer.window(buffer.size)[:-1])
+
+    def _seed_from_broker(self, symbol: str, timeframe, buffer: BarRingBuffer):
+        rates = self.mt5.get_rates(symbol, timeframe, buffer.capacity)
+        if rates is not None and len(rates) > 0:
+            buffer.reset(rates)
+
+    def _verify_against_broker(self, symbol: str, timeframe, buffer: BarRingBuffer):
+        """確定済みの直近の足をブローカーの足と照合し、ずれていれば作り直す。"""
+        broker = self.mt5.get_rates(symbol, timeframe, 3)
+        if broker is None or len(broker) < 2 or buffer.size < 2:
+            return
+        ours = buffer.window(buffer.size)
+        closed = broker[:-1]
+        matched = ours[np.isin(ours['time'], closed['time'])]
+        closed = closed[np.isin(closed['time'], matched['time'])]
+        fields = ['open', 'high', 'low', 'close']
+        if len(matched) == len(closed) and all(np.allclose(matched[f], closed[f]) for f in fields):
+            return
+        logger.warning(f"[{symbol}-{timeframe}] 集約した足がブローカーの足と一致しません。ブローカーの足で作り直します。")
+        self._seed_from_broker(symbol, timeframe, buffer)
+
+
+def wrap_source(data_source):
+    """
+    DATA_HUB_ENABLED なら、ライブの取得元を MarketDataHub で包んで返す。
+    リプレイの取得元 (仮想時計あり) と、既に包んであるものはそのまま返す。
+    """
+    if not config.DATA_HUB_ENABLED or data_source.clock is not None or isinstance(data_source, MarketDataHub):
+        return data_source
+    return MarketDataHub(data_source)
+
+
+def aggregate_rates(m1_rates: np.ndarray, tf_seconds: int) -> np.ndarray:
+    """時刻昇順の M1 レコード配列を tf_seconds 秒ごとの足に集約する。"""
+    buckets = m1_rates['time'] - m1_rates['time'] % tf_seconds
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(m1_rates)] - 1
+
+    out = np.zeros(len(starts), dtype=m1_rates.dtype)
+    out['time'] = buckets[starts]
+    out['open'] = m1_rates['open'][starts]
+    out['high'] = np.maximum.reduceat(m1_rates['high'], starts)
+    out['low'] = np.minimum.reduceat(m1_rates['low'], starts)
+    out['close'] = m1_rates['close'][ends]
+    for name in ('tick_volume', 'real_volume'):
+        if name in m1_rates.dtype.names:
+            out[name] = np.add.reduceat(m1_rates[name], starts)
+    if 'spread' in m1_rates.dtype.names:
+        out['spread'] = m1_rates['spread'][ends]
+    return out
@@ -0,0 +1,84 @@
+# market_sessions.py (シンボル種別ごとの取引時間と、ボラティリティに応じたポーリング間隔)
+
+import logging
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pytz
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# FX・貴金属の週の区切りはニューヨーク時間 17:00 (夏時間の切り替えは pytz に任せる)
+NEW_YORK = pytz.timezone('America/New_York')
+ROLLOVER_MINUTES = 17 * 60
+
+class MarketCalendar:
+    """
+    シンボル種別 (config.SYMBOL_CLASSES) ごとの取引時間。
+    - crypto: 24時間365日
+    - fx: 日曜 17:00 〜 金曜 17:00 (ニューヨーク時間)
+    - metal: fx と同じ週の区切りに加え、毎日 17:00 〜 18:00 (ニューヨーク時間) は休止
+    祝日やブローカー独自のメンテナンスは扱わない (その間はデータが来ないだけで、ランナーはスキップする)。
+    """
+    def symbol_class(self, symbol: str) -> str:
+        return config.SYMBOL_CLASSES.get(symbol, 'fx')
+
+    def is_open(self, symbol: str, epoch: float) -> bool:
+        symbol_class = self.symbol_class(symbol)
+        if symbol_class == 'crypto':
+            return True
+
+        ny = datetime.fromtimestamp(epoch, tz=NEW_YORK)
+        weekday = ny.weekday()  # 月曜 = 0, 日曜 = 6
+        minutes = ny.hour * 60 + ny.minute
+        reopen = ROLLOVER_MINUTES + (60 if symbol_class == 'metal' else 0)
+        if weekday == 5:
+            return False
+        if weekday == 6:
+            return minutes >= reopen
+        if weekday == 4 and minutes >= ROLLOVER_MINUTES:
+            return False
+        if symbol_class == 'metal' and ROLLOVER_MINUTES <= minutes < reopen:
+            return False
+        return True
+
+    def seconds_until_open(self, symbol: str, epoch: float, step: int = 900) -> float:
+        """次に市場が開くまでのおおよその秒数 (step 秒刻みで探す)。開いていれば 0。"""
+        if self.is_open(symbol, epoch):
+            return 0.0
+        start = epoch - epoch % step
+        for k in range(1, 8 * 86400 // step):
+            if self.is_open(symbol, start + k * step):
+                return start + k * step - epoch
+        return float(8 * 86400)
+
+
+def activity_ratio(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14, baseline: int = 100) -> Optional[float]:
+    """直近 period 本の ATR を、直近 baseline 本の ATR で割った値 (1 より大きければ普段より活発)。"""
+    if len(close) < period + 1:
+        return None
+    prev_close = close[:-1]
+    true_range = np.maximum(high[1:], prev_close) - np.minimum(low[1:], prev_close)
+    recent = true_range[-period:].mean()
+    base = true_range[-baseline:].mean()
+    if base <= 0:
+        return None
+    return float(recent / base)
+
+
+class ActivityGauge:
+    """ATR の比率から、足の途中でのポーリング間隔にかける倍率を決める (活発なら短く、静かなら長く)。"""
+    def __init__(self, min_factor: Optional[float] = None, max_factor: Optional[float] = None):
+        self.min_factor = config.ADAPTIVE_POLL_MIN_FACTOR if min_factor is None else min_factor
+        self.max_factor = config.ADAPTIVE_POLL_MAX_FACTOR if max_factor is None else max_factor
+
+    def interval_factor(self, bars) -> float:
+        # 形成中の足は値幅がまだ小さいので除いて測る
+        closed = bars.rates[:-1]
+        ratio = activity_ratio(closed['high'], closed['low'], closed['close'])
+        if ratio is None:
+            return 1.0
+        return float(np.clip(1.0 / ratio, self.min_factor, self.max_factor))
@@ -1,30 +1,89 @@
 # mt5_connector.py (自動再接続機能付き 最終修正版)
 
 import MetaTrader5 as mt5
+import numpy as np
 import pandas as pd
 import logging
+import threading
 import time
 import pytz
-from typing import Optional
+from collections import deque
+from typing import Callable, Dict, List, Optional
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from bar_cache import BarCache
+from bar_store import BarStore
+from bars import Bars
+from market_data import MarketDataSource, TIMEFRAME_NAMES, TIMEFRAME_SECONDS
+from broker_actor import BrokerActor
+from connection_supervisor import ConnectionSupervisor
+from symbol_registry import SymbolRegistry
+import config
 
 logger = logging.getLogger(__name__)
 
-class MT5Connector:
+# last_error() のうち、ターミナルとの通信 (IPC) の失敗を表すコード (RES_E_INTERNAL_FAIL_*)
+IPC_ERROR_CODES = range(-10005, -9999)
+
+class MT5Connector(MarketDataSource):
     def __init__(self, path: str, login: int, password: str, server: str):
         self.path = path
         self.login = login
         self.password = password
         self.server = server
         self._is_connected = False
-        self._last_connect_attempt = 0
+        self._bar_cache = BarCache()
+        # 確定済みの足をディスクにも書き込み、再起動時の種と長期の履歴に使う
+        self.bar_store = BarStore(config.BAR_STORE_DIR) if config.BAR_STORE_ENABLED else None
+        self.symbols = SymbolRegistry()
+        # ターミナルへの呼び出しは全てこのスレッドで直列に実行する
+        self._actor = BrokerActor()
+        self._actor.start()
+        self._tick_streams: Dict[str, 'TickStream'] = {}
+        # 接続の監視と再接続はバックグラウンドで行う (connect() の成功後に開始)
+        self.supervisor = ConnectionSupervisor(
+            check_health=self._check_health,
+            reconnect=lambda: self._actor.call(('connect',), self._connect, timeout=config.BROKER_CALL_TIMEOUT_SECONDS),
+        )
+
+    def call(self, fn, *args, key=None, **kwargs):
+        """
+        任意の MetaTrader5 関数をブローカースレッドで実行し、結果を返します (例: mt5.order_send)。
+        ターミナルが切断中 (サーキットブレーカーが open) の間は待たずに None を返します。
+        """
+        if not self.supervisor.breaker.allow():
+            return None
+        try:
+            return self._actor.call(key, fn, *args, timeout=config.BROKER_CALL_TIMEOUT_SECONDS, **kwargs)
+        except FutureTimeoutError:
+            logger.error(f"MT5呼び出しがタイムアウトしました: {getattr(fn, '__name__', fn)}")
+            return None
+        except Exception:
+            return None
 
     def connect(self) -> bool:
-        """MT5ターミナルに接続または再接続を試みます。"""
-        # 頻繁な再接続を防ぐ
-        if time.time() - self._last_connect_attempt < 10:
-            return self._is_connected
+        """
+        MT5ターミナルに接続します。以降の監視と再接続はバックグラウンドで行うため、
+        ここで失敗しても監視スレッドがバックオフしながら接続を試み続けます。
+        """
+        connected = bool(self._actor.call(('connect',), self._connect))
+        if connected:
+            self.supervisor.mark_connected()
+        if not self.supervisor.is_alive():
+            self.supervisor.start()
+        return connected
+
+    def disconnect(self):
+        """MT5ターミナルから切断します。"""
+        self.supervisor.stop()
+        self.supervisor.ready.clear()
+        self._actor.call(('disconnect',), self._disconnect)
 
-        self._last_connect_attempt = time.time()
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """ターミナルに接続済みになるまで待ちます。timeout 秒以内に接続できなければ False を返します。"""
+        return self.supervisor.ready.wait(timeout)
+
+    def _connect(self) -> bool:
         logger.info("MT5への接続を試みています...")
         
         # 既に初期化されている場合はシャットダウン
@@ -44,6 +103,10 @@ class MT5Connector:
             return False
 
         self._is_connected = True
+        # 再接続後は選択状態が失われている可能性があるため、シンボルを登録し直す
+        symbols = set(self.symbols.known_symbols()) | set(config.SYMBOL_DISPLAY_ORDER)
+        self.symbols.invalidate()
+        self.symbols.warm_up(sorted(symbols))
         account_info = mt5.account_info()
         if account_info:
             logger.info(f"MT5に正常にログインしました。アカウント: {account_info.login}, 口座残高: {account_info.balance:.2f} {account_info.currency}")
@@ -51,55 +114,288 @@ class MT5Connector:
             logger.warning(f"MT5アカウント情報の取得に失敗しました。エラーコード: {mt5.last_error()}")
         return True
 
-    def disconnect(self):
-        """MT5ターミナルから切断します。"""
+    def _disconnect(self):
         if self._is_connected:
             mt5.shutdown()
             self._is_connected = False
             logger.info("MT5から正常に切断しました。")
 
-    def _check_connection(self) -> bool:
-        """接続状態を確認し、切断されている場合は再接続を試みる"""
+    def _check_health(self) -> bool:
+        """
+        監視スレッドからの状態確認。ターミナルが固まってブローカースレッドが応答しなければ、
+        監視スレッドまで止まらないようタイムアウトで打ち切り、切断とみなす。
+        """
+        try:
+            return self._actor.call(('health',), self._is_terminal_connected, timeout=config.BROKER_CALL_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            logger.error("MT5の状態確認がタイムアウトしました。ターミナルが応答していないため、切断とみなします。")
+            return False
+
+    def _is_terminal_failure(self) -> bool:
+        """直前の取得の失敗が、ターミナルの切断か通信 (IPC) の失敗によるものか。"""
+        error = mt5.last_error()
+        if error and error[0] in IPC_ERROR_CODES:
+            return True
+        return not self._is_terminal_connected()
+
+    def _is_terminal_connected(self) -> bool:
         terminal_info = mt5.terminal_info()
-        if terminal_info is None or terminal_info.connected is False:
-            logger.warning("MT5との接続が切断されています。再接続を試みます...")
-            self._is_connected = False
-            return self.connect()
-        return True
+        connected = terminal_info is not None and terminal_info.connected is not False
+        self._is_connected = connected
+        return connected
+
+    def get_bars(self, symbol: str, timeframe, count: int = 500) -> Optional[Bars]:
+        """ローソク足を pandas に変換せず、配列ベースの Bars として返します。"""
+        rates = self.get_rates(symbol, timeframe, count)
+        if rates is None:
+            return None
+        logger.info(f"'{symbol}' ({self._get_timeframe_name(timeframe)}) のデータを {len(rates)} 件取得しました。")
+        return Bars(rates, symbol, self._get_timeframe_name(timeframe))
 
-    def get_candlestick_data(self, symbol: str, timeframe, count: int = 500) -> pd.DataFrame:
-        """指定された通貨ペアと時間足のローソク足データを取得します。"""
-        if not self._check_connection():
-            logger.error("MT5への接続を確立できませんでした。")
-            return pd.DataFrame()
+    def get_rates(self, symbol: str, timeframe, count: int = 500) -> Optional[np.ndarray]:
+        """
+        ローソク足を MT5 のレコード配列 (time, open, high, low, close, tick_volume, ...) のまま返します。
+        同じ要求が同時に来た場合は1回の取得にまとめ、同じ配列を返すので、呼び出し側で書き換えないこと。
+        """
+        return self.call(self._get_rates, symbol, timeframe, count, key=('rates', symbol, timeframe, count))
 
-        # 気配値表示にシンボルを追加し、最新価格情報を取得する
-        if not mt5.symbol_select(symbol, True):
-            logger.warning(f"シンボル '{symbol}' を気配値表示に追加できませんでした。データ取得に失敗する可能性があります。")
-            
-        time.sleep(0.1) # サーバーからの応答を待つ
+    def _get_rates(self, symbol: str, timeframe, count: int) -> Optional[np.ndarray]:
+        # 気配値表示への追加は初回だけ行う (以降はキャッシュを参照)
+        self.symbols.ensure(symbol)
 
-        rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, count)
-        if rates is None or len(rates) == 0:
+        buffer = self._fetch_rates(symbol, timeframe, count)
+        if buffer is None and self.symbols.reselect_if_missing(symbol):
+            buffer = self._fetch_rates(symbol, timeframe, count)
+        if buffer is None:
             logger.warning(f"'{symbol}' ({self._get_timeframe_name(timeframe)}) のローソク足データが空です。スキップします。")
-            return pd.DataFrame()
+            # シンボル固有のデータ不足ではブレーカーを開かない (1つのシンボルのせいで全ペアが止まらないように)
+            if self._is_terminal_failure():
+                self.supervisor.report_failure()
+            return None
 
-        df = pd.DataFrame(rates)
-        df['Time'] = pd.to_datetime(df['time'], unit='s', utc=True).dt.tz_convert('Asia/Tokyo')
-        df = df.set_index('Time')
-        df.rename(columns={'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'tick_volume': 'Volume'}, inplace=True)
-        
-        logger.info(f"'{symbol}' ({self._get_timeframe_name(timeframe)}) のデータを {len(df)} 件取得しました。")
-        return df[['Open', 'High', 'Low', 'Close', 'Volume']]
+        self.supervisor.report_success()
+        with buffer.lock:
+            return buffer.window(count).copy()
+
+    def get_history(self, symbol: str, timeframe, count: int) -> Optional[Bars]:
+        """ディスクに保存済みの確定足を最大 count 本返します (ターミナルは呼びません)。"""
+        if self.bar_store is None:
+            return super().get_history(symbol, timeframe, count)
+        rates = self.bar_store.read(symbol, timeframe, count)
+        if rates is None:
+            return None
+        return Bars(rates, symbol, self._get_timeframe_name(timeframe))
+
+    def _fetch_rates(self, symbol: str, timeframe, count: int):
+        buffer = self._fetch_rates_to_buffer(symbol, timeframe, count)
+        if buffer is not None and self.bar_store is not None and buffer.size > 1:
+            # 形成中の足 (最後の1本) を除いた確定足を追記する
+            self.bar_store.append(symbol, timeframe, buffer.window(buffer.size)[:-1])
+        return buffer
 
-    def get_symbol_point(self, symbol: str) -> Optional[float]:
-        if not self._check_connection(): return None
-        info = mt5.symbol_info(symbol)
-        return info.point if info else None
+    def _fetch_rates_to_buffer(self, symbol: str, timeframe, count: int):
+        """
+        キャッシュ済みの最終バー以降 (形成中の足を含む) だけをターミナルから取得し、
+        リングバッファを更新する。キャッシュが無い、または取りこぼしがある場合は count 本を取り直す。
+        起動直後はディスクに保存済みの足で種をまき、その続きだけを取得する。
+        """
+        tf_seconds = TIMEFRAME_SECONDS.get(timeframe)
+        buffer = self._bar_cache.get(symbol, timeframe, count)
+        with buffer.lock:
+            if buffer.size == 0 and self.bar_store is not None and self._seed_from_store(symbol, timeframe, buffer, count):
+                return buffer
+
+            if buffer.size > 0 and tf_seconds:
+                elapsed_bars = int((time.time() - buffer.fetched_at) // tf_seconds) + 2
+                if elapsed_bars < count:
+                    rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, elapsed_bars)
+                    # 取得した最古のバーがキャッシュの最終バーより新しければ、間が抜けているので取り直す
+                    if rates is not None and len(rates) > 0 and int(rates['time'][0]) <= buffer.last_time:
+                        buffer.extend(rates)
+                        buffer.fetched_at = time.time()
+                        return buffer
+
+            rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, count)
+            if rates is None or len(rates) == 0:
+                return None
+            buffer.reset(rates)
+            buffer.fetched_at = time.time()
+            return buffer
+
+    def _seed_from_store(self, symbol: str, timeframe, buffer, count: int) -> bool:
+        """
+        保存済みの足で buffer を埋め、最後の保存済みの足以降をターミナルから取得してつなげる。
+        バーの時刻はサーバー時刻なのでローカル時刻から本数を見積もらず、期間指定で取得する。
+        """
+        stored = self.bar_store.read(symbol, timeframe, count)
+        if stored is None:
+            return False
+        last_time = int(stored['time'][-1])
+        rates = mt5.copy_rates_range(symbol, timeframe, last_time, int(time.time()) + 86400)
+        # 保存済みの最終バーと重なっていなければ、間が抜けているので通常の取得に任せる
+        if rates is None or len(rates) == 0 or int(rates['time'][0]) != last_time:
+            return False
+        buffer.reset(stored)
+        buffer.extend(rates)
+        buffer.fetched_at = time.time()
+        logger.info(f"'{symbol}' ({self._get_timeframe_name(timeframe)}) を保存済みの {len(stored)} 件から再開しました。(新規 {len(rates) - 1} 件)")
+        return True
+
+    def get_symbol_info(self, symbol: str) -> Optional[dict]:
+        """キャッシュ済みのシンボル情報 (point, digits, contract_size, trade_mode など) を返します。"""
+        info = self.symbols.get_cached(symbol)
+        if info is not None:
+            return info
+        return self.call(self._load_symbol_info, symbol, key=('symbol_info', symbol))
+
+    def _load_symbol_info(self, symbol: str) -> Optional[dict]:
+        return self.symbols.ensure(symbol)
+
+    def start_tick_stream(self, symbol: str) -> 'TickStream':
+        """シンボルのティック取り込みを開始します (既に開始済みならそのストリームを返します)。"""
+        stream = self._tick_streams.get(symbol)
+        if stream is None or not stream.is_alive():
+            stream = TickStream(self, symbol)
+            self._tick_streams[symbol] = stream
+            stream.start()
+        return stream
+
+    def stop_tick_streams(self):
+        for stream in self._tick_streams.values():
+            stream.stop()
+        self._tick_streams.clear()
 
     def _get_timeframe_name(self, timeframe) -> str:
-        timeframe_map = {
-            mt5.TIMEFRAME_M1: "M1", mt5.TIMEFRAME_M5: "M5", mt5.TIMEFRAME_M15: "M15",
-            mt5.TIMEFRAME_H1: "H1", mt5.TIMEFRAME_D1: "D1"
-        }
-        return timeframe_map.get(timeframe, str(timeframe))
\ No newline at end of file
+        return TIMEFRAME_NAMES.get(timeframe, str(timeframe))
+
+
+class TickStream(threading.Thread):
+    """
+    copy_ticks_from をカーソル (time_msc) 付きでポーリングし、Bid から OHLCV の足をメモリ上で組み立てる。
+    購読者には「ティック」と「足の確定」をコールバックで通知する。
+    足の確定は、次の足のティックが届いたとき、またはサーバー時刻で足の終了時刻を過ぎたときに行う。
+    """
+    BAR_DTYPE = np.dtype([('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'), ('tick_volume', '<u8')])
+
+    def __init__(self, connector: MT5Connector, symbol: str, bar_seconds: int = 60, history: int = 500):
+        super().__init__()
+        self.daemon = True
+        self.name = f"TickStream-{symbol}"
+        self.connector = connector
+        self.symbol = symbol
+        self.bar_seconds = bar_seconds
+        self.poll_interval = config.TICK_POLL_INTERVAL_SECONDS
+        self.stop_event = threading.Event()
+
+        self.closed_bars: deque = deque(maxlen=history)
+        self.forming_bar: Optional[np.void] = None
+        # ティックの時刻はサーバー時刻 (UTC+2/+3 など) なので、ローカル時刻ではなくサーバーの最新ティックから始める
+        self._cursor_msc: Optional[int] = None
+        self._seen_at_cursor = 0  # カーソルと同じミリ秒のティックを処理済みの件数
+        self._server_offset: Optional[float] = None  # サーバー時刻 - ローカル時刻 (秒) の推定値
+        self._tick_callbacks: List[Callable] = []
+        self._bar_callbacks: List[Callable] = []
+        self._lock = threading.Lock()
+
+    def subscribe_tick(self, callback: Callable):
+        """callback(symbol, tick) をティックごとに呼び出す。"""
+        self._tick_callbacks.append(callback)
+
+    def subscribe_bar_closed(self, callback: Callable):
+        """callback(symbol, bar) を足が確定するたびに呼び出す。"""
+        self._bar_callbacks.append(callback)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        logger.info(f"[{self.symbol}] ティックストリームを開始しました。")
+        while not self.stop_event.is_set():
+            try:
+                if self._cursor_msc is None and not self._seed_cursor():
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+                ticks = self.connector.call(mt5.copy_ticks_from, self.symbol, self._cursor_msc // 1000, 100000,
+                                            mt5.COPY_TICKS_ALL, key=('ticks', self.symbol))
+                if ticks is not None and len(ticks) > 0:
+                    self._ingest(ticks)
+                self._close_if_expired()
+            except Exception as e:
+                logger.error(f"[{self.symbol}] ティック取り込み中にエラーが発生: {e}", exc_info=True)
+            self.stop_event.wait(self.poll_interval)
+        logger.info(f"[{self.symbol}] ティックストリームを終了しました。")
+
+    def _seed_cursor(self) -> bool:
+        """サーバーの最新ティックの時刻をカーソルにする。取得できなければ False (次のポーリングで再試行)。"""
+        tick = self.connector.call(mt5.symbol_info_tick, self.symbol)
+        if tick is None or not tick.time_msc:
+            return False
+        self._cursor_msc = int(tick.time_msc)
+        self._seen_at_cursor = 0 # 最新ティックは形成中の足の始まりとして取り込む
+        self._server_offset = tick.time_msc / 1000 - time.time()
+        return True
+
+    def _ingest(self, ticks: np.ndarray):
+        # 前回のカーソル以前のティックは処理済みなので捨てる (同じミリ秒のものは件数で判定)
+        msc = ticks['time_msc']
+        same_ms = np.flatnonzero(msc == self._cursor_msc)
+        fresh = msc > self._cursor_msc
+        if len(same_ms) > self._seen_at_cursor:
+            fresh[same_ms[self._seen_at_cursor:]] = True
+        ticks = ticks[fresh]
+        if len(ticks) == 0:
+            return
+
+        last_msc = int(ticks['time_msc'][-1])
+        seen = int(np.count_nonzero(ticks['time_msc'] == last_msc))
+        self._seen_at_cursor = seen + (self._seen_at_cursor if last_msc == self._cursor_msc else 0)
+        self._cursor_msc = last_msc
+        # ティックの時刻はサーバーの現在時刻を超えないので、観測した差の最大値を推定値とする
+        offset = last_msc / 1000 - time.time()
+        if self._server_offset is None or offset > self._server_offset:
+            self._server_offset = offset
+
+        for tick in ticks:
+            bid = float(tick['bid'])
+            if bid <= 0:
+                continue
+            tick_time = int(tick['time_msc']) // 1000
+            bar_time = tick_time - tick_time % self.bar_seconds
+            with self._lock:
+                if self.forming_bar is not None and bar_time > int(self.forming_bar['time']):
+                    closed = self._close_forming_bar()
+                else:
+                    closed = None
+                if self.forming_bar is None:
+                    self.forming_bar = np.array([(bar_time, bid, bid, bid, bid, 0)], dtype=self.BAR_DTYPE)[0]
+                bar = self.forming_bar
+                bar['high'] = max(bar['high'], bid)
+                bar['low'] = min(bar['low'], bid)
+                bar['close'] = bid
+                bar['tick_volume'] += 1
+            if closed is not None:
+                self._notify(self._bar_callbacks, closed)
+            self._notify(self._tick_callbacks, tick)
+
+    def _close_if_expired(self):
+        """ティックが来なくても、サーバー時刻で足の終了時刻を過ぎていれば確定させる。"""
+        with self._lock:
+            if self.forming_bar is None or self._server_offset is None:
+                return
+            if time.time() + self._server_offset < int(self.forming_bar['time']) + self.bar_seconds:
+                return
+            closed = self._close_forming_bar()
+        self._notify(self._bar_callbacks, closed)
+
+    def _close_forming_bar(self):
+        closed = self.forming_bar.copy()
+        self.closed_bars.append(closed)
+        self.forming_bar = None
+        return closed
+
+    def _notify(self, callbacks: List[Callable], payload):
+        for callback in callbacks:
+            try:
+                callback(self.symbol, payload)
+            except Exception as e:
+                logger.error(f"[{self.symbol}] ティックストリームの購読者でエラーが発生: {e}", exc_info=True)
@@ -7,12 +7,12 @@ import matplotlib.pyplot as plt
 from scipy.signal import find_peaks
 import logging
 from datetime import datetime
-import MetaTrader5 as mt5_api
 
 # 既存の自作モジュールをインポート
 import config
-from mt5_connector import MT5Connector
+from market_data import timeframe_value
 from gmail_notifier import GmailNotifier
+from bars import to_display_tz, to_display_time
 
 # ロギング設定
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -96,13 +96,13 @@ def plot_analysis_chart(df: pd.DataFrame, symbol: str, timeframe: str, sr_levels
         hlines_styles.extend([':']*len(fibo_levels))
     
     hlines_dict = dict(hlines=hlines_data, colors=hlines_colors, linestyle=hlines_styles) if hlines_data else None
-    alines_list = [line for line in trend_lines.values() if line is not None] if DRAW_TREND_LINES else []
+    alines_list = [[(to_display_time(t), p) for t, p in line] for line in trend_lines.values() if line is not None] if DRAW_TREND_LINES else []
 
     style = mpf.make_mpf_style(base_mpf_style='yahoo', figcolor='#1a1a2e', facecolor='#1a1a2e', 
                                edgecolor='#e0e0e0', gridcolor='#3a3a4e')
     output_filename = "analysis_chart.png"
     
-    fig, axes = mpf.plot(df.tail(150), type='candle', style=style, title=f"{symbol} {timeframe} Analysis with Fibonacci",
+    fig, axes = mpf.plot(to_display_tz(df.tail(150)), type='candle', style=style, title=f"{symbol} {timeframe} Analysis with Fibonacci",
                          ylabel="Price", volume=True, hlines=hlines_dict,
                          alines=dict(alines=alines_list, colors=['lime', 'red']), panel_ratios=(4, 1),
                          figscale=1.5, returnfig=True, warn_too_much_data=10000)
@@ -142,17 +142,20 @@ def generate_predictions(current_price: float, sr_levels: dict, trend_lines: dic
             predictions.append(f"トレンド予測: 3本先、下降トレンドラインは {future_price:.3f} 付近に到達。")
     return predictions
 
-def main():
+def main(data_source=None):
     logger.info("未来予測ライン分析アプリ（最終版v3）を開始します。")
 
-    mt5 = MT5Connector(path=config.MT5_PATH, login=config.MT5_LOGIN, 
-                       password=config.MT5_PASSWORD, server=config.MT5_SERVER)
-    if not mt5.connect(): return
+    # data_source を省略した場合は MT5 に接続する (ReplayDataSource なども渡せる)
+    if data_source is None:
+        from mt5_connector import MT5Connector
+        data_source = MT5Connector(path=config.MT5_PATH, login=config.MT5_LOGIN, 
+                                   password=config.MT5_PASSWORD, server=config.MT5_SERVER)
+    if not data_source.connect(): return
 
-    timeframe_obj = getattr(mt5_api, f'TIMEFRAME_{TIMEFRAME_TO_ANALYZE.upper()}')
-    df = mt5.get_candlestick_data(SYMBOL_TO_ANALYZE, timeframe_obj, CANDLE_COUNT)
+    timeframe_obj = timeframe_value(TIMEFRAME_TO_ANALYZE)
+    df = data_source.get_candlestick_data(SYMBOL_TO_ANALYZE, timeframe_obj, CANDLE_COUNT)
     
-    mt5.disconnect()
+    data_source.disconnect()
     if df.empty: return
 
     sr_levels = find_support_resistance(df, distance=PEAK_DISTANCE)
@@ -0,0 +1,295 @@
+# replay_source.py (CSV/Parquet の履歴データをリプレイするマーケットデータ取得元)
+
+import argparse
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Tuple
+
+from market_data import MarketDataSource, RATES_DTYPE, TIMEFRAME_SECONDS, timeframe_name, timeframe_value
+
+logger = logging.getLogger(__name__)
+
+class ReplayClock:
+    """
+    リプレイ用の仮想時計。
+    speed が有限ならば実時間の speed 倍で進む。speed が 0 (または inf) のときは最速モードで、
+    register() した全スレッドが wait() に入った時点で、最も早い起床時刻まで一気に進める。
+    """
+    def __init__(self, start_time: float, speed: float = 1.0):
+        self.speed = speed
+        self.as_fast_as_possible = speed <= 0 or speed == float('inf')
+        self._start_time = start_time
+        self._started_at = time.monotonic()
+        self._now = start_time
+        self._cond = threading.Condition()
+        self._participants = 0
+        # wait() 中のスレッドの起床時刻 (起きたスレッドが自分で取り除くまで残す)
+        self._sleepers: list = []
+
+    def now(self) -> float:
+        if self.as_fast_as_possible:
+            return self._now
+        return self._start_time + (time.monotonic() - self._started_at) * self.speed
+
+    def register(self):
+        """
+        仮想時間で待機するスレッドとして登録する (最速モードで使う)。
+        スレッドを開始する前に呼ぶこと (開始後だと、先に開始したスレッドだけで時計が進んでしまう)。
+        """
+        with self._cond:
+            self._participants += 1
+
+    def unregister(self):
+        with self._cond:
+            self._participants -= 1
+            self._advance_if_idle()
+
+    def wait(self, seconds: float, stop_event: Optional[threading.Event] = None) -> bool:
+        """仮想時間で seconds 秒待つ。stop_event がセットされたら True を返す。"""
+        if not self.as_fast_as_possible:
+            if stop_event is None:
+                time.sleep(seconds / self.speed)
+                return False
+            return stop_event.wait(seconds / self.speed)
+
+        with self._cond:
+            wake_at = self._now + seconds
+            heapq.heappush(self._sleepers, wake_at)
+            self._advance_if_idle()
+            while self._now < wake_at and not (stop_event and stop_event.is_set()):
+                self._cond.wait(0.1)
+            self._sleepers.remove(wake_at)
+            heapq.heapify(self._sleepers)
+            return bool(stop_event and stop_event.is_set())
+
+    def _advance_if_idle(self):
+        """
+        全員が待機中で、起床時刻を過ぎたまま起きていないスレッドもいなければ、最も早い起床時刻まで進める。
+        (起こされたスレッドが処理を始める前に、他のスレッドの wait() で時計が先に進まないようにする)
+        """
+        if len(self._sleepers) >= self._participants and self._sleepers and self._sleepers[0] > self._now:
+            self._now = self._sleepers[0]
+            self._cond.notify_all()
+
+
+class ReplayDataSource(MarketDataSource):
+    """
+    data_dir 内の {SYMBOL}_{TF}.csv / .parquet (OHLCV) と {SYMBOL}_ticks.csv / .parquet (ティック) を、
+    仮想時計の時刻に合わせて少しずつ見せる取得元。MetaTrader5 が無い環境でもパイプライン全体を動かせる。
+    最後の足は形成中の足として、直前の終値で始まる出来高0の足を合成する (未来の値を見せないため)。
+    シンボル情報は data_dir/symbols.json ({"USDJPY": {"point": 0.001, "digits": 3}, ...}) があれば使う。
+    """
+    def __init__(self, data_dir: str, speed: float = 1.0, start_time: Optional[float] = None, warmup_bars: int = 300):
+        self.data_dir = data_dir
+        self._rates: Dict[Tuple[str, int], np.ndarray] = {}
+        self._ticks: Dict[str, Optional[np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self._symbol_info = self._load_symbol_info()
+        self.warmup_bars = warmup_bars
+        default_start, self.end_time = self._scan_time_range()
+        if start_time is None:
+            start_time = default_start
+        self.clock = ReplayClock(start_time, speed)
+        logger.info(f"ReplayDataSource を初期化しました。データ: {data_dir}, 速度: {'最速' if self.clock.as_fast_as_possible else f'{speed}倍'}")
+
+    # --- MarketDataSource ---
+
+    @property
+    def finished(self) -> bool:
+        return self.end_time is not None and self.clock.now() >= self.end_time
+
+    def get_rates(self, symbol: str, timeframe, count: int = 500) -> Optional[np.ndarray]:
+        rates = self._load_rates(symbol, timeframe)
+        if rates is None or len(rates) == 0:
+            return None
+
+        tf_seconds = TIMEFRAME_SECONDS[timeframe]
+        now = int(self.clock.now())
+        # 終了時刻が now 以前の足だけが確定済み
+        closed_end = int(np.searchsorted(rates['time'], now - tf_seconds, side='right'))
+        if closed_end == 0:
+            return None
+        closed = rates[max(0, closed_end - (count - 1)):closed_end]
+
+        forming = np.zeros(1, dtype=RATES_DTYPE)
+        forming['time'] = now - now % tf_seconds
+        forming['open'] = forming['high'] = forming['low'] = forming['close'] = closed['close'][-1]
+        return np.concatenate([closed, forming])
+
+    def get_ticks(self, symbol: str, from_msc: int, count: int = 100000) -> Optional[np.ndarray]:
+        ticks = self._load_ticks(symbol)
+        if ticks is None:
+            return None
+        now_msc = int(self.clock.now() * 1000)
+        start = int(np.searchsorted(ticks['time_msc'], from_msc, side='left'))
+        end = int(np.searchsorted(ticks['time_msc'], now_msc, side='right'))
+        return ticks[start:min(end, start + count)]
+
+    def get_symbol_info(self, symbol: str) -> Optional[dict]:
+        info = self._symbol_info.get(symbol)
+        if info is not None:
+            return info
+        # 設定が無い場合は XMTrading の桁数に合わせた既定値を使う
+        digits = 3 if 'JPY' in symbol else 2 if symbol in ('GOLD', 'BTCUSD', 'ETHUSD') else 5
+        return {"point": 10 ** -digits, "digits": digits}
+
+    # --- ファイル読み込み ---
+
+    def _find_file(self, stem: str) -> Optional[str]:
+        for ext in ('.parquet', '.csv'):
+            path = os.path.join(self.data_dir, stem + ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    @staticmethod
+    def _read_table(path: str) -> pd.DataFrame:
+        if path.endswith('.parquet'):
+            return pd.read_parquet(path)
+        return pd.read_csv(path)
+
+    @staticmethod
+    def _to_epoch_seconds(column: pd.Series) -> np.ndarray:
+        if pd.api.types.is_numeric_dtype(column):
+            values = column.to_numpy(dtype='int64')
+            # ミリ秒で保存されている場合
+            return values // 1000 if len(values) and values.max() > 10 ** 11 else values
+        return ((pd.to_datetime(column, utc=True) - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)).to_numpy(dtype='int64')
+
+    def _load_rates(self, symbol: str, timeframe) -> Optional[np.ndarray]:
+        key = (symbol, timeframe)
+        with self._lock:
+            if key in self._rates:
+                return self._rates[key]
+            path = self._find_file(f"{symbol}_{timeframe_name(timeframe)}")
+            rates = None
+            if path is None:
+                logger.warning(f"リプレイ用のデータが見つかりません: {symbol} {timeframe_name(timeframe)} ({self.data_dir})")
+            else:
+                try:
+                    rates = self._table_to_rates(self._read_table(path))
+                    logger.info(f"リプレイ用のデータを読み込みました: {path} ({len(rates)} 件)")
+                except Exception as e:
+                    logger.error(f"リプレイ用のデータの読み込みに失敗しました ({path}): {e}", exc_info=True)
+            self._rates[key] = rates
+            return rates
+
+    def _table_to_rates(self, df: pd.DataFrame) -> np.ndarray:
+        df = df.rename(columns=str.lower)
+        time_col = 'time' if 'time' in df.columns else df.columns[0]
+        rates = np.zeros(len(df), dtype=RATES_DTYPE)
+        rates['time'] = self._to_epoch_seconds(df[time_col])
+        for name in ('open', 'high', 'low', 'close'):
+            rates[name] = df[name].to_numpy(dtype='float64')
+        volume_col = next((c for c in ('tick_volume', 'volume') if c in df.columns), None)
+        if volume_col:
+            rates['tick_volume'] = df[volume_col].to_numpy(dtype='uint64')
+        for name in ('spread', 'real_volume'):
+            if name in df.columns:
+                rates[name] = df[name].to_numpy()
+        rates = np.sort(rates, order='time')
+        # 重複した時刻は後のものを残す
+        keep = np.r_[rates['time'][1:] != rates['time'][:-1], True]
+        return rates[keep]
+
+    def _load_ticks(self, symbol: str) -> Optional[np.ndarray]:
+        with self._lock:
+            if symbol in self._ticks:
+                return self._ticks[symbol]
+            path = self._find_file(f"{symbol}_ticks")
+            ticks = None
+            if path is not None:
+                df = self._read_table(path).rename(columns=str.lower)
+                ticks = np.zeros(len(df), dtype=[('time', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'),
+                                                 ('volume', '<u8'), ('time_msc', '<i8'), ('flags', '<u4'), ('volume_real', '<f8')])
+                if 'time_msc' in df.columns:
+                    ticks['time_msc'] = df['time_msc'].to_numpy(dtype='int64')
+                else:
+                    ticks['time_msc'] = ((pd.to_datetime(df['time'], utc=True) - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(milliseconds=1)).to_numpy(dtype='int64')
+                ticks['time'] = ticks['time_msc'] // 1000
+                for name in ('bid', 'ask', 'last', 'volume'):
+                    if name in df.columns:
+                        ticks[name] = df[name].to_numpy()
+                ticks = np.sort(ticks, order='time_msc')
+            self._ticks[symbol] = ticks
+            return ticks
+
+    def _load_symbol_info(self) -> Dict[str, dict]:
+        path = os.path.join(self.data_dir, 'symbols.json')
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"symbols.json の読み込みに失敗: {e}")
+            return {}
+
+    def _scan_time_range(self) -> Tuple[float, Optional[float]]:
+        """全ファイルを見て、どの足も warmup_bars 本そろう時刻を開始時刻、最後の足が確定する時刻を終了時刻として返す。"""
+        start, end = None, None
+        for filename in os.listdir(self.data_dir) if os.path.isdir(self.data_dir) else []:
+            stem, ext = os.path.splitext(filename)
+            if ext not in ('.csv', '.parquet') or '_' not in stem:
+                continue
+            symbol, tf_name = stem.rsplit('_', 1)
+            if tf_name.upper() not in ('M1', 'M5', 'M15', 'H1', 'D1'):
+                continue
+            timeframe = timeframe_value(tf_name)
+            rates = self._load_rates(symbol, timeframe)
+            if rates is None or len(rates) == 0:
+                continue
+            warm = int(rates['time'][min(self.warmup_bars, len(rates) - 1)]) + TIMEFRAME_SECONDS[timeframe]
+            last = int(rates['time'][-1]) + TIMEFRAME_SECONDS[timeframe]
+            start = warm if start is None else max(start, warm)
+            end = last if end is None else max(end, last)
+        return float(start if start is not None else time.time()), end
+
+
+def main():
+    """リプレイでシグナルパイプライン全体を動かし、処理量を計測する (例: python replay_source.py data/replay --speed 100)。"""
+    import config
+    from chart_drawer import ChartDrawer
+    from runner_registry import build_runners
+    from trade_manager import TradeManager
+
+    parser = argparse.ArgumentParser(description="CSV/Parquet の履歴データでシグナルパイプラインをリプレイします。")
+    parser.add_argument('data_dir')
+    parser.add_argument('--speed', type=float, default=100.0, help="実時間に対する倍率。0 で最速")
+    parser.add_argument('--duration', type=float, default=60.0, help="計測する実時間 (秒)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format=config.LOG_FORMAT)
+    source = ReplayDataSource(args.data_dir, speed=args.speed)
+    trade_manager = TradeManager(source, None, None)
+    chart_drawer = ChartDrawer(os.path.join(config.CHART_OUTPUT_DIR, 'replay'))
+    counts = {"evaluations": 0, "signals": 0}
+
+    def on_signal(signal_data, chart_filepath):
+        counts["evaluations"] += 1
+        if signal_data.get("tp") != "N/A":
+            counts["signals"] += 1
+
+    pairs = [(symbol, timeframe_str) for symbol, timeframe_str in config.SYMBOLS_TIMEFRAMES_TO_MONITOR
+             if source.get_rates(symbol, timeframe_value(timeframe_str), 2) is not None]
+    started = time.time()
+    # 計算用プロセスプールなどの設定は本番と同じく config に従う (エンジンは仮想時計では使えないのでスレッドで動かす)
+    registry = build_runners(pairs, source, chart_drawer, None, trade_manager, on_signal, lambda *a: None)
+    runners = registry.runners()
+    while time.time() - started < args.duration and not source.finished:
+        time.sleep(0.5)
+    registry.stop()
+
+    elapsed = time.time() - started
+    print(f"ランナー数: {len(runners)}, 実時間: {elapsed:.1f}秒, 評価回数: {counts['evaluations']}, "
+          f"売買シグナル: {counts['signals']}, 評価/秒: {counts['evaluations'] / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
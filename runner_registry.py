@@ -0,0 +1,278 @@
+# runner_registry.py (実行中の監視ペアの追加・削除と処理能力の見積もり)
+
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+import config
+from market_data import TIMEFRAMES, TIMEFRAME_SECONDS
+from market_data_hub import wrap_source
+from signal_runner_loop import SignalRunner
+from startup_planner import StartupPlanner
+
+logger = logging.getLogger(__name__)
+
+class RunnerRegistry:
+    """
+    (symbol, timeframe) のランナーを再起動なしで追加・削除する。
+    データ取得元・TradeManager・スケジューラなどはすべてのランナーで共有するので、
+    追加しても既存のキャッシュはそのまま使われる。削除したペアのクールダウンは覚えておき、再追加時に引き継ぐ。
+    AsyncRunnerEngine / BatchSweepEngine を渡した場合はエンジンに登録し、渡さなければランナーをスレッドとして起動する。
+    TICK_STREAM_ENABLED なら、M1 のランナーには取得元のティックストリームを渡す。
+    config の設定どおりに組み立てるには build_runners() を使う。
+
+    処理能力の見積もり: 全ペアの足の確定が重なったとき (D1 の境界など) に、全ペアの評価が
+    最も短い時間足の1本分 × RUNNER_MAX_UTILIZATION 以内に終わることを条件にし、超える追加は断る。
+    """
+    def __init__(self, data_source, chart_drawer, economic_calendar, trade_manager, add_signal_callback, add_log_callback,
+                 engine=None, **runner_options):
+        self.mt5 = data_source
+        self.chart_drawer = chart_drawer
+        self.economic_calendar = economic_calendar
+        self.trade_manager = trade_manager
+        self.add_signal_callback = add_signal_callback
+        self.add_log_callback = add_log_callback
+        self.engine = engine
+        # tick_stream 以外の SignalRunner の追加の引数 (scheduler, compute_pool, work_queue)
+        self.runner_options = runner_options
+        self.tick_streams = {}
+        self._runners: Dict[Tuple[str, str], SignalRunner] = {}
+        self._cooldowns: Dict[Tuple[str, str], float] = {}
+        # 削除したがスレッドがまだ終わっていないランナー (終わるまで同じペアの再追加を断る)
+        self._stopping: Dict[Tuple[str, str], SignalRunner] = {}
+        self._lock = threading.Lock()
+
+    # --- 追加・削除 ---
+
+    def add(self, symbol: str, timeframe_str: str) -> Tuple[bool, str]:
+        """ランナーを追加して開始する。(成功したか, メッセージ) を返す。"""
+        runner, message = self._create(symbol, timeframe_str)
+        if runner is None:
+            return False, message
+        self._start(runner)
+        return True, message
+
+    def _create(self, symbol: str, timeframe_str: str) -> Tuple[Optional[SignalRunner], str]:
+        """ランナーを作って登録する (まだ開始しない)。追加できなければ (None, 理由) を返す。"""
+        timeframe_str = timeframe_str.upper()
+        if timeframe_str not in TIMEFRAMES:
+            return False, f"未対応の時間足です: {timeframe_str}"
+        if self.mt5.get_symbol_info(symbol) is None:
+            return False, f"シンボル '{symbol}' の情報を取得できません。"
+        key = (symbol, timeframe_str)
+        with self._lock:
+            if key in self._runners:
+                return False, f"{symbol}-{timeframe_str} は既に監視中です。"
+            stopping = self._stopping.get(key)
+            if stopping is not None:
+                if stopping.is_alive():
+                    return False, f"{symbol}-{timeframe_str} の前のランナーがまだ終了していません。しばらくしてから追加してください。"
+                del self._stopping[key]
+            ok, reason = self._has_capacity_for(timeframe_str)
+            if not ok:
+                logger.warning(f"[{symbol}-{timeframe_str}] 処理能力が足りないため、追加を断りました: {reason}")
+                return False, reason
+
+            runner = SignalRunner(symbol, timeframe_str, self.mt5, self.chart_drawer, self.economic_calendar, self.trade_manager,
+                                  config.SIGNAL_INTERVALS_SECONDS[timeframe_str], self.add_signal_callback, self.add_log_callback,
+                                  tick_stream=self._tick_stream_for(symbol, timeframe_str), **self.runner_options)
+            runner.last_signal_time = self._cooldowns.pop(key, 0)
+            self._runners[key] = runner
+        return runner, f"{symbol}-{timeframe_str} の監視を開始しました。"
+
+    def _start(self, runner: SignalRunner):
+        if self.engine is not None:
+            self.engine.add_runner(runner)
+        else:
+            runner.start()
+        logger.info(f"[{runner.symbol}-{runner.timeframe_str}] ランナーを追加しました。(合計 {len(self._runners)} ペア)")
+
+    def remove(self, symbol: str, timeframe_str: str) -> Tuple[bool, str]:
+        key = (symbol, timeframe_str.upper())
+        with self._lock:
+            runner = self._runners.pop(key, None)
+            if runner is None:
+                return False, f"{symbol}-{timeframe_str} は監視していません。"
+            self._cooldowns[key] = runner.last_signal_time
+        if self.engine is not None:
+            self.engine.remove_runner(*key)
+        else:
+            runner.stop()
+            # 再接続待ちやMT5の呼び出し中なら少し待つ。終わらなければ、終わるまで同じペアを再追加しない
+            runner.join(timeout=config.RUNNER_STOP_JOIN_SECONDS)
+            if runner.is_alive():
+                logger.warning(f"[{key[0]}-{key[1]}] ランナーが {config.RUNNER_STOP_JOIN_SECONDS} 秒以内に終了しませんでした。終了するまで再追加はできません。")
+                with self._lock:
+                    self._stopping[key] = runner
+        logger.info(f"[{key[0]}-{key[1]}] ランナーを削除しました。(合計 {len(self._runners)} ペア)")
+        return True, f"{key[0]}-{key[1]} の監視を停止しました。"
+
+    def add_many(self, pairs, planner=None) -> int:
+        """
+        config.SYMBOLS_TIMEFRAMES_TO_MONITOR などのリストをまとめて追加し、追加できた数を返す。
+        planner (StartupPlanner) を渡すと、全ランナーを作ってから時差スタートの計画とウォームアップを行い、その後で開始する。
+        """
+        runners = []
+        for symbol, timeframe_str in pairs:
+            runner, message = self._create(symbol, timeframe_str)
+            if runner is None:
+                logger.warning(f"[{symbol}-{timeframe_str}] 追加できませんでした: {message}")
+            else:
+                runners.append(runner)
+        if planner is not None and runners:
+            planner.plan(runners)
+            planner.warm_up(runners)
+        for runner in runners:
+            self._start(runner)
+        return len(runners)
+
+    def stop_all(self):
+        with self._lock:
+            keys = list(self._runners)
+        for key in keys:
+            self.remove(*key)
+
+    def stop(self):
+        """全ランナーを止め、エンジン・ティックストリーム・計算用プロセスプール・評価キューも止める。"""
+        self.stop_all()
+        if self.engine is not None:
+            self.engine.stop()
+        for stream in self.tick_streams.values():
+            stream.stop()
+        if self.runner_options.get('compute_pool') is not None:
+            self.runner_options['compute_pool'].shutdown()
+        if self.runner_options.get('work_queue') is not None:
+            self.runner_options['work_queue'].stop()
+
+    def _tick_stream_for(self, symbol: str, timeframe_str: str):
+        """スキャルピングの M1 を足の確定で起こすためのティックストリーム (無効・非対応なら None)。"""
+        if not config.TICK_STREAM_ENABLED or timeframe_str != 'M1':
+            return None
+        if symbol not in self.tick_streams:
+            stream = self.mt5.start_tick_stream(symbol)
+            if stream is None:
+                return None
+            self.tick_streams[symbol] = stream
+        return self.tick_streams[symbol]
+
+    # --- 状態 ---
+
+    def runners(self):
+        with self._lock:
+            return list(self._runners.values())
+
+    def describe(self) -> dict:
+        """Web API 用の一覧と処理能力の状況。"""
+        with self._lock:
+            runners = list(self._runners.values())
+            load = self._burst_load(runners)
+        return {
+            "runners": [
+                {
+                    "symbol": r.symbol,
+                    "timeframe": r.timeframe_str,
+                    "avg_eval_seconds": round(r.avg_eval_seconds, 4) if r.avg_eval_seconds is not None else None,
+                    "last_signal_time": r.last_signal_time,
+                    "market_closed": r.market_closed,
+                }
+                for r in runners
+            ],
+            "burst_seconds": round(load, 2),
+            "burst_budget_seconds": round(self._burst_budget(runners), 2),
+        }
+
+    # --- 処理能力の見積もり ---
+
+    def _eval_cost(self, runners) -> float:
+        """1回の評価にかかる秒数の見積もり (実測があればその平均)。"""
+        measured = [r.avg_eval_seconds for r in runners if r.avg_eval_seconds is not None]
+        if measured:
+            return sum(measured) / len(measured)
+        return config.RUNNER_EVAL_COST_ESTIMATE_SECONDS
+
+    def _burst_load(self, runners, extra: int = 0) -> float:
+        """全ペアの足の確定が重なったときに、全評価が終わるまでの秒数。"""
+        lanes = max(1, config.RUNNER_CAPACITY_LANES)
+        return (len(runners) + extra) * self._eval_cost(runners) / lanes
+
+    @staticmethod
+    def _burst_budget(runners, timeframe_str: Optional[str] = None) -> float:
+        seconds = [TIMEFRAME_SECONDS[r.timeframe_obj] for r in runners]
+        if timeframe_str is not None:
+            seconds.append(TIMEFRAME_SECONDS[TIMEFRAMES[timeframe_str]])
+        return (min(seconds) if seconds else 60) * config.RUNNER_MAX_UTILIZATION
+
+    def eval_cost(self) -> float:
+        """1回の評価にかかる秒数の見積もり (シャードのワーカーがハートビートでコーディネーターに送る)。"""
+        return self._eval_cost(self.runners())
+
+    def _has_capacity_for(self, timeframe_str: str) -> Tuple[bool, str]:
+        runners = list(self._runners.values())
+        return check_capacity([r.timeframe_str for r in runners], self._eval_cost(runners), timeframe_str)
+
+
+def check_capacity(timeframe_strs, eval_cost: float, timeframe_str: str) -> Tuple[bool, str]:
+    """
+    時間足 timeframe_strs のペアを動かしているところに timeframe_str を1つ足しても、
+    全ペアの足の確定が重なったときの評価が最短の時間足の1本分 × RUNNER_MAX_UTILIZATION 以内に終わるか。
+    RunnerRegistry と ShardCoordinator (ワーカーごと) が同じ基準で追加を断る。
+    """
+    lanes = max(1, config.RUNNER_CAPACITY_LANES)
+    load = (len(timeframe_strs) + 1) * eval_cost / lanes
+    seconds = [TIMEFRAME_SECONDS[TIMEFRAMES[tf]] for tf in list(timeframe_strs) + [timeframe_str]]
+    budget = min(seconds) * config.RUNNER_MAX_UTILIZATION
+    if load > budget:
+        return False, f"追加すると評価の集中時に {load:.1f} 秒かかり、許容の {budget:.1f} 秒を超えます。"
+    return True, ""
+
+
+def build_runners(pairs, data_source, chart_drawer, economic_calendar, trade_manager, add_signal_callback, add_log_callback,
+                  sharded: Optional[bool] = None, progress_callback=None):
+    """
+    config の設定どおりに実行方式を組み立て、pairs の監視を開始して、add / remove / describe / stop を持つものを返す。
+    最初の pairs は StartupPlanner で時差スタートの計画とウォームアップを行ってから開始する
+    (progress_callback(done, total) にウォームアップの進捗を渡す)。
+    - SHARD_MODE_ENABLED: ShardCoordinator (各ワーカーの中では、以下の設定でこの関数が組み立てる)
+    - BATCH_SWEEP_ENABLED / ASYNC_ENGINE_ENABLED: BatchSweepEngine / AsyncRunnerEngine (両方有効なら BatchSweepEngine)
+    - COMPUTE_POOL_ENABLED / WORK_QUEUE_ENABLED: ランナーに渡す計算用プロセスプール・評価キュー
+    - DATA_HUB_ENABLED: ライブの取得元を MarketDataHub で包み、M5/M15/H1 を M1 から集約する
+    エンジンを起動できない取得元 (リプレイの仮想時計) では、ランナーをスレッドとして起動する。
+    """
+    if config.SHARD_MODE_ENABLED if sharded is None else sharded:
+        if data_source.clock is not None:
+            logger.warning("仮想時計を持つ取得元 (リプレイ) はシャーディングできません。1プロセスで動かします。")
+        else:
+            from shard_coordinator import ShardCoordinator
+            coordinator = ShardCoordinator(trade_manager, add_signal_callback, add_log_callback)
+            coordinator.start(list(pairs))
+            return coordinator
+
+    data_source = wrap_source(data_source)
+    runner_options = {}
+    if config.COMPUTE_POOL_ENABLED:
+        from compute_pool import ComputePool
+        compute_pool = ComputePool()
+        if compute_pool.start():
+            runner_options['compute_pool'] = compute_pool
+    if config.WORK_QUEUE_ENABLED:
+        from work_queue import EvaluationQueue
+        work_queue = EvaluationQueue()
+        work_queue.start()
+        runner_options['work_queue'] = work_queue
+
+    engine = None
+    if config.BATCH_SWEEP_ENABLED:
+        if config.ASYNC_ENGINE_ENABLED:
+            logger.warning("BATCH_SWEEP_ENABLED と ASYNC_ENGINE_ENABLED が両方有効です。BatchSweepEngine を使います。")
+        from batch_indicators import BatchSweepEngine
+        engine = BatchSweepEngine(data_source)
+    elif config.ASYNC_ENGINE_ENABLED:
+        from async_engine import AsyncRunnerEngine
+        engine = AsyncRunnerEngine(data_source, work_queue=runner_options.get('work_queue'))
+    if engine is not None and not engine.start():
+        engine = None
+
+    registry = RunnerRegistry(data_source, chart_drawer, economic_calendar, trade_manager, add_signal_callback, add_log_callback,
+                              engine=engine, **runner_options)
+    registry.add_many(pairs, planner=StartupPlanner(data_source, progress_callback))
+    return registry
@@ -1,45 +1,27 @@
 # scalping_logic.py
 
 import pandas as pd
-import pandas_ta as ta
 import logging
 import numpy as np
 
+import indicator_graph
+
 logger = logging.getLogger(__name__)
 
-# --- 1. インジケーター計算関数 (daytrade_logic.pyと同じものを流用) ---
+# generate_signal が使うインジケーター (add_all_indicators はこれだけを計算する)
+REQUIRED_INDICATORS = ['BBL_20_2.0', 'BBU_20_2.0', 'STOCHk_14_3_3', 'STOCHd_14_3_3']
 
-def add_bollinger_bands(df: pd.DataFrame, window: int = 20, window_dev: float = 2.0) -> pd.DataFrame:
-    if 'Close' not in df.columns: return df
-    try:
-        bb = ta.bbands(df['Close'], length=window, std=window_dev)
-        if bb is not None and not bb.empty:
-            for col in bb.columns:
-                if col not in df.columns:
-                    df[col] = bb[col]
-    except Exception as e:
-        logger.warning(f"Bollinger Bands計算中にエラー: {e}")
-    return df
-
-def add_stochastic(df: pd.DataFrame, k: int = 14, d: int = 3, smooth_k: int = 3) -> pd.DataFrame:
-    if not all(c in df.columns for c in ['High', 'Low', 'Close']): return df
-    stoch_data = ta.stoch(df['High'], df['Low'], df['Close'], k=k, d=d, smooth_k=smooth_k)
-    if stoch_data is not None and not stoch_data.empty:
-        for col in stoch_data.columns:
-            if col not in df.columns:
-                df[col] = stoch_data[col]
-    return df
+# --- 1. インジケーター計算 ---
 
 def add_all_indicators(df: pd.DataFrame) -> pd.DataFrame:
     """スキャルピングで使うインジケーターのみ追加"""
     if df.empty: return df
     try:
-        df = add_bollinger_bands(df)
-        df = add_stochastic(df)
+        df = indicator_graph.evaluate(df, REQUIRED_INDICATORS)
         logger.info("すべてのテクニカルインジケーターを追加しました。(Scalping Logic)")
     except Exception as e:
         logger.error(f"インジケーターの追加中にエラーが発生しました: {e}", exc_info=True)
-    return df.copy()
+    return df
 
 # --- 2. シグナル生成関数 (★★★ スキャルピング用に簡略化 ★★★) ---
 
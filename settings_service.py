@@ -0,0 +1,135 @@
+# settings_service.py (settings.json の読み込みを1か所にまとめる設定キャッシュ)
+
+import json
+import logging
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_FILE = 'settings.json'
+DEFAULT_SETTINGS = {"auto_trading": False, "lot_size": 0.01, "mode": "daytrade"}
+
+class SettingsService:
+    """
+    settings.json を1回だけ読み込み、変更不可のスナップショットとして配る。
+    ファイルの更新時刻は一定間隔でしか確認しないので、ランナーが何度呼んでもファイルは読まない。
+    Web UI からの更新 (update) はファイルへの書き込みと同時にスナップショットを差し替えるので、
+    売買ループと Web サーバーが別々の設定を見ることはない。
+    """
+    def __init__(self, path: str = SETTINGS_FILE, check_interval: Optional[float] = None):
+        self.path = path
+        self.check_interval = config.SETTINGS_CHECK_INTERVAL_SECONDS if check_interval is None else check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._snapshot: Mapping = MappingProxyType(dict(DEFAULT_SETTINGS))
+        self._trade_settings: Mapping = self._derive_trade_settings(self._snapshot)
+        self._reload()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def get(self) -> Mapping:
+        """settings.json の内容 (変更不可)。"""
+        self._refresh_if_changed()
+        return self._snapshot
+
+    def trade_settings(self) -> Mapping:
+        """売買に使う設定 (auto_trading, lot_size, sl_pips, tp_pips, mode)。"""
+        self._refresh_if_changed()
+        return self._trade_settings
+
+    def update(self, data: dict) -> bool:
+        """設定を書き換えてファイルに保存し、すぐに新しいスナップショットを配る。"""
+        with self._lock:
+            merged = dict(self._snapshot)
+            merged.update(data or {})
+            try:
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(merged, f, indent=4, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.error(f"設定ファイル({self.path})の保存に失敗しました: {e}")
+                return False
+            self._set_snapshot(merged)
+            self._mtime = os.path.getmtime(self.path)
+            self._checked_at = time.time()
+        logger.info(f"設定を更新しました: {dict(data or {})}")
+        return True
+
+    def _refresh_if_changed(self):
+        now = time.time()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                mtime = None
+            if mtime != self._mtime:
+                self._reload_locked()
+
+    def _reload(self):
+        with self._lock:
+            self._checked_at = time.time()
+            self._reload_locked()
+
+    def _reload_locked(self):
+        if not os.path.exists(self.path):
+            self._mtime = None
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                settings = json.load(f)
+            self._mtime = os.path.getmtime(self.path)
+        except (json.JSONDecodeError, OSError) as e:
+            # 書き込み途中などで読めなかった場合は、前のスナップショットを使い続ける
+            logger.error(f"設定ファイル({self.path})の読み込み/解析に失敗しました: {e}")
+            return
+        self._set_snapshot(settings)
+
+    def _set_snapshot(self, settings: dict):
+        self._snapshot = MappingProxyType(dict(settings))
+        self._trade_settings = self._derive_trade_settings(self._snapshot)
+
+    @staticmethod
+    def _derive_trade_settings(settings: Mapping) -> Mapping:
+        try:
+            mode = settings.get('mode', 'daytrade')
+            trade_params = config.DAYTRADE_SETTINGS if mode == 'daytrade' else config.SCALP_SETTINGS
+            return MappingProxyType({
+                "auto_trading": settings.get('auto_trading', False),
+                "lot_size": float(settings.get('lot_size', config.DEFAULT_LOT_SIZE)),
+                "sl_pips": int(trade_params.get('stop_loss_pips')),
+                "tp_pips": int(trade_params.get('take_profit_pips')),
+                "mode": mode
+            })
+        except (TypeError, ValueError) as e:
+            logger.error(f"設定の値が不正です。既定の設定を使います: {e}")
+            return MappingProxyType({
+                "auto_trading": False, "lot_size": 0.01,
+                "sl_pips": config.DAYTRADE_SETTINGS['stop_loss_pips'],
+                "tp_pips": config.DAYTRADE_SETTINGS['take_profit_pips'], "mode": "daytrade"
+            })
+
+
+_shared_service: Optional[SettingsService] = None
+_shared_lock = threading.Lock()
+
+def get_settings_service() -> SettingsService:
+    """TradeManager と web_server で共有する SettingsService を返す。"""
+    global _shared_service
+    with _shared_lock:
+        if _shared_service is None:
+            _shared_service = SettingsService()
+        return _shared_service
@@ -0,0 +1,283 @@
+# shard_coordinator.py (監視ペアを複数のワーカープロセスに分けて動かすコーディネーター)
+
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+from market_data import TIMEFRAMES
+from runner_registry import check_capacity
+
+logger = logging.getLogger(__name__)
+
+# --- ワーカープロセス側 ---
+
+def _build_source(source_spec: tuple):
+    """ワーカーごとのデータ取得元を作る。('mt5',) または ('replay', data_dir, speed)。"""
+    if source_spec[0] == 'replay':
+        from replay_source import ReplayDataSource
+        return ReplayDataSource(source_spec[1], speed=source_spec[2])
+
+    from mt5_connector import MT5Connector
+    source = MT5Connector(path=config.MT5_PATH, login=config.MT5_LOGIN,
+                          password=config.MT5_PASSWORD, server=config.MT5_SERVER)
+    source.connect()
+    # DATA_HUB_ENABLED なら build_runners が MarketDataHub で包む
+    return source
+
+
+def _worker_main(worker_id: int, pairs: List[Tuple[str, str]], source_spec: tuple, cmd_queue, event_queue):
+    """
+    ワーカープロセスの本体。割り当てられたペアのランナーを動かし、シグナル・ログ・発注依頼を event_queue で返す。
+    発注と通知は TradeManager を持つコーディネーター側で行う (ワーカーからは依頼を送るだけ)。
+    """
+    logging.basicConfig(level=config.LOG_LEVEL, format=config.LOG_FORMAT)
+    from chart_drawer import ChartDrawer
+    from runner_registry import build_runners
+    from trade_manager import TradeManager
+
+    class ForwardingTradeManager(TradeManager):
+        def execute_action(self, signal_info: dict, chart_filepath: Optional[str]):
+            event_queue.put(("action", worker_id, signal_info, chart_filepath))
+
+    source = _build_source(source_spec)
+    trade_manager = ForwardingTradeManager(source, None, None)
+    # ワーカーの中の実行方式 (asyncio・まとめ計算・プロセスプールなど) も config に従う
+    registry = build_runners(
+        pairs, source, ChartDrawer(config.CHART_OUTPUT_DIR), None, trade_manager,
+        lambda signal_data, chart_filepath: event_queue.put(("signal", worker_id, signal_data, chart_filepath)),
+        lambda *args: event_queue.put(("log", worker_id, args)),
+        sharded=False,
+    )
+
+    last_heartbeat = 0.0
+    while True:
+        now = time.time()
+        if now - last_heartbeat >= config.SHARD_HEARTBEAT_SECONDS:
+            # ランナーが MT5 の呼び出しなどで止まっている間はハートビートを送らない (コーディネーターに作り直させる)
+            runners = registry.runners()
+            stuck = [r for r in runners if r.busy_since is not None and now - r.busy_since > config.SHARD_RUNNER_STUCK_SECONDS]
+            if stuck:
+                logger.warning(f"ワーカー {worker_id}: 処理が進んでいないランナーがあるため、ハートビートを止めます: "
+                               f"{[f'{r.symbol}-{r.timeframe_str}' for r in stuck]}")
+            else:
+                event_queue.put(("heartbeat", worker_id, now, [(r.symbol, r.timeframe_str) for r in runners], registry.eval_cost()))
+            last_heartbeat = now
+        try:
+            command = cmd_queue.get(timeout=config.SHARD_HEARTBEAT_SECONDS)
+        except queue.Empty:
+            continue
+        if command[0] == 'add':
+            ok, message = registry.add(command[1], command[2])
+            event_queue.put(("added", worker_id, (command[1], command[2]), ok, message))
+        elif command[0] == 'remove':
+            registry.remove(command[1], command[2])
+        elif command[0] == 'stop':
+            registry.stop()
+            source.disconnect()
+            return
+
+
+# --- コーディネーター側 ---
+
+class _Worker:
+    def __init__(self, worker_id: int, process, cmd_queue):
+        self.worker_id = worker_id
+        self.process = process
+        self.cmd_queue = cmd_queue
+        self.pairs: List[Tuple[str, str]] = []
+        self.last_heartbeat = time.time()
+        # ワーカーが実測した1回の評価の秒数 (ハートビートが届くまでは見積もり)
+        self.eval_cost = config.RUNNER_EVAL_COST_ESTIMATE_SECONDS
+
+
+class ShardCoordinator:
+    """
+    (symbol, timeframe) のペアを N 個のワーカープロセスに割り当てて動かす。
+    同じシンボルの時間足は同じワーカーにまとめ (M1 からの集約やキャッシュを共有するため)、
+    ハートビートが途絶えた (ランナーの処理が止まっている場合も含む)・プロセスが落ちたワーカーは作り直し、
+    そのワーカーのペアだけを新しいワーカーに引き継がせる (動いているワーカーのランナーは触らない)。
+    シグナルとログはワーカーから IPC キューで受け取り、ランナーと同じ形のコールバックで Web 側に渡す。
+    add / remove / describe は RunnerRegistry と同じ形なので、web_server.init_app にそのまま渡せる。
+    """
+    def __init__(self, trade_manager, add_signal_callback: Callable, add_log_callback: Optional[Callable] = None,
+                 num_workers: Optional[int] = None, source_spec: tuple = ('mt5',)):
+        self.trade_manager = trade_manager
+        self.add_signal_callback = add_signal_callback
+        self.add_log_callback = add_log_callback
+        self.num_workers = num_workers or config.SHARD_WORKERS
+        self.source_spec = source_spec
+        # MT5 の Python API は Windows 専用で、Windows のプロセス起動は spawn なので、どの OS でも spawn に揃える
+        self._ctx = multiprocessing.get_context('spawn')
+        self._event_queue = self._ctx.Queue()
+        self._workers: Dict[int, _Worker] = {}
+        self._next_worker_id = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    # --- 起動・停止 ---
+
+    def start(self, pairs: List[Tuple[str, str]]):
+        """ペアをワーカーに割り当てて起動し、イベント受信と死活監視のスレッドを開始する。"""
+        assignments = self._assign(pairs, self.num_workers)
+        with self._lock:
+            for worker_pairs in assignments:
+                self._spawn(worker_pairs)
+        for target, name in ((self._receive_events, "ShardCoordinator-Events"), (self._monitor, "ShardCoordinator-Monitor")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"{len(pairs)} ペアを {self.num_workers} ワーカーに割り当てて起動しました。")
+
+    def stop(self):
+        self._stop_event.set()
+        with self._lock:
+            workers = list(self._workers.values())
+        for worker in workers:
+            worker.cmd_queue.put(('stop',))
+        for worker in workers:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        logger.info("全ワーカーを停止しました。")
+
+    # --- RunnerRegistry と同じ形の API ---
+
+    def add(self, symbol: str, timeframe_str: str) -> Tuple[bool, str]:
+        pair = (symbol, timeframe_str.upper())
+        if pair[1] not in TIMEFRAMES:
+            return False, f"未対応の時間足です: {pair[1]}"
+        with self._lock:
+            if any(pair in w.pairs for w in self._workers.values()):
+                return False, f"{symbol}-{pair[1]} は既に監視中です。"
+            worker = self._worker_for_symbol(symbol)
+            if worker is None:
+                return False, "稼働中のワーカーがありません。"
+            # 各ワーカーは1つの RunnerRegistry と同じなので、割り当て先のワーカーで同じ処理能力の見積もりを行う
+            ok, reason = check_capacity([tf for _, tf in worker.pairs], worker.eval_cost, pair[1])
+            if not ok:
+                logger.warning(f"[{symbol}-{pair[1]}] ワーカー {worker.worker_id} の処理能力が足りないため、追加を断りました: {reason}")
+                return False, reason
+            worker.pairs.append(pair)
+            worker.cmd_queue.put(('add',) + pair)
+        return True, f"{symbol}-{pair[1]} をワーカー {worker.worker_id} に割り当てました。"
+
+    def remove(self, symbol: str, timeframe_str: str) -> Tuple[bool, str]:
+        pair = (symbol, timeframe_str.upper())
+        with self._lock:
+            for worker in self._workers.values():
+                if pair in worker.pairs:
+                    worker.pairs.remove(pair)
+                    worker.cmd_queue.put(('remove',) + pair)
+                    return True, f"{symbol}-{pair[1]} の監視を停止しました。"
+        return False, f"{symbol}-{pair[1]} は監視していません。"
+
+    def describe(self) -> dict:
+        now = time.time()
+        with self._lock:
+            workers = list(self._workers.values())
+        return {
+            "runners": [{"symbol": s, "timeframe": tf, "worker": w.worker_id} for w in workers for s, tf in w.pairs],
+            "workers": [
+                {
+                    "worker": w.worker_id,
+                    "alive": w.process.is_alive(),
+                    "pairs": len(w.pairs),
+                    "heartbeat_age_seconds": round(now - w.last_heartbeat, 1),
+                }
+                for w in workers
+            ],
+        }
+
+    # --- 割り当て ---
+
+    @staticmethod
+    def _assign(pairs: List[Tuple[str, str]], num_workers: int) -> List[List[Tuple[str, str]]]:
+        """シンボル単位でまとめ、ペア数の多いシンボルから順に、最も空いているワーカーに割り当てる。"""
+        by_symbol: Dict[str, List[Tuple[str, str]]] = {}
+        for symbol, timeframe_str in pairs:
+            by_symbol.setdefault(symbol, []).append((symbol, timeframe_str))
+        assignments: List[List[Tuple[str, str]]] = [[] for _ in range(max(1, num_workers))]
+        for group in sorted(by_symbol.values(), key=len, reverse=True):
+            min(assignments, key=len).extend(group)
+        return assignments
+
+    def _worker_for_symbol(self, symbol: str) -> Optional[_Worker]:
+        alive = [w for w in self._workers.values() if w.process.is_alive()]
+        for worker in alive:
+            if any(s == symbol for s, _ in worker.pairs):
+                return worker
+        return min(alive, key=lambda w: len(w.pairs), default=None)
+
+    def _spawn(self, pairs: List[Tuple[str, str]]) -> _Worker:
+        worker_id = self._next_worker_id
+        self._next_worker_id += 1
+        cmd_queue = self._ctx.Queue()
+        process = self._ctx.Process(target=_worker_main, name=f"ShardWorker-{worker_id}",
+                                    args=(worker_id, list(pairs), self.source_spec, cmd_queue, self._event_queue), daemon=True)
+        process.start()
+        worker = _Worker(worker_id, process, cmd_queue)
+        worker.pairs = list(pairs)
+        self._workers[worker_id] = worker
+        return worker
+
+    # --- イベント受信・死活監視 ---
+
+    def _receive_events(self):
+        while not self._stop_event.is_set():
+            try:
+                event = self._event_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                self._handle_event(event)
+            except Exception as e:
+                logger.error(f"ワーカーからのイベント処理中にエラーが発生: {e}", exc_info=True)
+
+    def _handle_event(self, event):
+        kind, worker_id = event[0], event[1]
+        if kind == 'signal':
+            self.add_signal_callback(event[2], event[3])
+        elif kind == 'action':
+            self.trade_manager.execute_action(event[2], event[3])
+        elif kind == 'log':
+            if self.add_log_callback:
+                self.add_log_callback(*event[2])
+        elif kind == 'heartbeat':
+            with self._lock:
+                worker = self._workers.get(worker_id)
+                if worker is not None:
+                    worker.last_heartbeat = time.time()
+                    worker.eval_cost = event[4]
+        elif kind == 'added' and not event[3]:
+            logger.warning(f"[{event[2][0]}-{event[2][1]}] ワーカー {worker_id} で追加できませんでした: {event[4]}")
+            with self._lock:
+                worker = self._workers.get(worker_id)
+                if worker is not None and event[2] in worker.pairs:
+                    worker.pairs.remove(event[2])
+
+    def _monitor(self):
+        while not self._stop_event.wait(config.SHARD_HEARTBEAT_SECONDS):
+            now = time.time()
+            with self._lock:
+                lost = [w for w in self._workers.values()
+                        if not w.process.is_alive() or now - w.last_heartbeat > config.SHARD_HEARTBEAT_TIMEOUT_SECONDS]
+                for worker in lost:
+                    self._recover(worker)
+
+    def _recover(self, lost: _Worker):
+        """
+        落ちたワーカーを止め、そのワーカーのペアをそのまま新しいワーカーに引き継がせる。
+        落ちたワーカーはシンボル単位でまとまっていたので、引き継いでも同じシンボルの時間足は同じワーカーに揃う。
+        動いているワーカーのランナーを移すと、クールダウンや最後に評価した確定足が失われて重複通知になるので移さない。
+        """
+        logger.error(f"ワーカー {lost.worker_id} が応答しません。ペア {len(lost.pairs)} 件を新しいワーカーに引き継ぎます。")
+        if lost.process.is_alive():
+            lost.process.terminate()
+        del self._workers[lost.worker_id]
+        replacement = self._spawn(lost.pairs)
+        logger.info(f"ワーカー {replacement.worker_id} を起動しました。")
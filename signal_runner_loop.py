@@ -3,22 +3,58 @@
 import threading
 import time
 import logging
-import MetaTrader5 as mt5
 from datetime import datetime
 
+import config
+from bar_scheduler import get_scheduler
+from bars import Bars
+from market_data import TIMEFRAME_SECONDS, timeframe_value
+from market_sessions import ActivityGauge, MarketCalendar
+from streaming_indicators import StreamingIndicatorEngine
+
 # 取引ロジックのモジュールを動的にインポート
 import daytrade_logic
 import scalping_logic
 
+
+def is_trade_signal(signal_result) -> bool:
+    """売買シグナル (見送り・罠アラート・シグナルなし以外) かどうか。"""
+    return bool(signal_result and signal_result.get("type") not in ["見送り", "NONE", None] and "罠" not in signal_result.get("type"))
+
+
+def evaluate_bars(rates, symbol, timeframe_str, mode, sr_rates=None, indicator_engine=None) -> dict:
+    """
+    インジケーター計算とシグナル判定。レコード配列だけを受け取る純粋な関数なので、
+    ComputePool のワーカープロセスでも同じ結果になる。
+    sr_rates があれば、強い水平線の検出にはそちら (保存済みの長い履歴) を使う。
+    indicator_engine (rates まで sync 済みの StreamingIndicatorEngine) があれば、インジケーターはそこから取る。
+    """
+    logic_module = daytrade_logic if mode == 'daytrade' else scalping_logic
+    # to_frame() は毎回新しい DataFrame を返すので、そのままカラムを追加してよい
+    df = Bars(rates, symbol, timeframe_str).to_frame()
+    if indicator_engine is not None:
+        df_with_indicators = indicator_engine.apply(df, rates)
+    else:
+        df_with_indicators = logic_module.add_all_indicators(df)
+
+    if mode == 'daytrade':
+        sr_df = Bars(sr_rates, symbol, timeframe_str).to_frame() if sr_rates is not None else df_with_indicators
+        strong_sr = logic_module.find_strong_sr_levels(sr_df, symbol)
+        signal_result = logic_module.generate_signal(df_with_indicators, strong_sr)
+    else: # scalp
+        signal_result = logic_module.generate_signal(df_with_indicators)
+    return {"mode": mode, "df": df_with_indicators, "signal": signal_result}
+
+
 class SignalRunner(threading.Thread):
-    def __init__(self, symbol, timeframe_str, mt5_connector, chart_drawer, economic_calendar, trade_manager, interval, add_signal_callback, add_log_callback):
+    def __init__(self, symbol, timeframe_str, mt5_connector, chart_drawer, economic_calendar, trade_manager, interval, add_signal_callback, add_log_callback, tick_stream=None, scheduler=None, compute_pool=None, work_queue=None):
         super().__init__()
         self.daemon = True
         self.name = f"SignalRunner-{symbol}-{timeframe_str}"
         
         self.symbol = symbol
         self.timeframe_str = timeframe_str
-        self.timeframe_obj = getattr(mt5, f'TIMEFRAME_{timeframe_str.upper()}')
+        self.timeframe_obj = timeframe_value(timeframe_str)
         self.mt5 = mt5_connector
         self.chart_drawer = chart_drawer
         self.economic_calendar = economic_calendar
@@ -28,9 +64,55 @@ class SignalRunner(threading.Thread):
         self.add_log_callback = add_log_callback
         
         self.stop_event = threading.Event()
+        # ティックストリームがあれば、足の確定と同時にループを起こす (スキャルピングの M1 用)
+        self.wake_event = threading.Event()
+        self.tick_stream = tick_stream
+        if tick_stream is not None:
+            tick_stream.subscribe_bar_closed(self._on_bar_closed)
         self.last_signal_time = 0
         self.cooldown_period = 300 # 5分
 
+        # 足の確定に合わせて起き、確定足が増えていなければロジックを丸ごと省略する
+        if scheduler is None and config.BAR_CLOSE_SCHEDULING_ENABLED:
+            scheduler = get_scheduler(self.mt5.clock)
+        self.scheduler = scheduler
+        self.tf_seconds = TIMEFRAME_SECONDS[self.timeframe_obj]
+        self.last_closed_time = None
+        # 前回評価した入力の指紋。同じ入力なら評価も通知も行わない
+        self.last_fingerprint = None
+        self._fetched_fingerprint = None
+        self._fetched_closed_time = None
+        self.next_wait = interval
+        # StartupPlanner が設定する、最初の実行までの待ち時間と毎回の起床のずらし幅
+        self.initial_delay = 5
+        self.wake_offset = 0.0
+
+        # 市場が閉まっている間は休止し、足の途中でのポーリング間隔はボラティリティに合わせて伸び縮みさせる
+        # (リプレイの仮想時計は足の時刻 = サーバー時刻なので、取引時間の判定は行わない)
+        self.market_calendar = None
+        self.activity_gauge = None
+        if config.ADAPTIVE_POLLING_ENABLED and self.mt5.clock is None:
+            self.market_calendar = MarketCalendar()
+            self.activity_gauge = ActivityGauge()
+        self.market_closed = False
+        # リプレイの最速モードの仮想時計は、登録済みの全ランナーが待機に入るまで進まない。
+        # スレッドの開始後に登録すると、先に開始したランナーだけで時計が進んでしまうので、作った時点で登録する
+        if self.mt5.clock is not None:
+            self.mt5.clock.register()
+        # 1回の評価にかかった秒数の移動平均 (RunnerRegistry の処理能力の見積もりに使う)
+        self.avg_eval_seconds = None
+        # run_once の実行中はその開始時刻 (シャードのワーカーが、止まっているランナーの検出に使う)
+        self.busy_since = None
+        # 評価キューのワーカーで失敗したときの再実行時刻 (待機中のランナーを、次の足の確定より前に起こす)
+        self._retry_at = None
+        # 指定されていれば、インジケーター計算とシグナル判定をワーカープロセスで行う
+        self.compute_pool = compute_pool
+        # 指定されていれば、評価を優先度付きのキューに積む (リプレイの仮想時計では締め切りが意味を持たないので使わない)
+        self.work_queue = work_queue if self.mt5.clock is None else None
+        # 有効なら、モードごとのインジケーターの状態を持ち続け、確定足が増えた分だけ更新する
+        self.streaming_engines = {} if config.STREAMING_INDICATORS_ENABLED else None
+        self._streaming_lock = threading.Lock()
+
         # モードに応じてロジックモジュールを切り替え
         current_mode = self.trade_manager.get_current_mode()
         self.logic_module = daytrade_logic if current_mode == 'daytrade' else scalping_logic
@@ -40,89 +122,285 @@ class SignalRunner(threading.Thread):
     def stop(self):
         """スレッドを停止する"""
         self.stop_event.set()
+        self.wake_event.set()
         logging.info(f"[{self.symbol}-{self.timeframe_str}] 停止シグナルを受信しました。")
 
+    def _on_bar_closed(self, symbol, bar):
+        """ティックストリームで足が確定したら、スキャルピングモードのときだけ即座に評価する。"""
+        if self.trade_manager.get_current_mode() == 'scalp':
+            self.wake_event.set()
+
+    def _wait(self, seconds):
+        """
+        次のループまで待つ。リプレイの取得元では仮想時計で待ち、
+        ティックストリームがあれば足の確定イベントが来た時点で起きる。
+        """
+        if self.mt5.clock is not None:
+            self.mt5.clock.wait(seconds, self.stop_event)
+            return
+        deadline = time.time() + seconds
+        while self.wake_event.wait(max(0.0, deadline - time.time())):
+            self.wake_event.clear()
+            retry_at, self._retry_at = self._retry_at, None
+            if retry_at is None or self.stop_event.is_set():
+                return
+            # 評価キューでの失敗: 待ち時間を再実行の時刻まで縮めて待ち続ける
+            deadline = min(deadline, retry_at)
+
+    def _wait_until_ready(self) -> bool:
+        """
+        接続を最大 interval 秒待つ。H1/D1 では interval が長いので、stop() ですぐ抜けられるよう
+        1秒ずつに区切って待ち、その間に stop_event を確認する。
+        """
+        deadline = time.monotonic() + self.interval
+        while not self.stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if self.mt5.wait_until_ready(timeout=max(0.0, min(1.0, remaining))):
+                return True
+            if remaining <= 1.0:
+                return False
+        return False
+
+    def _sr_rates(self, bars):
+        """強い水平線の検出には、保存済みの長い履歴があればそちらを使う (無ければ None)。"""
+        history = self.mt5.get_history(self.symbol, self.timeframe_obj, config.SR_LOOKBACK_BARS)
+        if history is None or len(history) <= len(bars):
+            return None
+        return history.rates
+
     def run(self):
         """シグナル監視のメインループ"""
         logging.info(f"[{self.symbol}-{self.timeframe_str}] シグナル監視を開始します。")
-        time.sleep(5) # 初期化の安定を待つ
+        try:
+            self._wait(self.initial_delay) # 初期化の安定を待つ (起動時はランナーごとにずらす)
 
-        while not self.stop_event.is_set():
-            try:
-                # --- 1. データ取得 ---
-                df = self.mt5.get_candlestick_data(self.symbol, self.timeframe_obj)
-                if df.empty or len(df) < 50:
-                    logging.warning(f"[{self.symbol}-{self.timeframe_str}] データが不十分なため、今回のチェックをスキップします。")
-                    time.sleep(self.interval)
+            while not self.stop_event.is_set() and not self.mt5.finished:
+                # ターミナルが切断中は再接続を待つ (再接続した瞬間に再開する)
+                if not self._wait_until_ready():
+                    if not self.stop_event.is_set():
+                        logging.warning(f"[{self.symbol}-{self.timeframe_str}] MT5の再接続待ちのため、今回のチェックをスキップします。")
                     continue
-                
-                latest_price = df['Close'].iloc[-1]
 
-                # --- 2. ロジック実行 ---
-                current_mode = self.trade_manager.get_current_mode()
-                self.logic_module = daytrade_logic if current_mode == 'daytrade' else scalping_logic
-                
-                df_with_indicators = self.logic_module.add_all_indicators(df.copy())
-                
-                signal_result = None
-                if current_mode == 'daytrade':
-                    strong_sr = self.logic_module.find_strong_sr_levels(df_with_indicators, self.symbol)
-                    signal_result = self.logic_module.generate_signal(df_with_indicators, strong_sr)
-                else: # scalp
-                    signal_result = self.logic_module.generate_signal(df_with_indicators)
-
-                # --- 3. 結果処理 ---
-                is_trade_signal = signal_result and signal_result.get("type") not in ["見送り", "NONE", None] and "罠" not in signal_result.get("type")
-
-                if is_trade_signal:
-                    # 【売買シグナルあり】
-                    now = time.time()
-                    if now - self.last_signal_time < self.cooldown_period:
-                        logging.info(f"[{self.symbol}-{self.timeframe_str}] クールダウン中のため、シグナルをスキップします。")
-                    else:
-                        self.last_signal_time = now
-                        tp_sl = self.trade_manager.calculate_tp_sl(signal_result["type"], latest_price, self.symbol)
-                        chart_filepath = self.chart_drawer.save_candlestick_chart(df_with_indicators, self.symbol, self.timeframe_str, f"{self.symbol}_{self.timeframe_str}_{signal_result['type']}", logic_name=current_mode)
-                        
-                        signal_data = {
-                            "symbol": self.symbol,
-                            "timeframe": self.timeframe_str,
-                            "signal": signal_result["type"].upper(),
-                            "price": f"{latest_price:.3f}",
-                            "tp": f"{tp_sl['tp']:.3f}",
-                            "sl": f"{tp_sl['sl']:.3f}",
-                            "desc": ", ".join(signal_result.get("reasons", ["-"])),
-                            "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        }
-                        self.add_signal_callback(signal_data, chart_filepath)
-                        self.trade_manager.execute_action(signal_data, chart_filepath)
-
-                else:
-                    # 【シグナルなし or 見送り or 罠アラート】
-                    desc = "シグナル待機中..."
-                    signal_type = "NONE"
-                    if signal_result and signal_result.get("reasons"):
-                        desc = ", ".join(signal_result.get("reasons"))
-                        signal_type = signal_result.get("type") # 「見送り」や「罠アラート」を表示
-
-                    signal_data = {
-                        "symbol": self.symbol,
-                        "timeframe": self.timeframe_str,
-                        "signal": signal_type,
-                        "price": f"{latest_price:.3f}",
-                        "tp": "N/A",
-                        "sl": "N/A",
-                        "desc": desc,
-                        "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    }
-                    # チャートは無いので None を渡す
-                    self.add_signal_callback(signal_data, None)
-
-            except Exception as e:
-                logging.error(f"[{self.symbol}-{self.timeframe_str}] ループ中にエラーが発生: {e}", exc_info=True)
-            
-            finally:
-                # 次のループまでの待機
-                self.stop_event.wait(self.interval)
-        
+                try:
+                    self.run_once()
+                finally:
+                    # 次のループまでの待機 (スケジューラがあれば次の足の確定直後まで)
+                    self._wait(self.next_wait)
+        finally:
+            # 異常終了しても、仮想時計がこのランナーを待ち続けないようにする
+            if self.mt5.clock is not None:
+                self.mt5.clock.unregister()
         logging.info(f"[{self.symbol}-{self.timeframe_str}] シグナル監視を終了します。")
+
+    def run_once(self):
+        """データ取得 → ロジック実行 → 結果処理 を1回行う。待機はしない (次の待ち時間は self.next_wait)。"""
+        self.busy_since = time.time()
+        queued = False
+        try:
+            bars = self.fetch()
+            if bars is None:
+                return
+            if self.work_queue is not None:
+                # 次の足が確定するまでに始められなければキュー側で破棄される。実行中の busy_since はワーカー側で付け外しする
+                self.busy_since = None
+                queued = True
+                self.work_queue.submit((self.symbol, self.timeframe_str), self.tf_seconds, time.time() + self.next_wait,
+                                       lambda: self._run_queued(bars))
+                return
+            evaluation = self.evaluate(bars)
+            self.emit(evaluation)
+        except Exception as e:
+            logging.error(f"[{self.symbol}-{self.timeframe_str}] ループ中にエラーが発生: {e}", exc_info=True)
+            self.retry_soon()
+        finally:
+            if not queued:
+                self.busy_since = None
+
+    def _run_queued(self, bars):
+        """評価キューのワーカーで評価・通知を行う。失敗の扱いは run_once のその場での評価と同じ。"""
+        self.busy_since = time.time()
+        try:
+            self.emit(self.evaluate(bars))
+        except Exception as e:
+            logging.error(f"[{self.symbol}-{self.timeframe_str}] 評価キューでの処理中にエラーが発生: {e}", exc_info=True)
+            if self.scheduler is not None:
+                # ランナーは既に次の足の確定まで待っているので、再実行の時刻を渡して起こす
+                self.retry_soon()
+                self._retry_at = time.time() + self.next_wait
+                self.wake_event.set()
+        finally:
+            self.busy_since = None
+
+    def retry_soon(self):
+        """評価・通知に失敗したときは、次の足の確定を待たずに少し後でやり直す (確定足は通知できたときだけ記録する)。"""
+        if self.scheduler is not None:
+            self.next_wait = min(self.next_wait, config.BAR_CLOSE_RETRY_SECONDS + self.wake_offset)
+
+    # --- 各段階 (AsyncRunnerEngine からも個別に呼ばれる) ---
+
+    def fetch(self):
+        """
+        1. データ取得 (I/O)。評価が不要なとき (データ不足・確定足が増えていない) は None を返す。
+        次のループまでの待ち時間を self.next_wait に設定する。
+        """
+        self.next_wait = self.interval + self.wake_offset
+        if self.market_calendar is not None:
+            now = time.time()
+            if not self.market_calendar.is_open(self.symbol, now):
+                if not self.market_closed:
+                    logging.info(f"[{self.symbol}-{self.timeframe_str}] 市場が閉まっているため、監視を休止します。")
+                    self.market_closed = True
+                self.next_wait = min(self.market_calendar.seconds_until_open(self.symbol, now), config.MARKET_CLOSED_MAX_SLEEP_SECONDS)
+                return None
+            if self.market_closed:
+                logging.info(f"[{self.symbol}-{self.timeframe_str}] 市場が開いたため、監視を再開します。")
+                self.market_closed = False
+        bars = self.mt5.get_bars(self.symbol, self.timeframe_obj)
+        if bars is None or len(bars) < 50:
+            logging.warning(f"[{self.symbol}-{self.timeframe_str}] データが不十分なため、今回のチェックをスキップします。")
+            return None
+
+        if self.scheduler is None and self.activity_gauge is not None:
+            # 固定間隔で足の途中も確認する場合だけ、活発さに応じて間隔を変える
+            self.next_wait = self.interval * self.activity_gauge.interval_factor(bars) + self.wake_offset
+
+        if self.scheduler is not None:
+            self.scheduler.observe(bars.last_time, self.tf_seconds)
+            self.next_wait = self.scheduler.seconds_until_next_close(bars.last_time, self.tf_seconds, self.interval) + self.wake_offset
+            # 確定足が増えていなくても、モードや売買設定が変わっていれば評価し直す
+            settings_unchanged = self.last_fingerprint is not None and self.last_fingerprint[-1] == self._settings_key()
+            if bars.last_closed_time == self.last_closed_time and settings_unchanged:
+                logging.debug(f"[{self.symbol}-{self.timeframe_str}] 新しい確定足が無いため、今回のチェックをスキップします。")
+                return None
+
+        fingerprint = self._fingerprint(bars)
+        if fingerprint == self.last_fingerprint:
+            logging.debug(f"[{self.symbol}-{self.timeframe_str}] 前回と同じ入力のため、今回のチェックをスキップします。")
+            return None
+        self._fetched_fingerprint = fingerprint
+        self._fetched_closed_time = bars.last_closed_time
+        return bars
+
+    def warm_up(self, bars):
+        """起動前に1回だけ呼ばれる。ストリーミングインジケーターを使う場合は、現在のモードの状態を作っておく。"""
+        if self.streaming_engines is None or self.compute_pool is not None:
+            return
+        with self._streaming_lock:
+            self._streaming_engine(self.trade_manager.get_current_mode(), self.evaluation_bars(bars))
+
+    def _streaming_engine(self, mode, bars):
+        """bars まで sync した、モード用の StreamingIndicatorEngine (無効なら None)。"""
+        engine = self.streaming_engines.get(mode)
+        if engine is None:
+            engine = self.streaming_engines[mode] = StreamingIndicatorEngine.for_mode(mode)
+        if not engine.sync(bars.rates):
+            # 初回や取得に抜けがあったときは、保存済みの履歴 + 今回の窓の確定足から作り直す
+            closed = bars.rates[:-1]
+            history = self.mt5.get_history(self.symbol, self.timeframe_obj, config.STREAMING_WARMUP_BARS)
+            older = history.rates[history.rates['time'] < closed['time'][0]] if history is not None else closed[:0]
+            engine.rebuild(older, closed)
+            logging.info(f"[{self.symbol}-{self.timeframe_str}] ストリーミングインジケーターを {len(older) + len(closed)} 本の確定足から作り直しました。")
+        return engine
+
+    def _fingerprint(self, bars) -> tuple:
+        """最新の確定足の時刻、形成中の足の OHLCV、売買設定 (モードを含む) の組。"""
+        forming = bars.rates[-1]
+        return (
+            bars.last_closed_time, int(forming['time']),
+            float(forming['open']), float(forming['high']), float(forming['low']), float(forming['close']),
+            int(forming['tick_volume']),
+            self._settings_key(),
+        )
+
+    def _settings_key(self) -> tuple:
+        return tuple(sorted(self.trade_manager.get_trade_settings().items()))
+
+    def evaluation_bars(self, bars):
+        """
+        ロジックに渡す窓。足の確定に合わせて起きる場合は、確定直後の (ほぼ空の) 形成中の足を除き、確定足だけで判定する。
+        固定間隔で足の途中も確認する場合は、形成中の足を含めたまま渡す。
+        """
+        if self.scheduler is None:
+            return bars
+        return Bars(bars.rates[:-1], bars.symbol, bars.timeframe)
+
+    def evaluate(self, bars) -> dict:
+        """2. ロジック実行 (CPU)。インジケーター計算とシグナル判定の結果を返す。"""
+        started = time.perf_counter()
+        bars = self.evaluation_bars(bars)
+        latest_price = float(bars.close[-1])
+        current_mode = self.trade_manager.get_current_mode()
+        self.logic_module = daytrade_logic if current_mode == 'daytrade' else scalping_logic
+        sr_rates = self._sr_rates(bars) if current_mode == 'daytrade' else None
+
+        evaluation = None
+        if self.compute_pool is not None:
+            evaluation = self.compute_pool.evaluate(bars.rates, self.symbol, self.timeframe_str, current_mode, sr_rates)
+        if evaluation is None and self.streaming_engines is not None:
+            with self._streaming_lock:
+                engine = self._streaming_engine(current_mode, bars)
+                evaluation = evaluate_bars(bars.rates, self.symbol, self.timeframe_str, current_mode, sr_rates, indicator_engine=engine)
+        if evaluation is None:
+            evaluation = evaluate_bars(bars.rates, self.symbol, self.timeframe_str, current_mode, sr_rates)
+        evaluation["price"] = latest_price
+        evaluation["fingerprint"] = self._fetched_fingerprint
+        evaluation["closed_time"] = self._fetched_closed_time
+
+        elapsed = time.perf_counter() - started
+        self.avg_eval_seconds = elapsed if self.avg_eval_seconds is None else 0.8 * self.avg_eval_seconds + 0.2 * elapsed
+        return evaluation
+
+    def emit(self, evaluation: dict):
+        """3. 結果処理 (チャート保存・コールバック・発注)。"""
+        current_mode = evaluation["mode"]
+        df_with_indicators = evaluation["df"]
+        signal_result = evaluation["signal"]
+        latest_price = evaluation["price"]
+
+        if is_trade_signal(signal_result):
+            # 【売買シグナルあり】
+            now = time.time()
+            if now - self.last_signal_time < self.cooldown_period:
+                logging.info(f"[{self.symbol}-{self.timeframe_str}] クールダウン中のため、シグナルをスキップします。")
+            else:
+                self.last_signal_time = now
+                tp_sl = self.trade_manager.calculate_tp_sl(signal_result["type"], latest_price, self.symbol)
+                chart_filepath = self.chart_drawer.save_candlestick_chart(df_with_indicators, self.symbol, self.timeframe_str, f"{self.symbol}_{self.timeframe_str}_{signal_result['type']}", logic_name=current_mode)
+                
+                signal_data = {
+                    "symbol": self.symbol,
+                    "timeframe": self.timeframe_str,
+                    "signal": signal_result["type"].upper(),
+                    "price": f"{latest_price:.3f}",
+                    "tp": f"{tp_sl['tp']:.3f}",
+                    "sl": f"{tp_sl['sl']:.3f}",
+                    "desc": ", ".join(signal_result.get("reasons", ["-"])),
+                    "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                }
+                self.add_signal_callback(signal_data, chart_filepath)
+                self.trade_manager.execute_action(signal_data, chart_filepath)
+
+        else:
+            # 【シグナルなし or 見送り or 罠アラート】
+            desc = "シグナル待機中..."
+            signal_type = "NONE"
+            if signal_result and signal_result.get("reasons"):
+                desc = ", ".join(signal_result.get("reasons"))
+                signal_type = signal_result.get("type") # 「見送り」や「罠アラート」を表示
+
+            signal_data = {
+                "symbol": self.symbol,
+                "timeframe": self.timeframe_str,
+                "signal": signal_type,
+                "price": f"{latest_price:.3f}",
+                "tp": "N/A",
+                "sl": "N/A",
+                "desc": desc,
+                "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+            # チャートは無いので None を渡す
+            self.add_signal_callback(signal_data, None)
+
+        # 結果を出し終えてから指紋と確定足を記録する (途中で失敗した場合は次回やり直す)
+        self.last_fingerprint = evaluation.get("fingerprint")
+        self.last_closed_time = evaluation.get("closed_time")
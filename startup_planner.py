@@ -0,0 +1,80 @@
+# startup_planner.py (起動時の時差スタートとウォームアップ)
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, List, Optional
+
+import config
+from market_data import TIMEFRAME_SECONDS
+
+logger = logging.getLogger(__name__)
+
+class StartupPlanner:
+    """
+    全ランナーが同時に起動して MT5 とインジケーター計算に殺到しないようにする。
+    - plan(): 最初の実行を短い時間足から順に少しずつずらし (initial_delay)、
+      正確な足の確定への同期が不要な時間足では、以降の起床も同じ時間足の中で少しずつずらす (wake_offset)
+    - warm_up(): ランナーを起動する前に、全ペアのデータ取得を並列数を絞って1回ずつ行い、
+      最初のシグナル判定を足のキャッシュが温まった状態で始められるようにする
+      (ストリーミングインジケーターを使うランナーは、インジケーターの状態もここで作っておく)
+    """
+    def __init__(self, data_source, progress_callback: Optional[Callable[[int, int], None]] = None):
+        self.mt5 = data_source
+        self.progress_callback = progress_callback
+        self.progress = {"total": 0, "done": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def plan(self, runners: List) -> None:
+        """各ランナーの initial_delay と wake_offset を設定する。"""
+        ordered = sorted(runners, key=lambda r: TIMEFRAME_SECONDS[r.timeframe_obj])
+        window = config.STARTUP_STAGGER_WINDOW_SECONDS
+        step = window / len(ordered) if ordered else 0
+        for i, runner in enumerate(ordered):
+            runner.initial_delay = config.STARTUP_MIN_DELAY_SECONDS + i * step
+
+        by_timeframe = {}
+        for runner in runners:
+            by_timeframe.setdefault(runner.timeframe_str, []).append(runner)
+        for timeframe_str, group in by_timeframe.items():
+            spread = config.STARTUP_WAKE_SPREAD_SECONDS.get(timeframe_str, 0)
+            for k, runner in enumerate(group):
+                runner.wake_offset = spread * k / len(group)
+        logger.info(f"起動計画: {len(runners)} ランナーを {window:.0f} 秒かけて順に開始します。")
+
+    def warm_up(self, runners: List) -> dict:
+        """全ペアのデータ取得を1回ずつ行う。時間切れになったら残りは諦めて戻る。"""
+        with self._lock:
+            self.progress = {"total": len(runners), "done": 0, "failed": 0}
+        started = time.time()
+        executor = ThreadPoolExecutor(max_workers=config.STARTUP_WARMUP_CONCURRENCY, thread_name_prefix="WarmUp")
+        futures = [executor.submit(self._warm_up_one, runner) for runner in runners]
+        _, not_done = wait(futures, timeout=config.STARTUP_WARMUP_TIMEOUT_SECONDS)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        elapsed = time.time() - started
+        if not_done:
+            logger.warning(f"ウォームアップが {elapsed:.0f} 秒で時間切れになりました。未完了: {len(not_done)} 件")
+        logger.info(f"ウォームアップ完了: {self.progress['done']}/{self.progress['total']} 件 "
+                    f"(失敗 {self.progress['failed']} 件, {elapsed:.1f}秒)")
+        return dict(self.progress)
+
+    def _warm_up_one(self, runner):
+        ok = False
+        try:
+            bars = self.mt5.get_bars(runner.symbol, runner.timeframe_obj)
+            if bars is not None and len(bars) > 0:
+                # 取得で足のキャッシュ (リングバッファ・保存済みの足からの種まき) が温まる。残す状態があればランナーに作らせる
+                runner.warm_up(bars)
+                ok = True
+        except Exception as e:
+            logger.error(f"[{runner.symbol}-{runner.timeframe_str}] ウォームアップ中にエラーが発生: {e}", exc_info=True)
+        with self._lock:
+            self.progress["done" if ok else "failed"] += 1
+            done = self.progress["done"] + self.progress["failed"]
+            total = self.progress["total"]
+        if done % 5 == 0 or done == total:
+            logger.info(f"ウォームアップ中... {done}/{total}")
+        if self.progress_callback:
+            self.progress_callback(done, total)
@@ -0,0 +1,431 @@
+# streaming_indicators.py (足が1本確定するごとに定数時間で更新するインジケーター)
+
+import itertools
+import logging
+import math
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import config
+
+logger = logging.getLogger(__name__)
+
+NAN = float('nan')
+# pandas_ta.non_zero_range と同じく、値幅が 0 のときは割り算の前に極小値を足す
+EPSILON = np.finfo(float).eps
+
+# --- 1. 基本の状態 (update で確定足を取り込み、peek で形成中の足の値を状態を変えずに計算する) ---
+
+class _Ema:
+    """pandas_ta.ema と同じ: 最初の length 本の単純平均を種にし、以降は alpha = 2 / (length + 1) で更新する。"""
+    def __init__(self, length: int):
+        self.length = length
+        self.alpha = 2.0 / (length + 1)
+        self.count = 0
+        self.seed_sum = 0.0
+        self.value = NAN
+
+    def _next(self, x: float):
+        count = self.count + 1
+        if count < self.length:
+            return count, self.seed_sum + x, NAN
+        if count == self.length:
+            return count, self.seed_sum + x, (self.seed_sum + x) / self.length
+        return count, self.seed_sum, self.value + self.alpha * (x - self.value)
+
+    def update(self, x: float) -> float:
+        self.count, self.seed_sum, self.value = self._next(x)
+        return self.value
+
+    def peek(self, x: float) -> float:
+        return self._next(x)[2]
+
+
+class _Rma:
+    """
+    pandas_ta.rma (Wilder の平滑化) と同じ: ewm(alpha=1/length, min_periods=length, adjust=True).mean()。
+    adjust=True の加重平均は、分子と分母をそれぞれ1つ前の値から更新すれば定数時間で求まる。
+    """
+    def __init__(self, length: int):
+        self.length = length
+        self.decay = 1.0 - 1.0 / length
+        self.count = 0
+        self.numerator = 0.0
+        self.denominator = 0.0
+
+    def _next(self, x: float):
+        return self.count + 1, x + self.decay * self.numerator, 1.0 + self.decay * self.denominator
+
+    def _value(self, count: int, numerator: float, denominator: float) -> float:
+        return numerator / denominator if count >= self.length else NAN
+
+    def update(self, x: float) -> float:
+        self.count, self.numerator, self.denominator = self._next(x)
+        return self._value(self.count, self.numerator, self.denominator)
+
+    def peek(self, x: float) -> float:
+        return self._value(*self._next(x))
+
+
+class _RollingMoments:
+    """
+    直近 length 個の合計と二乗和 (単純移動平均と母標準偏差用)。
+    値の大きい銘柄で桁落ちしないよう、最初の値からの差で合計を持ち、たまに窓から計算し直して誤差をリセットする。
+    """
+    RESUM_EVERY = 1000
+
+    def __init__(self, length: int):
+        self.length = length
+        self.window = deque(maxlen=length)
+        self.shift = None
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.updates = 0
+
+    def _next(self, x: float):
+        shift = x if self.shift is None else self.shift
+        d = x - shift
+        total, total_sq = self.total + d, self.total_sq + d * d
+        if len(self.window) == self.length:
+            old = self.window[0] - shift
+            total, total_sq = total - old, total_sq - old * old
+        return shift, total, total_sq, min(len(self.window) + 1, self.length)
+
+    def _moments(self, shift: float, total: float, total_sq: float, n: int):
+        if n < self.length:
+            return NAN, NAN
+        mean = total / n
+        variance = max(total_sq / n - mean * mean, 0.0)
+        return shift + mean, math.sqrt(variance)
+
+    def update(self, x: float):
+        self.shift, self.total, self.total_sq, n = self._next(x)
+        self.window.append(x)
+        self.updates += 1
+        if self.updates % self.RESUM_EVERY == 0:
+            self.shift = self.window[0]
+            diffs = np.fromiter(self.window, dtype=float) - self.shift
+            self.total, self.total_sq = float(diffs.sum()), float((diffs * diffs).sum())
+        return self._moments(self.shift, self.total, self.total_sq, n)
+
+    def peek(self, x: float):
+        return self._moments(*self._next(x))
+
+
+class _RollingExtreme:
+    """直近 length 個の最大値 (または最小値)。単調キューで持つので、更新も参照も定数時間 (償却)。"""
+    def __init__(self, length: int, maximum: bool):
+        self.length = length
+        self.maximum = maximum
+        self.queue = deque()  # (通し番号, 値)。先頭が窓の中の最大値 (最小値)
+        self.index = -1
+
+    def _better(self, a: float, b: float) -> bool:
+        return a >= b if self.maximum else a <= b
+
+    def _front_after(self, index: int):
+        """index の位置に1つ追加したときにも窓に残る先頭の値 (窓から外れるのは先頭の1つだけ)。"""
+        for i, value in self.queue:
+            if i > index - self.length:
+                return value
+        return None
+
+    def update(self, x: float) -> float:
+        self.index += 1
+        while self.queue and self._better(x, self.queue[-1][1]):
+            self.queue.pop()
+        self.queue.append((self.index, x))
+        if self.queue[0][0] <= self.index - self.length:
+            self.queue.popleft()
+        return self.queue[0][1] if self.index + 1 >= self.length else NAN
+
+    def peek(self, x: float) -> float:
+        index = self.index + 1
+        if index + 1 < self.length:
+            return NAN
+        front = self._front_after(index)
+        if front is None or self._better(x, front):
+            return x
+        return front
+
+
+class _RollingMean:
+    """直近 length 個の単純移動平均 (NaN は渡さないこと)。"""
+    def __init__(self, length: int):
+        self.moments = _RollingMoments(length)
+
+    def update(self, x: float) -> float:
+        return self.moments.update(x)[0]
+
+    def peek(self, x: float) -> float:
+        return self.moments.peek(x)[0]
+
+
+# --- 2. インジケーター (足の OHLC から、pandas_ta と同じ名前のカラムの値を返す) ---
+
+class StreamingIndicator:
+    """1本の足 (レコード配列の1行) を受け取り、columns の順に値を返すインジケーターの共通の形。"""
+    columns: List[str] = []
+
+    def update(self, bar) -> tuple:
+        """確定した足を取り込み、その足の値を返す。"""
+        raise NotImplementedError
+
+    def peek(self, bar) -> tuple:
+        """形成中の足の値を返す。状態は変えないので、何度呼んでもよい。"""
+        raise NotImplementedError
+
+
+class StreamingEma(StreamingIndicator):
+    def __init__(self, length: int):
+        self.columns = [f'EMA_{length}']
+        self.ema = _Ema(length)
+
+    def update(self, bar) -> tuple:
+        return (self.ema.update(float(bar['close'])),)
+
+    def peek(self, bar) -> tuple:
+        return (self.ema.peek(float(bar['close'])),)
+
+
+class StreamingRsi(StreamingIndicator):
+    """pandas_ta.rsi と同じ: 終値の差の上昇分・下落分をそれぞれ rma で平滑化する。"""
+    def __init__(self, length: int = 14):
+        self.columns = [f'RSI_{length}']
+        self.gain = _Rma(length)
+        self.loss = _Rma(length)
+        self.prev_close = None
+
+    @staticmethod
+    def _rsi(gain: float, loss: float) -> float:
+        total = gain + loss
+        return 100.0 * gain / total if total != 0 else NAN
+
+    def update(self, bar) -> tuple:
+        close = float(bar['close'])
+        prev_close, self.prev_close = self.prev_close, close
+        if prev_close is None:
+            return (NAN,)
+        change = close - prev_close
+        return (self._rsi(self.gain.update(max(change, 0.0)), self.loss.update(max(-change, 0.0))),)
+
+    def peek(self, bar) -> tuple:
+        if self.prev_close is None:
+            return (NAN,)
+        change = float(bar['close']) - self.prev_close
+        return (self._rsi(self.gain.peek(max(change, 0.0)), self.loss.peek(max(-change, 0.0))),)
+
+
+class StreamingAtr(StreamingIndicator):
+    """pandas_ta.atr (mamode='rma') と同じ: 真の値幅を rma で平滑化する。カラム名は signal_logic に合わせて ATR_{length}。"""
+    def __init__(self, length: int = 14):
+        self.columns = [f'ATR_{length}']
+        self.rma = _Rma(length)
+        self.prev_close = None
+
+    def _true_range(self, bar) -> float:
+        high, low = float(bar['high']), float(bar['low'])
+        return max(high - low, abs(high - self.prev_close), abs(self.prev_close - low))
+
+    def update(self, bar) -> tuple:
+        if self.prev_close is None:
+            self.prev_close = float(bar['close'])
+            return (NAN,)
+        value = self.rma.update(self._true_range(bar))
+        self.prev_close = float(bar['close'])
+        return (value,)
+
+    def peek(self, bar) -> tuple:
+        if self.prev_close is None:
+            return (NAN,)
+        return (self.rma.peek(self._true_range(bar)),)
+
+
+class StreamingMacd(StreamingIndicator):
+    """pandas_ta.macd と同じ: シグナル線は MACD が出始めた足から EMA (単純平均の種つき) で計算する。"""
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        suffix = f'{fast}_{slow}_{signal}'
+        self.columns = [f'MACD_{suffix}', f'MACDh_{suffix}', f'MACDs_{suffix}']
+        self.fast = _Ema(fast)
+        self.slow = _Ema(slow)
+        self.signal = _Ema(signal)
+
+    @staticmethod
+    def _result(macd: float, signal: float) -> tuple:
+        return macd, macd - signal, signal
+
+    def update(self, bar) -> tuple:
+        close = float(bar['close'])
+        macd = self.fast.update(close) - self.slow.update(close)
+        if math.isnan(macd):
+            return NAN, NAN, NAN
+        return self._result(macd, self.signal.update(macd))
+
+    def peek(self, bar) -> tuple:
+        close = float(bar['close'])
+        macd = self.fast.peek(close) - self.slow.peek(close)
+        if math.isnan(macd):
+            return NAN, NAN, NAN
+        return self._result(macd, self.signal.peek(macd))
+
+
+class StreamingStochastic(StreamingIndicator):
+    """pandas_ta.stoch と同じ: 最高値・最安値は単調キュー、%K の平滑化と %D は単純移動平均。"""
+    def __init__(self, k: int = 14, d: int = 3, smooth_k: int = 3):
+        suffix = f'{k}_{d}_{smooth_k}'
+        self.columns = [f'STOCHk_{suffix}', f'STOCHd_{suffix}']
+        self.highest = _RollingExtreme(k, maximum=True)
+        self.lowest = _RollingExtreme(k, maximum=False)
+        self.k_mean = _RollingMean(smooth_k)
+        self.d_mean = _RollingMean(d)
+
+    @staticmethod
+    def _raw(close: float, highest: float, lowest: float) -> float:
+        value_range = highest - lowest
+        return 100.0 * (close - lowest) / (value_range if value_range != 0 else EPSILON)
+
+    def update(self, bar) -> tuple:
+        highest = self.highest.update(float(bar['high']))
+        lowest = self.lowest.update(float(bar['low']))
+        raw = self._raw(float(bar['close']), highest, lowest)
+        if math.isnan(raw):
+            return NAN, NAN
+        k = self.k_mean.update(raw)
+        if math.isnan(k):
+            return NAN, NAN
+        return k, self.d_mean.update(k)
+
+    def peek(self, bar) -> tuple:
+        raw = self._raw(float(bar['close']), self.highest.peek(float(bar['high'])), self.lowest.peek(float(bar['low'])))
+        if math.isnan(raw):
+            return NAN, NAN
+        k = self.k_mean.peek(raw)
+        if math.isnan(k):
+            return NAN, NAN
+        return k, self.d_mean.peek(k)
+
+
+class StreamingBollinger(StreamingIndicator):
+    """
+    pandas_ta.bbands と同じ (単純移動平均と ddof=0 の標準偏差)。
+    suffix を省略すると pandas_ta のカラム名 (BBL_20_2.0 など)。signal_logic の BBL_20 形式には suffix='20' を渡す。
+    """
+    def __init__(self, length: int = 20, std: float = 2.0, suffix: Optional[str] = None):
+        suffix = suffix or f'{length}_{float(std)}'
+        self.columns = [f'BBL_{suffix}', f'BBM_{suffix}', f'BBU_{suffix}', f'BBB_{suffix}', f'BBP_{suffix}']
+        self.std = std
+        self.moments = _RollingMoments(length)
+
+    def _result(self, close: float, mean: float, deviation: float) -> tuple:
+        lower, upper = mean - self.std * deviation, mean + self.std * deviation
+        band = upper - lower
+        return lower, mean, upper, 100.0 * band / mean, (close - lower) / (band if band != 0 else EPSILON)
+
+    def update(self, bar) -> tuple:
+        close = float(bar['close'])
+        return self._result(close, *self.moments.update(close))
+
+    def peek(self, bar) -> tuple:
+        close = float(bar['close'])
+        return self._result(close, *self.moments.peek(close))
+
+
+# モードごとに、add_all_indicators が作るのと同じカラムを出すインジケーターの組
+MODE_INDICATORS = {
+    'daytrade': lambda: [StreamingRsi(14)],
+    'scalp': lambda: [StreamingBollinger(20, 2.0), StreamingStochastic(14, 3, 3)],
+}
+
+
+# --- 3. エンジン (1つの symbol-timeframe の全インジケーターと、確定足ごとの結果の履歴) ---
+
+class StreamingIndicatorEngine:
+    """
+    1つの (symbol, timeframe) のインジケーターの状態を持ち続け、確定足が増えた分だけ更新する。
+    - rebuild(): 起動時などに、保存済みの確定足の履歴から状態を作り直す
+    - sync(): ループで取得した窓のうち、前回から増えた確定足だけを取り込む (通常は1本、定数時間)
+    - apply(): 確定足の結果の履歴と、形成中の足だけを計算した値を DataFrame のカラムにする
+
+    値は「rebuild からの全履歴に pandas_ta をかけた結果」と誤差の範囲で一致する。
+    最新 300 本だけに pandas_ta をかけた結果とは、EMA_200 のような長い期間の初期値の影響の分だけ異なる
+    (こちらの方が十分に収束した値)。
+    """
+    def __init__(self, indicator_factory: Callable[[], List[StreamingIndicator]], history: Optional[int] = None):
+        self.indicator_factory = indicator_factory
+        self.indicators = indicator_factory()
+        self.history = history or config.STREAMING_HISTORY_BARS
+        self.columns = [column for indicator in self.indicators for column in indicator.columns]
+        self.last_time: Optional[int] = None
+        self._times = deque(maxlen=self.history)
+        self._values = {column: deque(maxlen=self.history) for column in self.columns}
+
+    @classmethod
+    def for_mode(cls, mode: str, history: Optional[int] = None) -> 'StreamingIndicatorEngine':
+        return cls(MODE_INDICATORS[mode], history)
+
+    @property
+    def ready(self) -> bool:
+        return self.last_time is not None
+
+    def rebuild(self, *closed_parts: np.ndarray):
+        """
+        確定足だけのレコード配列 (古い順) から状態を作り直す。形成中の足は含めないこと。
+        保存済みの履歴と取得した窓のように dtype の違う配列は、古い順に分けて渡してよい。
+        """
+        self.indicators = self.indicator_factory()
+        self.last_time = None
+        self._times.clear()
+        for values in self._values.values():
+            values.clear()
+        for part in closed_parts:
+            for bar in part:
+                self._commit(bar)
+        logger.debug(f"ストリーミングインジケーターを {sum(len(part) for part in closed_parts)} 本の履歴から作り直しました。")
+
+    def sync(self, rates: np.ndarray) -> bool:
+        """
+        取得した窓 (最後の1本は形成中の足) から、前回より新しい確定足を取り込む。
+        前回の確定足が窓の中に無い (抜けがある・窓の方が古い) 場合は何もせず False を返す (rebuild が必要)。
+        """
+        if self.last_time is None or len(rates) < 2:
+            return False
+        closed = rates[:-1]
+        position = int(np.searchsorted(closed['time'], self.last_time))
+        if position >= len(closed) or int(closed['time'][position]) != self.last_time:
+            return False
+        for bar in closed[position + 1:]:
+            self._commit(bar)
+        return True
+
+    def _commit(self, bar):
+        values = [value for indicator in self.indicators for value in indicator.update(bar)]
+        self._times.append(int(bar['time']))
+        for column, value in zip(self.columns, values):
+            self._values[column].append(value)
+        self.last_time = int(bar['time'])
+
+    def forming(self, bar) -> Dict[str, float]:
+        """形成中の足のインジケーターの値。"""
+        values = [value for indicator in self.indicators for value in indicator.peek(bar)]
+        return dict(zip(self.columns, values))
+
+    def apply(self, df: pd.DataFrame, rates: np.ndarray) -> pd.DataFrame:
+        """
+        sync 済みの状態から、rates (df と同じ行) の各カラムの値を df に追加する。
+        履歴が窓より短い行は NaN になる。
+        """
+        n = len(rates)
+        closed_count = min(n - 1, len(self._times))
+        forming = self.forming(rates[-1])
+        for column in self.columns:
+            column_values = np.full(n, np.nan)
+            if closed_count > 0:
+                history = self._values[column]
+                column_values[n - 1 - closed_count:n - 1] = np.fromiter(
+                    itertools.islice(history, len(history) - closed_count, None), dtype=float, count=closed_count)
+            column_values[-1] = forming[column]
+            df[column] = column_values
+        return df
@@ -0,0 +1,79 @@
+# symbol_registry.py (シンボルの選択状態と symbol_info のキャッシュ)
+
+import MetaTrader5 as mt5
+import logging
+import threading
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+class SymbolRegistry:
+    """
+    気配値表示への追加 (symbol_select) を起動時・再接続時に1回だけ行い、
+    symbol_info から必要な項目だけをキャッシュする。
+    ターミナルを呼ぶメソッドは MT5Connector のブローカースレッド上で呼び出すこと。
+    """
+    def __init__(self):
+        self._info: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def get_cached(self, symbol: str) -> Optional[dict]:
+        """ターミナルを呼ばずにキャッシュ済みの情報だけを返す。"""
+        with self._lock:
+            return self._info.get(symbol)
+
+    def ensure(self, symbol: str) -> Optional[dict]:
+        """未登録のシンボルを選択して symbol_info をキャッシュし、その情報を返す。"""
+        info = self.get_cached(symbol)
+        if info is not None:
+            return info
+
+        if not mt5.symbol_select(symbol, True):
+            logger.warning(f"シンボル '{symbol}' を気配値表示に追加できませんでした。データ取得に失敗する可能性があります。")
+        raw = mt5.symbol_info(symbol)
+        if raw is None:
+            logger.warning(f"シンボル '{symbol}' の情報を取得できませんでした。エラーコード: {mt5.last_error()}")
+            return None
+
+        info = {
+            "point": raw.point,
+            "digits": raw.digits,
+            "contract_size": raw.trade_contract_size,
+            "trade_mode": raw.trade_mode,
+            "trade_exemode": raw.trade_exemode,
+            "filling_mode": raw.filling_mode,
+            "volume_min": raw.volume_min,
+            "volume_step": raw.volume_step,
+        }
+        with self._lock:
+            self._info[symbol] = info
+        logger.info(f"シンボル '{symbol}' を登録しました。point={info['point']}, digits={info['digits']}")
+        return info
+
+    def warm_up(self, symbols: Iterable[str]):
+        """起動時・再接続時に監視対象のシンボルをまとめて登録する。"""
+        for symbol in symbols:
+            self.ensure(symbol)
+
+    def reselect_if_missing(self, symbol: str) -> bool:
+        """
+        ターミナル側でシンボルが気配値表示から外れていれば選択し直す。
+        選択し直した場合は True を返す (呼び出し側で取得を1回だけやり直す)。
+        """
+        raw = mt5.symbol_info(symbol)
+        if raw is not None and raw.visible:
+            return False
+        logger.warning(f"シンボル '{symbol}' が気配値表示にありません。選択し直します。")
+        self.invalidate(symbol)
+        return self.ensure(symbol) is not None
+
+    def invalidate(self, symbol: Optional[str] = None):
+        with self._lock:
+            if symbol is None:
+                self._info.clear()
+            else:
+                self._info.pop(symbol, None)
+
+    def known_symbols(self) -> list:
+        with self._lock:
+            return list(self._info)
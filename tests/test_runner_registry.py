@@ -0,0 +1,79 @@
+# test_runner_registry.py (build_runners が StartupPlanner の計画を適用してからランナーを開始すること)
+
+import numpy as np
+import pytest
+
+import config
+import runner_registry
+from market_data import MarketDataSource, RATES_DTYPE, TIMEFRAMES, TIMEFRAME_SECONDS
+from market_data_hub import MarketDataHub
+
+
+class _StaticSource(MarketDataSource):
+    """どのシンボル・時間足にも同じ形の足を返す取得元。"""
+    def __init__(self):
+        self.requested = []
+
+    def get_rates(self, symbol, timeframe, count=500):
+        self.requested.append((symbol, timeframe))
+        rates = np.zeros(100, dtype=RATES_DTYPE)
+        rates['time'] = 1_700_000_000 + TIMEFRAME_SECONDS[timeframe] * np.arange(100)
+        rates['open'] = rates['high'] = rates['low'] = rates['close'] = 100.0
+        return rates
+
+    def get_symbol_info(self, symbol):
+        return {"point": 0.001, "digits": 3}
+
+
+class _TradeManager:
+    def get_current_mode(self):
+        return 'daytrade'
+
+
+@pytest.fixture
+def threaded_runners(monkeypatch):
+    for flag in ('ASYNC_ENGINE_ENABLED', 'BATCH_SWEEP_ENABLED', 'COMPUTE_POOL_ENABLED', 'WORK_QUEUE_ENABLED',
+                 'TICK_STREAM_ENABLED', 'DATA_HUB_ENABLED'):
+        monkeypatch.setattr(config, flag, False)
+
+
+def test_build_runners_staggers_start_and_wake_offsets(threaded_runners):
+    pairs = [('USDJPY', 'H1'), ('EURUSD', 'H1'), ('USDJPY', 'M1'), ('EURUSD', 'M15'), ('GOLD', 'H1')]
+    source = _StaticSource()
+    registry = runner_registry.build_runners(pairs, source, None, None, _TradeManager(), lambda *a: None, lambda *a: None,
+                                             sharded=False)
+    try:
+        runners = {(r.symbol, r.timeframe_str): r for r in registry.runners()}
+        assert set(runners) == set(pairs)
+
+        # 最初の実行は短い時間足から順に、重ならないようにずらす
+        delays = sorted(r.initial_delay for r in runners.values())
+        assert len(set(delays)) == len(pairs)
+        assert delays[0] == config.STARTUP_MIN_DELAY_SECONDS
+        assert runners[('USDJPY', 'M1')].initial_delay == delays[0]
+        assert max(r.initial_delay for r in runners.values() if r.timeframe_str == 'H1') == delays[-1]
+
+        # H1 の起床は同じ時間足の中で散らし、M1 は足の確定ちょうどに起こす
+        h1_offsets = sorted(r.wake_offset for r in runners.values() if r.timeframe_str == 'H1')
+        assert h1_offsets == pytest.approx([0.0, config.STARTUP_WAKE_SPREAD_SECONDS['H1'] / 3,
+                                            config.STARTUP_WAKE_SPREAD_SECONDS['H1'] * 2 / 3])
+        assert runners[('USDJPY', 'M1')].wake_offset == 0.0
+
+        # ウォームアップで全ペアを1回ずつ取得してから開始している
+        assert {(s, tf) for s, tf in source.requested} >= {(s, TIMEFRAMES[tf]) for s, tf in pairs}
+        assert all(r.is_alive() for r in runners.values())
+    finally:
+        registry.stop()
+
+
+def test_build_runners_wraps_live_source_in_data_hub(threaded_runners, monkeypatch):
+    monkeypatch.setattr(config, 'DATA_HUB_ENABLED', True)
+    source = _StaticSource()
+    registry = runner_registry.build_runners([('USDJPY', 'M5')], source, None, None, _TradeManager(),
+                                             lambda *a: None, lambda *a: None, sharded=False)
+    try:
+        assert isinstance(registry.mt5, MarketDataHub)
+        assert registry.mt5.mt5 is source
+        assert all(r.mt5 is registry.mt5 for r in registry.runners())
+    finally:
+        registry.stop()
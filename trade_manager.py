@@ -1,54 +1,40 @@
 # trade_manager.py (通知メッセージ強化版)
 
-import MetaTrader5 as mt5
+try:
+    import MetaTrader5 as mt5
+except ImportError:
+    # Linux などでリプレイの取得元を使う場合。自動売買は行えない
+    mt5 = None
 import logging
-import json
-import os
 import config
-from typing import Optional, Dict
+from typing import Optional, Dict, Mapping
 
 from line_notifier import LineNotifier
 from gmail_notifier import GmailNotifier
+from settings_service import SettingsService, get_settings_service
 
 logger = logging.getLogger(__name__)
-SETTINGS_FILE = 'settings.json'
 
 class TradeManager:
-    def __init__(self, mt5_connector, line_notifier: Optional[LineNotifier], gmail_notifier: Optional[GmailNotifier]):
+    def __init__(self, mt5_connector, line_notifier: Optional[LineNotifier], gmail_notifier: Optional[GmailNotifier], settings_service: Optional[SettingsService] = None):
         self.mt5 = mt5_connector
+        # web_server と同じ設定のスナップショットを共有する
+        self.settings_service = settings_service or get_settings_service()
         self.line_notifier = line_notifier
         self.gmail_notifier = gmail_notifier
         self.magic_number = 20240621
         self.settings = self.get_trade_settings()
 
-    def get_trade_settings(self) -> dict:
-        try:
-            if os.path.exists(SETTINGS_FILE):
-                with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
-                    settings = json.load(f)
-                    mode = settings.get('mode', 'daytrade')
-                    trade_params = config.DAYTRADE_SETTINGS if mode == 'daytrade' else config.SCALP_SETTINGS
-                    return {
-                        "auto_trading": settings.get('auto_trading', False),
-                        "lot_size": float(settings.get('lot_size', config.DEFAULT_LOT_SIZE)),
-                        "sl_pips": int(trade_params.get('stop_loss_pips')),
-                        "tp_pips": int(trade_params.get('take_profit_pips')),
-                        "mode": mode
-                    }
-        except Exception as e:
-            logger.error(f"設定ファイル({SETTINGS_FILE})の読み込み/解析に失敗しました: {e}")
-        return {
-            "auto_trading": False, "lot_size": 0.01,
-            "sl_pips": config.DAYTRADE_SETTINGS['stop_loss_pips'],
-            "tp_pips": config.DAYTRADE_SETTINGS['take_profit_pips'], "mode": "daytrade"
-        }
+    def get_trade_settings(self) -> Mapping:
+        """売買に使う設定のスナップショット (ファイルは変更されたときだけ読み直される)。"""
+        return self.settings_service.trade_settings()
 
     def get_current_mode(self) -> str:
-        settings = self.get_trade_settings()
-        return settings.get('mode', 'daytrade')
+        return self.get_trade_settings().get('mode', 'daytrade')
 
     def calculate_tp_sl(self, signal_type: str, entry_price: float, symbol: str) -> Dict[str, float]:
         settings = self.get_trade_settings()
+        # シンボル情報はコネクタのレジストリにキャッシュされているため、ターミナルへの問い合わせは初回のみ
         point = self.mt5.get_symbol_point(symbol)
         if point is None or point == 0:
             return {"tp": 0.0, "sl": 0.0}
@@ -69,10 +55,13 @@ class TradeManager:
         self._send_notifications(signal_info, chart_filepath)
 
     def _send_trade_order(self, signal_info: dict, settings: dict):
+        if mt5 is None:
+            logger.error("MetaTrader5 パッケージが無いため、自動売買の注文を送信できません。")
+            return
         try:
             symbol, signal_type = signal_info.get('symbol'), signal_info.get('signal', '').upper()
             if not symbol or not signal_type in ['BUY', 'SELL']: return
-            tick = mt5.symbol_info_tick(symbol)
+            tick = self.mt5.call(mt5.symbol_info_tick, symbol)
             if not tick:
                 logger.error(f"{symbol}の現在価格が取得できませんでした。")
                 return
@@ -85,8 +74,10 @@ class TradeManager:
             request = {"action": mt5.TRADE_ACTION_DEAL, "symbol": symbol, "volume": settings["lot_size"], "type": mt5.ORDER_TYPE_BUY if signal_type == 'BUY' else mt5.ORDER_TYPE_SELL, "price": price, "sl": stop_loss, "tp": take_profit, "magic": self.magic_number, "comment": f"Phantom-{settings['mode']}", "type_time": mt5.ORDER_TIME_GTC, "type_filling": mt5.ORDER_FILLING_FOK}
             log_message = (f"【自動売買】{symbol} に {signal_type} 注文 (mode: {settings['mode']}, lot: {settings['lot_size']}, sl: {settings['sl_pips']}pips, tp: {settings['tp_pips']}pips)")
             logger.warning(log_message)
-            result = mt5.order_send(request)
-            if result.retcode != mt5.TRADE_RETCODE_DONE: 
+            result = self.mt5.call(mt5.order_send, request)
+            if result is None:
+                logger.error(f"注文送信失敗: ターミナルから応答がありませんでした。")
+            elif result.retcode != mt5.TRADE_RETCODE_DONE: 
                 logger.error(f"注文送信失敗: retcode={result.retcode}, comment={result.comment}")
             else: 
                 logger.info(f"注文送信成功: PositionID={result.order}, comment={result.comment}")
@@ -1,6 +1,7 @@
 import logging
 import pandas as pd
-import pandas_ta as ta
+
+import indicator_kernels as kernels
 
 logger = logging.getLogger(__name__)
 
@@ -33,30 +34,12 @@ def calculate_ichimoku(df: pd.DataFrame) -> pd.DataFrame:
         return df
 
     try:
-        df.ta.ichimoku(append=True)
-        logger.debug(f"calculate_ichimoku: pandas_ta.ichimoku 実行後のDataFrameの列:\n{df.columns.tolist()}")
-
-        tenkan_col_name = 'IKS_9'
-        kijun_col_name = 'IKS_26'
-        senkou_a_col_name = 'ISA_26'
-        senkou_b_col_name = 'ISB_52'
-        chikou_col_name = 'ISC_26'
-
-        expected_ichimoku_cols = [tenkan_col_name, kijun_col_name, senkou_a_col_name, senkou_b_col_name, chikou_col_name]
-        missing_ichimoku_cols = [col for col in expected_ichimoku_cols if col not in df.columns]
-
-        if missing_ichimoku_cols:
-             logger.error(f"一目均衡表の必須列がpandas_taから生成されませんでした。不足している列: {missing_ichimoku_cols}, 現在の列: {df.columns.tolist()}")
-             for col_name in ['tenkan_sen', 'kijun_sen', 'senkou_span_a', 'senkou_span_b', 'chikou_span']:
-                 if col_name not in df.columns:
-                     df[col_name] = float('nan')
-             return df
-
-        df['tenkan_sen'] = df[tenkan_col_name]
-        df['kijun_sen'] = df[kijun_col_name]
-        df['senkou_span_a'] = df[senkou_a_col_name]
-        df['senkou_span_b'] = df[senkou_b_col_name]
-        df['chikou_span'] = df[chikou_col_name]
+        ichimoku = kernels.ichimoku(df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy())
+        df['tenkan_sen'] = ichimoku['ITS_9']
+        df['kijun_sen'] = ichimoku['IKS_26']
+        df['senkou_span_a'] = ichimoku['ISA_9']
+        df['senkou_span_b'] = ichimoku['ISB_26']
+        df['chikou_span'] = ichimoku['ICS_26']
 
         logger.debug(f"一目均衡表を計算しました。最終値: 転換線={df['tenkan_sen'].iloc[-1]:.4f}, 基準線={df['kijun_sen'].iloc[-1]:.4f}, 雲A={df['senkou_span_a'].iloc[-1]:.4f}, 雲B={df['senkou_span_b'].iloc[-1]:.4f}, 遅行線={df['chikou_span'].iloc[-1]:.4f}")
 
@@ -89,28 +72,10 @@ def calculate_macd(df: pd.DataFrame) -> pd.DataFrame:
         return df
 
     try:
-        # pandas_ta を使用してMACDを計算
-        # デフォルトでは MACD_12_26_9, MACDH_12_26_9, MACDS_12_26_9 のような列名が生成されます。
-        df.ta.macd(append=True)
-        logger.debug(f"calculate_macd: pandas_ta.macd 実行後のDataFrameの列:\n{df.columns.tolist()}")
-
-        macd_col_name = 'MACD_12_26_9'
-        macdh_col_name = 'MACDH_12_26_9'
-        macds_col_name = 'MACDS_12_26_9'
-
-        expected_macd_cols = [macd_col_name, macdh_col_name, macds_col_name]
-        missing_macd_cols = [col for col in expected_macd_cols if col not in df.columns]
-
-        if missing_macd_cols:
-            logger.error(f"MACDの必須列がpandas_taから生成されませんでした。不足している列: {missing_macd_cols}")
-            df['MACD'] = float('nan')
-            df['MACDh'] = float('nan')
-            df['MACDs'] = float('nan')
-            return df
-
-        df['MACD'] = df[macd_col_name]
-        df['MACDh'] = df[macdh_col_name] # MACD Histogram
-        df['MACDs'] = df[macds_col_name] # MACD Signal Line
+        macd = kernels.macd(df['close'].to_numpy())
+        df['MACD'] = macd['MACD_12_26_9']
+        df['MACDh'] = macd['MACDh_12_26_9'] # MACD Histogram
+        df['MACDs'] = macd['MACDs_12_26_9'] # MACD Signal Line
 
         logger.debug(f"MACDを計算しました。最終値: MACD={df['MACD'].iloc[-1]:.4f}, MACDh={df['MACDh'].iloc[-1]:.4f}, MACDs={df['MACDs'].iloc[-1]:.4f}")
 
@@ -136,25 +101,9 @@ def calculate_stochastic(df: pd.DataFrame) -> pd.DataFrame:
         return df
 
     try:
-        # pandas_ta を使用してストキャスティクスを計算
-        # デフォルトでは STOCHk_14_3_3, STOCHd_14_3_3 のような列名が生成されます。
-        df.ta.stoch(append=True)
-        logger.debug(f"calculate_stochastic: pandas_ta.stoch 実行後のDataFrameの列:\n{df.columns.tolist()}")
-
-        stochk_col_name = 'STOCHk_14_3_3'
-        stochd_col_name = 'STOCHd_14_3_3'
-
-        expected_stoch_cols = [stochk_col_name, stochd_col_name]
-        missing_stoch_cols = [col for col in expected_stoch_cols if col not in df.columns]
-
-        if missing_stoch_cols:
-            logger.error(f"ストキャスティクスの必須列がpandas_taから生成されませんでした。不足している列: {missing_stoch_cols}")
-            df['STOCHk'] = float('nan')
-            df['STOCHd'] = float('nan')
-            return df
-
-        df['STOCHk'] = df[stochk_col_name]
-        df['STOCHd'] = df[stochd_col_name]
+        stoch = kernels.stoch(df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy())
+        df['STOCHk'] = stoch['STOCHk_14_3_3']
+        df['STOCHd'] = stoch['STOCHd_14_3_3']
 
         logger.debug(f"ストキャスティクスを計算しました。最終値: STOCHk={df['STOCHk'].iloc[-1]:.4f}, STOCHd={df['STOCHd'].iloc[-1]:.4f}")
 
@@ -4,54 +4,31 @@ from flask import Flask, render_template, request, jsonify
 import json
 import os
 import logging
-import threading
 import time
 import config
-import MetaTrader5 as mt5_api
 # analysis_logic は手動分析パネルで使われるのでそのまま
 import analysis_logic
+from market_data import timeframe_value
+from settings_service import DEFAULT_SETTINGS, get_settings_service
 
 logger = logging.getLogger(__name__)
 
 # --- グローバル変数 ---
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'), template_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'))
-SETTINGS_FILE = 'settings.json'
-settings_lock = threading.Lock()
-settings_data = {}
+settings_service = get_settings_service()
 mt5_connector = None
+runner_registry = None
 
 # --- 初期化 ---
-def init_app(connector):
-    global mt5_connector
+def init_app(connector, registry=None):
+    global mt5_connector, runner_registry
     mt5_connector = connector
+    runner_registry = registry
     logger.info("WebサーバーがMT5コネクタを受け取りました。")
 
-def load_settings():
-    global settings_data
-    with settings_lock:
-        if os.path.exists(SETTINGS_FILE):
-            try:
-                with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
-                    settings_data = json.load(f)
-            except (json.JSONDecodeError, IOError):
-                set_default_settings()
-        else:
-            set_default_settings()
-    return settings_data
-
-def set_default_settings():
-    global settings_data
-    settings_data = {"auto_trading": False, "lot_size": 0.01, "mode": "daytrade"}
-    save_settings(settings_data)
-
-def save_settings(data):
-    global settings_data
-    with settings_lock:
-        settings_data.update(data)
-        with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(settings_data, f, indent=4, ensure_ascii=False)
-        return True
-load_settings()
+# 設定ファイルが無ければ既定の設定で作っておく
+if not settings_service.exists():
+    settings_service.update(DEFAULT_SETTINGS)
 
 # --- APIエンドポイント ---
 @app.route('/')
@@ -60,11 +37,11 @@ def index():
 
 @app.route('/get_settings')
 def get_settings_api():
-    return jsonify(settings_data)
+    return jsonify(dict(settings_service.get()))
 
 @app.route('/update_settings', methods=['POST'])
 def update_settings_api():
-    if save_settings(request.get_json()):
+    if settings_service.update(request.get_json()):
         return jsonify({"status": "success"}), 200
     return jsonify({"status": "error"}), 500
 
@@ -97,6 +74,30 @@ def get_symbols():
     # config.pyで定義した順番で返す
     return jsonify(config.SYMBOL_DISPLAY_ORDER)
 
+@app.route('/api/runners', methods=['GET'])
+def list_runners_api():
+    if not runner_registry:
+        return jsonify({"status": "error", "message": "Runner registry not initialized"}), 503
+    return jsonify(runner_registry.describe())
+
+@app.route('/api/runners', methods=['POST'])
+def add_runner_api():
+    if not runner_registry:
+        return jsonify({"status": "error", "message": "Runner registry not initialized"}), 503
+    data = request.get_json() or {}
+    symbol, timeframe_str = data.get('symbol'), data.get('timeframe')
+    if not symbol or not timeframe_str:
+        return jsonify({"status": "error", "message": "Symbol and timeframe are required"}), 400
+    ok, message = runner_registry.add(symbol, timeframe_str)
+    return jsonify({"status": "success" if ok else "error", "message": message}), 200 if ok else 409
+
+@app.route('/api/runners/<symbol>/<timeframe_str>', methods=['DELETE'])
+def remove_runner_api(symbol, timeframe_str):
+    if not runner_registry:
+        return jsonify({"status": "error", "message": "Runner registry not initialized"}), 503
+    ok, message = runner_registry.remove(symbol, timeframe_str)
+    return jsonify({"status": "success" if ok else "error", "message": message}), 200 if ok else 404
+
 @app.route('/api/run_analysis', methods=['POST'])
 def run_analysis_api():
     if not mt5_connector:
@@ -110,7 +111,7 @@ def run_analysis_api():
         return jsonify({"status": "error", "message": "Symbol and timeframe are required"}), 400
 
     try:
-        timeframe_obj = getattr(mt5_api, f'TIMEFRAME_{timeframe_str.upper()}')
+        timeframe_obj = timeframe_value(timeframe_str)
         df = mt5_connector.get_candlestick_data(symbol, timeframe_obj, config.CANDLE_COUNT)
         if df.empty:
             return jsonify({"status": "error", "message": "Failed to get candlestick data"}), 500
@@ -0,0 +1,142 @@
+# work_queue.py (時間足ごとの優先度と締め切りを持つ評価ジョブのキュー)
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+class _Job:
+    __slots__ = ('key', 'priority', 'deadline', 'fn', 'future', 'enqueued_at', 'cancelled')
+
+    def __init__(self, key, priority, deadline, fn, future):
+        self.key = key
+        self.priority = priority
+        self.deadline = deadline
+        self.fn = fn
+        self.future = future
+        self.enqueued_at = time.time()
+        self.cancelled = False
+
+
+class EvaluationQueue:
+    """
+    シグナル評価ジョブの優先度付きキュー。M1/M5/M15 の境界が重なって評価が集中しても、
+    短い時間足のジョブを先に処理し、D1 の再計算が M1 のスキャルピングを遅らせないようにする。
+    - 優先度は時間足の秒数 (短いほど先)、同じ優先度の中では締め切りが早い順に処理する
+    - 同じキー (symbol, timeframe) のジョブが待っていれば、新しいジョブで置き換える (合体)
+    - 取り出した時点で締め切り (次の足の確定) を過ぎているジョブは実行せずに捨てる
+    """
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or config.WORK_QUEUE_WORKERS
+        self._heap = []
+        self._pending: Dict[Hashable, _Job] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stop = False
+        self._threads = []
+        self._stats = {"submitted": 0, "coalesced": 0, "dropped": 0, "completed": 0, "failed": 0}
+        self._lateness: Dict[int, dict] = {}
+        self._last_stats_log = time.time()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"EvaluationQueue-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"評価キューを開始しました。ワーカー数: {self.workers}")
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def submit(self, key: Hashable, priority: int, deadline: float, fn: Callable) -> Future:
+        """
+        ジョブを積む。deadline はローカル時刻 (time.time()) で、これを過ぎたら実行しない。
+        捨てられた・置き換えられたジョブの Future はキャンセル済みになる。
+        """
+        future = Future()
+        job = _Job(key, priority, deadline, fn, future)
+        with self._cond:
+            self._stats["submitted"] += 1
+            previous = self._pending.get(key)
+            if previous is not None:
+                # 古いデータでの評価は不要なので、新しいジョブで置き換える
+                previous.cancelled = True
+                previous.future.cancel()
+                self._stats["coalesced"] += 1
+            self._pending[key] = job
+            heapq.heappush(self._heap, (priority, deadline, next(self._seq), job))
+            self._cond.notify()
+        return future
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def stats(self) -> dict:
+        """キューの深さ、処理件数、優先度 (時間足の秒数) ごとの待ち時間 (平均・最大) を返す。"""
+        with self._cond:
+            lateness = {
+                priority: {"count": s["count"], "avg_wait": s["total"] / s["count"] if s["count"] else 0.0, "max_wait": s["max"]}
+                for priority, s in self._lateness.items()
+            }
+            return dict(self._stats, depth=len(self._pending), wait_by_priority=lateness)
+
+    def _next_job(self) -> Optional[_Job]:
+        with self._cond:
+            while not self._stop:
+                while self._heap:
+                    _, _, _, job = heapq.heappop(self._heap)
+                    if job.cancelled:
+                        continue
+                    if self._pending.get(job.key) is job:
+                        del self._pending[job.key]
+                    if time.time() > job.deadline:
+                        # 次の足が確定してから結果を出しても意味が無いので捨てる
+                        job.future.cancel()
+                        self._stats["dropped"] += 1
+                        logger.warning(f"[{job.key}] 締め切りを過ぎたため、評価を破棄しました。")
+                        continue
+                    self._record_wait(job)
+                    return job
+                self._cond.wait()
+            return None
+
+    def _record_wait(self, job: _Job):
+        waited = time.time() - job.enqueued_at
+        s = self._lateness.setdefault(job.priority, {"count": 0, "total": 0.0, "max": 0.0})
+        s["count"] += 1
+        s["total"] += waited
+        s["max"] = max(s["max"], waited)
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                job.future.set_result(job.fn())
+                ok = True
+            except Exception as e:
+                logger.error(f"[{job.key}] 評価ジョブの実行中にエラーが発生: {e}", exc_info=True)
+                job.future.set_exception(e)
+                ok = False
+            with self._cond:
+                self._stats["completed" if ok else "failed"] += 1
+                log_stats = time.time() - self._last_stats_log >= config.WORK_QUEUE_STATS_LOG_SECONDS
+                if log_stats:
+                    self._last_stats_log = time.time()
+            if log_stats:
+                logger.info(f"評価キューの状況: {self.stats()}")